@@ -0,0 +1,242 @@
+"""
+Small caching helpers for the Hostinger API.
+
+- TTLCache: in-process LRU with per-entry expiry, O(1) get / set / eviction
+- SingleFlight: concurrent calls for the same key share one in-flight coroutine
+- SqliteCacheTier: optional on-disk tier so uvicorn workers share hits
+- AsyncCache: the three combined behind get_or_fetch()
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    LRU cache whose entries also expire after `ttl` seconds (or a per-entry ttl).
+
+    With `max_bytes`, entries are also evicted while their total `sizeof` exceeds
+    it. An entry larger than `max_bytes` on its own is not kept at all.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        max_bytes: int = 0,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._bytes = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any, int]]" = OrderedDict()
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self.pop(key)
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        size = self._sizeof(value) if self._sizeof is not None else 0
+        self.pop(key)
+        self._data[key] = (time.monotonic() + ttl, value, size)
+        self._bytes += size
+
+        # The least recently used entry is always first, so eviction is O(1)
+        while len(self._data) > self.maxsize or (
+            self.max_bytes and self._bytes > self.max_bytes
+        ):
+            self._bytes -= self._data.popitem(last=False)[1][2]
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        self._bytes -= entry[2]
+        return entry[1]
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight:
+    """Runs at most one coroutine per key, concurrent callers await the same result."""
+
+    def __init__(self):
+        self._inflight: dict = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._forget(key, future))
+
+        # Shielded, so one cancelled caller doesn't cancel the others
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+class SqliteCacheTier:
+    """JSON values in a sqlite file, shared by every worker process on the box."""
+
+    def __init__(self, path: str, maxsize: int = 5000):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Any:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl),
+            )
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+
+
+class AsyncCache:
+    """
+    Memory LRU+TTL in front of an optional shared sqlite tier,
+    with singleflight coalescing of misses.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        shared_path: Optional[str] = None,
+        name: str = "cache",
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.flight = SingleFlight()
+        self.shared = None
+        self.hits = self.misses = 0
+
+        if shared_path:
+            try:
+                self.shared = SqliteCacheTier(shared_path, maxsize=maxsize * 10)
+            except Exception as e:
+                logger.warning(f"{name}: shared cache tier disabled ({e})")
+
+    async def get_or_fetch(
+        self, key: str, fetch: Callable[[], Awaitable[Any]], cache_if=None
+    ) -> Any:
+        """
+        Return the cached value for `key`, or run `fetch` once for all concurrent callers.
+        `cache_if(value)` can veto caching (e.g. empty results from a failed upstream).
+        """
+
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        return await self.flight.do(key, lambda: self._load(key, fetch, cache_if))
+
+    async def _load(self, key: str, fetch, cache_if) -> Any:
+        if self.shared is not None:
+            try:
+                value = await asyncio.to_thread(self.shared.get, key)
+            except Exception as e:
+                logger.warning(f"{self.name}: shared tier read failed ({e})")
+                value = None
+
+            if value is not None:
+                self.hits += 1
+                self.memory.set(key, value)
+                return value
+
+        self.misses += 1
+        value = await fetch()
+        if cache_if is not None and not cache_if(value):
+            return value
+
+        self.memory.set(key, value)
+        if self.shared is not None:
+            try:
+                await asyncio.to_thread(self.shared.set, key, value, self.ttl)
+            except Exception as e:
+                logger.warning(f"{self.name}: shared tier write failed ({e})")
+
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.memory),
+            "inflight": len(self.flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared is not None,
+        }
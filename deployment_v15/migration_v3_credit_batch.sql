@@ -0,0 +1,25 @@
+-- MIGRATION: BATCHED CREDIT DEDUCTION (v15.3)
+-- Applies several deductions in one round trip, in order, with the same
+-- row-level locking as validate_and_subtract_credits.
+-- p_items: [{"user_id": "<uuid>", "char_count": 123}, ...]
+-- Returns one boolean per item (TRUE = deducted, FALSE = insufficient credits).
+CREATE OR REPLACE FUNCTION validate_and_subtract_credits_batch(
+    p_items JSONB
+) RETURNS BOOLEAN[] AS $$
+DECLARE
+    item JSONB;
+    results BOOLEAN[] := ARRAY[]::BOOLEAN[];
+BEGIN
+    FOR item IN SELECT * FROM jsonb_array_elements(p_items)
+    LOOP
+        results := array_append(
+            results,
+            validate_and_subtract_credits(
+                (item->>'user_id')::UUID,
+                (item->>'char_count')::INTEGER
+            )
+        );
+    END LOOP;
+    RETURN results;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
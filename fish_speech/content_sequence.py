@@ -12,6 +12,31 @@ from fish_speech.tokenizer import (
 )
 
 
+def semantic_ids_to_tokens(
+    tokenizer: FishTokenizer, semantic_ids: torch.Tensor
+) -> torch.Tensor:
+    """
+    Map a row of semantic ids to their token ids with one gather on the
+    tokenizer's lookup table.
+    """
+
+    lookup = torch.from_numpy(tokenizer.semantic_token_ids)
+    return lookup[semantic_ids.cpu().long()]
+
+
+def audio_part_tokens(tokenizer: FishTokenizer, features: torch.Tensor) -> torch.Tensor:
+    """
+    Tokens of an audio part: one embed placeholder per feature frame, between
+    the audio start and end tokens. The model writes the projected features
+    over the placeholders.
+    """
+
+    tokens = torch.full((len(features) + 2,), tokenizer.audio_embed_id, dtype=torch.int)
+    tokens[0] = tokenizer.audio_start_id
+    tokens[-1] = tokenizer.audio_end_id
+    return tokens
+
+
 def restore_ndarray(obj, to_tensor: bool = False):
     if isinstance(obj, dict) and "__ndarray__" in obj:
         obj = np.frombuffer(obj["data"], dtype=obj["dtype"]).reshape(obj["shape"])
@@ -193,15 +218,12 @@ class ContentSequence:
                 tokens = torch.tensor(tokens, dtype=torch.int)
             elif isinstance(part, VQPart):
                 curr_codes = part.codes.clone().to(torch.int)
-                tokens = torch.tensor(
-                    [
-                        tokenizer.semantic_id_to_token_id[int(i.item())]
-                        for i in curr_codes[0].int()
-                    ],
-                    dtype=torch.int,
-                )
+                tokens = semantic_ids_to_tokens(tokenizer, curr_codes[0])
                 vq_parts.append(curr_codes)
                 vq_require_losses.append(part.cal_loss)
+            elif isinstance(part, AudioPart):
+                tokens = audio_part_tokens(tokenizer, part.features)
+                audio_parts.append(part.features)
             else:
                 raise ValueError(f"Unsupported part type: {type(part)}")
 
@@ -273,41 +295,23 @@ class ContentSequence:
         tokenizer: FishTokenizer,
         num_codebooks: int,
     ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
-        encoded = self.encode(tokenizer, add_shift=False)
-        tokens = encoded.tokens
-        values = torch.zeros((num_codebooks + 1, len(tokens)), dtype=torch.int)
-        values[0] = tokens
-
-        if (encoded.vq_parts is None or len(encoded.vq_parts) == 0) and (
-            encoded.audio_parts is None or len(encoded.audio_parts) == 0
-        ):
+        # Each part is laid out directly as a (num_codebooks + 1, length) block,
+        # which also lets callers cache and concatenate blocks (e.g. reference prompts)
+        blocks, audio_masks, audio_parts = [], [], []
+        for part in self.parts:
+            block = encode_part_for_inference(part, tokenizer, num_codebooks)
+            audio_mask = torch.zeros(block.shape[1], dtype=torch.bool)
+            if isinstance(part, AudioPart):
+                audio_mask[1:-1] = True  # Skip start and end tokens
+                audio_parts.append(part.features)
+            blocks.append(block)
+            audio_masks.append(audio_mask)
+
+        values = torch.cat(blocks, dim=1)
+        if not audio_parts:
             return values, None, None
 
-        audio_parts = audio_masks = None
-        if encoded.vq_parts is not None and len(encoded.vq_parts) > 0:
-            vq_parts = encoded.vq_parts
-            vq_parts = torch.cat(vq_parts, dim=1)
-            
-            # v12.8: Handle shape mismatch (e.g., 10 vs 8 codebooks)
-            if vq_parts.shape[0] > num_codebooks:
-                logger.warning(f"Truncating vq_parts from {vq_parts.shape[0]} to {num_codebooks} codebooks")
-                vq_parts = vq_parts[:num_codebooks]
-            elif vq_parts.shape[0] < num_codebooks:
-                # Should not happen with current models but for safety
-                padding = torch.zeros((num_codebooks - vq_parts.shape[0], vq_parts.shape[1]), 
-                                      dtype=vq_parts.dtype, device=vq_parts.device)
-                vq_parts = torch.cat([vq_parts, padding], dim=0)
-
-            values[0, encoded.vq_mask_tokens] = (
-                vq_parts[0] + tokenizer.semantic_begin_id
-            )
-            values[1:, encoded.vq_mask_tokens] = vq_parts
-
-        if encoded.audio_parts is not None and len(encoded.audio_parts) > 0:
-            audio_parts = torch.cat(encoded.audio_parts, dim=0)
-            audio_masks = encoded.audio_masks[None, :]
-
-        return values, audio_masks, audio_parts
+        return values, torch.cat(audio_masks)[None, :], torch.cat(audio_parts, dim=0)
 
     def visualize(
         self: "ContentSequence",
@@ -382,3 +386,56 @@ class ContentSequence:
             print_semantic_token(semantic_label, count_semantic_tokens)
 
         print()
+
+
+def encode_part_for_inference(
+    part: BasePart, tokenizer: FishTokenizer, num_codebooks: int
+) -> torch.Tensor:
+    """
+    Encode a single part into a (num_codebooks + 1, length) int tensor:
+    row 0 holds the main tokens, rows 1: the VQ codes (zero for text and audio,
+    whose features are passed apart, see `ContentSequence.encode_for_inference`).
+    """
+
+    if isinstance(part, TextPart):
+        if part.tokens is None:
+            assert part.text is not None
+            tokens = tokenizer.encode(part.text)
+        else:
+            tokens = part.tokens
+
+        values = torch.zeros((num_codebooks + 1, len(tokens)), dtype=torch.int)
+        values[0] = torch.tensor(tokens, dtype=torch.int)
+        return values
+
+    if isinstance(part, VQPart):
+        codes = part.codes.to(torch.int)
+
+        # v12.8: Handle shape mismatch (e.g., 10 vs 8 codebooks)
+        if codes.shape[0] > num_codebooks:
+            logger.warning(
+                f"Truncating vq_parts from {codes.shape[0]} to {num_codebooks} codebooks"
+            )
+            codes = codes[:num_codebooks]
+        elif codes.shape[0] < num_codebooks:
+            # Should not happen with current models but for safety
+            padding = torch.zeros(
+                (num_codebooks - codes.shape[0], codes.shape[1]),
+                dtype=codes.dtype,
+                device=codes.device,
+            )
+            codes = torch.cat([codes, padding], dim=0)
+
+        codes = codes.cpu()
+        values = torch.empty((num_codebooks + 1, codes.shape[1]), dtype=torch.int)
+        values[0] = semantic_ids_to_tokens(tokenizer, codes[0])
+        values[1:] = codes
+        return values
+
+    if isinstance(part, AudioPart):
+        tokens = audio_part_tokens(tokenizer, part.features)
+        values = torch.zeros((num_codebooks + 1, len(tokens)), dtype=torch.int)
+        values[0] = tokens
+        return values
+
+    raise ValueError(f"Unsupported part type: {type(part)}")
@@ -3,6 +3,7 @@ from typing import Literal
 
 import torch
 
+from .content_sequence import semantic_ids_to_tokens
 from .tokenizer import MODALITY_TOKENS, FishTokenizer
 
 CODEBOOK_PAD_TOKEN_ID = 0
@@ -72,13 +73,7 @@ class Message:
                 )
             elif isinstance(part, VQPart):
                 curr_codes = part.codes.clone()
-                tokens = torch.tensor(
-                    [
-                        tokenizer.semantic_id_to_token_id[i.item()]
-                        for i in curr_codes[0].int()
-                    ],
-                    dtype=torch.int,
-                )
+                tokens = semantic_ids_to_tokens(tokenizer, curr_codes[0])
                 vq_parts.append(curr_codes)
             else:
                 raise ValueError(f"Unsupported part type: {type(part)}")
@@ -1,6 +1,8 @@
 import struct
 
-from .text_data_pb2 import TextData
+import numpy as np
+
+from .text_data_pb2 import Sentence, TextData
 
 
 def read_pb_stream(f):
@@ -26,6 +28,15 @@ def pack_pb_stream(text_data):
     return struct.pack("I", len(buf)) + buf
 
 
+def read_pb_record(f, offset):
+    # Offsets come from the .index.npy written next to each shard by build_dataset
+    f.seek(offset)
+    size = struct.unpack("I", f.read(4))[0]
+    text_data = TextData()
+    text_data.ParseFromString(f.read(size))
+    return text_data
+
+
 def split_pb_stream(f):
     while True:
         head = f.read(4)
@@ -34,3 +45,96 @@ def split_pb_stream(f):
         size = struct.unpack("I", head)[0]
         buf = f.read(size)
         yield head + buf
+
+
+# Field numbers from text-data.proto
+_SEMANTICS_VALUES_FIELD = 1
+_SENTENCE_SEMANTICS_FIELD = 3
+_TEXT_DATA_SENTENCES_FIELD = 4
+
+
+def _encode_varints(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized protobuf varint encoding of a 1-D array of uint32 values.
+    Returns the encoded bytes and the encoded size of every value.
+    """
+
+    values = np.asarray(values).ravel()
+    values = values.astype(
+        np.int32 if values.size == 0 or values.max() < 2**31 else np.int64,
+        copy=False,
+    )
+
+    # Number of 7-bit groups needed by every value (1 to 5 for uint32)
+    sizes = np.ones(values.shape, dtype=np.int8)
+    for k in range(1, 5):
+        sizes += values >= (1 << (7 * k))
+    max_size = int(sizes.max(initial=1))
+
+    # [N, max_size] matrix of 7-bit groups with continuation bits, flattened
+    # row by row while dropping the unused trailing groups. Columns are filled
+    # one at a time, which keeps every op on contiguous 1-D arrays.
+    groups = np.empty((values.size, max_size), dtype=np.uint8)
+    used = np.empty((values.size, max_size), dtype=bool)
+    for k in range(max_size):
+        column = (values >> (7 * k)).astype(np.uint8) & 0x7F
+        if k < max_size - 1:
+            column |= (sizes > k + 1).view(np.uint8) << 7
+        groups[:, k] = column
+        used[:, k] = sizes > k
+
+    return groups[used], sizes
+
+
+def _encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _length_delimited(field: int, payload: bytes) -> bytes:
+    return _encode_varint(field << 3 | 2) + _encode_varint(len(payload)) + payload
+
+
+def pack_text_data(
+    source: str, name: str, sentences: list[tuple[list[str], np.ndarray]]
+) -> bytes:
+    """
+    Same bytes as pack_pb_stream(TextData(...)), but the semantics are encoded
+    straight from numpy arrays ([num_codebooks, num_frames] per sentence)
+    instead of building a Python int and a Semantics message per code.
+    """
+
+    rows = [row for _, codes in sentences for row in np.asarray(codes)]
+    flat = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    if flat.size > 0 and flat.min() < 0:
+        raise ValueError("Semantic codes must be non-negative")
+
+    # Encode every code of the group at once, then slice per codebook row
+    encoded, nbytes = _encode_varints(flat)
+    row_ends = np.cumsum([len(row) for row in rows], dtype=np.int64)
+    byte_ends = np.concatenate([[0], np.cumsum(nbytes, dtype=np.int64)])[
+        row_ends
+    ].tolist()
+    encoded = encoded.tobytes()
+
+    chunks = [TextData(source=source, name=name).SerializeToString()]
+    row_idx, byte_start = 0, 0
+    for texts, codes in sentences:
+        sentence = [Sentence(texts=texts).SerializeToString()]
+        for _ in range(len(codes)):
+            byte_end = byte_ends[row_idx]
+            packed = encoded[byte_start:byte_end]
+            row_idx, byte_start = row_idx + 1, byte_end
+
+            semantics = (
+                _length_delimited(_SEMANTICS_VALUES_FIELD, packed) if packed else b""
+            )
+            sentence.append(_length_delimited(_SENTENCE_SEMANTICS_FIELD, semantics))
+        chunks.append(_length_delimited(_TEXT_DATA_SENTENCES_FIELD, b"".join(sentence)))
+
+    buf = b"".join(chunks)
+    return struct.pack("I", len(buf)) + buf
@@ -8,12 +8,17 @@ from typing import Optional, Union
 import numpy as np
 import pyarrow.parquet as pq
 import torch
-import torch.nn.functional as F
 from datasets.download.streaming_download_manager import xopen
 from huggingface_hub import HfApi
 from lightning import LightningDataModule
 from torch.distributed import get_rank, get_world_size, is_initialized
-from torch.utils.data import DataLoader, Dataset, IterableDataset, get_worker_info
+from torch.utils.data import (
+    DataLoader,
+    Dataset,
+    IterableDataset,
+    Sampler,
+    get_worker_info,
+)
 
 from fish_speech.content_sequence import ContentSequence, TextPart, VQPart
 
@@ -21,6 +26,7 @@ CODEBOOK_PAD_TOKEN_ID = 0
 
 from fish_speech.datasets.protos.text_data_pb2 import SampledData
 from fish_speech.datasets.protos.text_data_stream import read_pb_stream
+from fish_speech.datasets.shard import SHARD_SUFFIX, SemanticShard, ShardGroup
 from fish_speech.text.clean import clean_text
 from fish_speech.tokenizer import FishTokenizer
 from fish_speech.utils import RankedLogger
@@ -56,6 +62,13 @@ def split_by_rank_worker(files):
     return files
 
 
+@dataclass
+class SampledShardData:
+    source: str
+    name: str
+    samples: list
+
+
 class AutoTextSemanticInstructionIterableDataset(IterableDataset):
     """
     Auto Augment Dataset by Speaker
@@ -129,6 +142,7 @@ class AutoTextSemanticInstructionIterableDataset(IterableDataset):
                 elif i.is_dir():
                     expanded_proto_files.extend(i.rglob("*.proto"))
                     expanded_proto_files.extend(i.rglob("*.protos"))
+                    expanded_proto_files.extend(i.rglob(f"*{SHARD_SUFFIX}"))
                 else:
                     raise ValueError(f"{i} is not a file or directory")
 
@@ -136,6 +150,7 @@ class AutoTextSemanticInstructionIterableDataset(IterableDataset):
         Random(self.seed).shuffle(expanded_proto_files)
 
         self.groups = []
+        group_weights = []
         shard_proto_files = split_by_rank_worker(expanded_proto_files)
         log.info(
             f"Reading {len(shard_proto_files)} / {len(expanded_proto_files)} files"
@@ -143,16 +158,31 @@ class AutoTextSemanticInstructionIterableDataset(IterableDataset):
 
         count = 0
         for filename in shard_proto_files:
+            if filename.suffix == SHARD_SUFFIX:
+                # Memory-mapped, only the offset index is read here
+                shard = SemanticShard(filename)
+                self.groups.extend(
+                    ShardGroup(shard, idx) for idx in range(shard.num_groups)
+                )
+                group_weights.extend(shard.group_sizes().tolist())
+                count += shard.num_groups
+                continue
+
             with open(filename, "rb") as f:
                 for text_data in read_pb_stream(f):
                     self.groups.append(text_data)
+                    group_weights.append(len(text_data.sentences))
                     count += 1
 
         log.info(f"Read total {count} groups of data")
 
         # Shuffle the lines
-        Random(self.seed).shuffle(self.groups)
-        self.group_weights = [len(i.sentences) for i in self.groups]
+        order = list(range(len(self.groups)))
+        Random(self.seed).shuffle(order)
+        self.groups = [self.groups[i] for i in order]
+        self.group_weights = [group_weights[i] for i in order]
+        # Cumulative weights make each draw O(log n) instead of O(n)
+        self.group_cum_weights = np.cumsum(self.group_weights).tolist()
 
     def sample_data(self):
         if self.groups is None:
@@ -162,7 +192,7 @@ class AutoTextSemanticInstructionIterableDataset(IterableDataset):
         num_samples = self.max_length // 20
 
         # choice group based on their number of samples
-        group = random.choices(self.groups, weights=self.group_weights, k=1)[0]
+        group = random.choices(self.groups, cum_weights=self.group_cum_weights, k=1)[0]
 
         if self.causal:
             # Sample in order
@@ -176,6 +206,14 @@ class AutoTextSemanticInstructionIterableDataset(IterableDataset):
                 group.sentences, k=min(num_samples, len(group.sentences))
             )
 
+        if isinstance(group, ShardGroup):
+            # Shard sentences are plain numpy views, not protobuf messages
+            return SampledShardData(
+                source=group.source,
+                name=group.name,
+                samples=samples,
+            )
+
         return SampledData(
             source=group.source,
             name=group.name,
@@ -205,8 +243,11 @@ class AutoTextSemanticInstructionIterableDataset(IterableDataset):
         )
 
         # Assistant's turn
-        vq_codes = [x.values for x in semantics[0]]
-        vq_codes_tensor = torch.tensor(vq_codes).to(torch.int32)
+        if isinstance(semantics[0], np.ndarray):
+            vq_codes_tensor = torch.from_numpy(semantics[0].astype(np.int32))
+        else:
+            vq_codes = [x.values for x in semantics[0]]
+            vq_codes_tensor = torch.tensor(vq_codes).to(torch.int32)
 
         # 将 cal_loss=True 直接关联到 VQPart 上，这比之前更精确
         vq_part = VQPart(codes=vq_codes_tensor, cal_loss=True)
@@ -257,6 +298,7 @@ class AutoTextSemanticInstructionIterableDataset(IterableDataset):
 
         samples = list(response.samples)
         all_tokens, all_labels = [], []
+        total_length = 0
 
         while len(samples) > 0:
             sentence = samples.pop(0)
@@ -269,8 +311,14 @@ class AutoTextSemanticInstructionIterableDataset(IterableDataset):
                 skip_text=random.random() < self.skip_text_prob,
             )
 
+            # Stop before max_length instead of letting the collator truncate
+            # the last sentence, the first one is always kept
+            if all_tokens and total_length + tokens.size(1) > self.max_length:
+                break
+
             all_tokens.append(tokens)
             all_labels.append(labels)
+            total_length += tokens.size(1)
 
         tokens = torch.cat(all_tokens, dim=1)
         labels = torch.cat(all_labels, dim=1)
@@ -491,10 +539,109 @@ class InterleaveDataset(IterableDataset):
                 yield next(dataset_iterators[dataset_idx])
 
 
+class LengthBucketedIterableDataset(IterableDataset):
+    """
+    Buffers `batch_size * num_batches` examples, sorts them by length and yields
+    them in batch-sized chunks of similar length, in random chunk order.
+    The DataLoader batches each worker's stream in order, so every batch
+    is drawn from one chunk and needs little padding.
+    """
+
+    def __init__(
+        self,
+        dataset: IterableDataset,
+        batch_size: int,
+        num_batches: int = 64,
+        seed: int = 42,
+    ):
+        super().__init__()
+
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.num_batches = num_batches
+        self.seed = seed
+
+    def __iter__(self):
+        worker_info = get_worker_info()
+        worker_id = 0 if worker_info is None else worker_info.id
+        rank = get_rank() if is_initialized() else 0
+        rng = Random(self.seed + rank * 1000 + worker_id)
+
+        buffer_size = self.batch_size * self.num_batches
+        buffer = []
+
+        for example in self.dataset:
+            if example is None:
+                continue
+
+            buffer.append(example)
+            if len(buffer) < buffer_size:
+                continue
+
+            yield from self._flush(buffer, rng)
+            buffer = []
+
+        # A finite source ends with a partly filled buffer
+        yield from self._flush(buffer, rng)
+
+    def _flush(self, buffer: list, rng: Random):
+        buffer.sort(key=lambda x: x["tokens"].size(1))
+        chunks = [
+            buffer[i : i + self.batch_size]
+            for i in range(0, len(buffer), self.batch_size)
+        ]
+        rng.shuffle(chunks)
+
+        for chunk in chunks:
+            yield from chunk
+
+
+class LengthBucketBatchSampler(Sampler):
+    """Batch sampler with the same bucketing, for map-style datasets."""
+
+    def __init__(
+        self,
+        lengths: list[int],
+        batch_size: int,
+        num_batches: int = 64,
+        seed: int = 42,
+    ):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.num_batches = num_batches
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        order = rng.permutation(len(self.lengths))
+        buffer_size = self.batch_size * self.num_batches
+
+        batches = []
+        for begin in range(0, len(order), buffer_size):
+            window = order[begin : begin + buffer_size]
+            window = window[np.argsort(self.lengths[window], kind="stable")]
+            batches.extend(
+                window[i : i + self.batch_size].tolist()
+                for i in range(0, len(window), self.batch_size)
+            )
+
+        rng.shuffle(batches)
+        return iter(batches)
+
+
 @dataclass
 class TextDataCollator:
     tokenizer: FishTokenizer
     max_length: int = 1024
+    # Pack several examples into each max_length row instead of padding each one
+    packing: bool = False
 
     def __call__(self, examples):
         if "negative_tokens" in examples:
@@ -517,46 +664,53 @@ class TextDataCollator:
 
             examples = positive_examples + negative_examples
 
+        if self.packing:
+            return self.pack(examples)
+
         return self.batchify(examples)
 
-    def batchify(self, examples, tokens_key="tokens", labels_key="labels"):
-        tokens, attention_masks, labels = [], [], []
+    def _new_batch(self, examples, num_rows, row_length, tokens_key, labels_key):
+        num_codebooks = examples[0][tokens_key].size(0)
+        tokens = torch.full(
+            (num_rows, num_codebooks, row_length),
+            CODEBOOK_PAD_TOKEN_ID,
+            dtype=examples[0][tokens_key].dtype,
+        )
+        tokens[:, 0] = self.tokenizer.eos_token_id
+        labels = torch.full(
+            (num_rows, num_codebooks, row_length),
+            -100,
+            dtype=examples[0][labels_key].dtype,
+        )
 
-        # Calculate the max length
-        max_tokens_length = 0
-        for example in examples:
-            max_tokens_length = max(max_tokens_length, example[tokens_key].size(1))
-        max_tokens_length = min(max_tokens_length, self.max_length)
+        return tokens, labels
 
+    def _lengths(self, examples, tokens_key, labels_key):
+        lengths = []
         for example in examples:
-            _tokens = example[tokens_key][:, :max_tokens_length]
-            _labels = example[labels_key][:, :max_tokens_length]
-            _attention_mask = torch.ones((max_tokens_length,), dtype=torch.bool)
-            tokens_length = _tokens.size(1)
-            _attention_mask[:tokens_length] = False
-
-            assert tokens_length == _labels.size(
+            tokens_length = example[tokens_key].size(1)
+            assert tokens_length == example[labels_key].size(
                 1
-            ), f"{tokens_length} != {_labels.size(1)}"
+            ), f"{tokens_length} != {example[labels_key].size(1)}"
+            lengths.append(min(tokens_length, self.max_length))
 
-            if tokens_length < max_tokens_length:
-                _tokens = F.pad(
-                    _tokens,
-                    (0, max_tokens_length - tokens_length),
-                    value=self.tokenizer.get_token_id("<|end_of_text|>"),
-                )
-                _tokens[1:, tokens_length:] = CODEBOOK_PAD_TOKEN_ID
-                _labels = F.pad(
-                    _labels, (0, max_tokens_length - _labels.size(1)), value=-100
-                )
+        return lengths
 
-            tokens.append(_tokens)
-            attention_masks.append(_attention_mask)
-            labels.append(_labels)
+    def batchify(self, examples, tokens_key="tokens", labels_key="labels"):
+        lengths = self._lengths(examples, tokens_key, labels_key)
+        max_tokens_length = max(lengths)
+
+        tokens, labels = self._new_batch(
+            examples, len(examples), max_tokens_length, tokens_key, labels_key
+        )
+        for i, (example, length) in enumerate(zip(examples, lengths)):
+            tokens[i, :, :length] = example[tokens_key][:, :length]
+            labels[i, :, :length] = example[labels_key][:, :length]
 
-        tokens = torch.stack(tokens, dim=0)
-        attention_masks = torch.stack(attention_masks, dim=0)
-        labels = torch.stack(labels, dim=0)
+        # TRUE means padding
+        attention_masks = (
+            torch.arange(max_tokens_length)[None] >= torch.tensor(lengths)[:, None]
+        )
 
         return {
             "inputs": tokens,
@@ -564,6 +718,57 @@ class TextDataCollator:
             "labels": labels,
         }
 
+    def pack(self, examples, tokens_key="tokens", labels_key="labels"):
+        """
+        First-fit decreasing packing of the examples into max_length rows.
+        document_ids keep attention inside each example and position_ids
+        restart at 0 for each example, so every example sees exactly what it
+        would see unpacked. Trailing padding forms one extra document per row.
+        """
+
+        lengths = self._lengths(examples, tokens_key, labels_key)
+
+        rows, free = [], []
+        for idx in sorted(range(len(examples)), key=lambda i: -lengths[i]):
+            for row, space in enumerate(free):
+                if lengths[idx] <= space:
+                    rows[row].append(idx)
+                    free[row] -= lengths[idx]
+                    break
+            else:
+                rows.append([idx])
+                free.append(self.max_length - lengths[idx])
+
+        used = torch.tensor([self.max_length - f for f in free])
+        row_length = int(used.max())
+
+        tokens, labels = self._new_batch(
+            examples, len(rows), row_length, tokens_key, labels_key
+        )
+        document_ids = torch.empty((len(rows), row_length), dtype=torch.long)
+        position_ids = torch.arange(row_length).repeat(len(rows), 1)
+
+        for row, indices in enumerate(rows):
+            begin = 0
+            for document, idx in enumerate(indices):
+                end = begin + lengths[idx]
+                tokens[row, :, begin:end] = examples[idx][tokens_key][:, : lengths[idx]]
+                labels[row, :, begin:end] = examples[idx][labels_key][:, : lengths[idx]]
+                document_ids[row, begin:end] = document
+                position_ids[row, begin:end] -= begin
+                begin = end
+
+            document_ids[row, begin:] = len(indices)
+            position_ids[row, begin:] -= begin
+
+        return {
+            "inputs": tokens,
+            "attention_masks": torch.arange(row_length)[None] >= used[:, None],
+            "labels": labels,
+            "document_ids": document_ids,
+            "position_ids": position_ids,
+        }
+
 
 class SemanticDataModule(LightningDataModule):
     def __init__(
@@ -582,7 +787,17 @@ class SemanticDataModule(LightningDataModule):
         tokenizer: FishTokenizer = None,
         max_length: int = 1024,
         num_workers: int = 4,
+        bucket_batches: int = 0,
+        packing: bool = False,
     ):
+        """
+        Args:
+            bucket_batches: if > 0, group examples of similar length into batches,
+                sorting windows of `batch_size * bucket_batches` examples
+            packing: pack several examples into each `max_length` row,
+                batch_size then counts examples rather than rows
+        """
+
         super().__init__()
 
         self.train_dataset = train_dataset
@@ -591,24 +806,44 @@ class SemanticDataModule(LightningDataModule):
         self.tokenizer = tokenizer
         self.max_length = max_length
         self.num_workers = num_workers
+        self.bucket_batches = bucket_batches
+        self.packing = packing
+
+    def _dataloader(self, dataset, bucketed: bool):
+        collate_fn = TextDataCollator(self.tokenizer, self.max_length, self.packing)
+
+        if bucketed and self.bucket_batches > 0:
+            if isinstance(dataset, IterableDataset):
+                dataset = LengthBucketedIterableDataset(
+                    dataset, self.batch_size, self.bucket_batches
+                )
+            else:
+                sampler = LengthBucketBatchSampler(
+                    [dataset[i]["tokens"].size(1) for i in range(len(dataset))],
+                    self.batch_size,
+                    self.bucket_batches,
+                )
+                return DataLoader(
+                    dataset,
+                    batch_sampler=sampler,
+                    collate_fn=collate_fn,
+                    num_workers=self.num_workers,
+                    persistent_workers=True,
+                )
 
-    def train_dataloader(self):
         return DataLoader(
-            self.train_dataset,
+            dataset,
             batch_size=self.batch_size,
-            collate_fn=TextDataCollator(self.tokenizer, self.max_length),
+            collate_fn=collate_fn,
             num_workers=self.num_workers,
             persistent_workers=True,
         )
 
+    def train_dataloader(self):
+        return self._dataloader(self.train_dataset, bucketed=True)
+
     def val_dataloader(self):
-        return DataLoader(
-            self.val_dataset,
-            batch_size=self.batch_size,
-            collate_fn=TextDataCollator(self.tokenizer, self.max_length),
-            num_workers=self.num_workers,
-            persistent_workers=True,
-        )
+        return self._dataloader(self.val_dataset, bucketed=False)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,283 @@
+"""
+Columnar, memory-mappable shard format for semantic datasets.
+
+A shard stores the same information as a `.protos` stream of TextData messages,
+but as flat arrays that can be memory-mapped, so readers only touch the pages of
+the sentences they actually sample:
+
+    magic (8 bytes) | header length (uint64) | JSON header | aligned sections
+
+Sections:
+    codes                   [num_frames, num_codebooks] int16 / int32
+    frame_offsets           [num_sentences + 1] int64, rows of codes per sentence
+    sentence_text_offsets   [num_sentences + 1] int64, entries of text_offsets per sentence
+    text_offsets            [num_texts + 1] int64, byte ranges in text_blob
+    text_blob               [num_bytes] uint8, utf-8 texts
+    group_offsets           [num_groups + 1] int64, sentence ranges per group
+
+Group names and sources live in the JSON header.
+"""
+
+import json
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+SHARD_MAGIC = b"FSSHARD1"
+SHARD_SUFFIX = ".shard"
+SECTION_ALIGNMENT = 64
+
+
+@dataclass
+class ShardSentence:
+    texts: list[str]
+    # [num_codebooks, num_frames]
+    semantics: np.ndarray
+
+
+class ShardWriter:
+    """
+    Accumulates groups of sentences and writes them as a single shard file.
+
+    The file is written to a temporary path and renamed on close, so readers
+    never see a partially written shard.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.num_codebooks = None
+
+        self.codes = []
+        self.frame_lengths = []
+        self.sentence_text_counts = []
+        self.texts = []
+        self.group_sizes = []
+        self.groups = []
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.groups)
+
+    def add_group(
+        self, name: str, source: str, sentences: list[tuple[list[str], np.ndarray]]
+    ):
+        """
+        Args:
+            name: group name, usually the speaker
+            source: where the group comes from (folder, filelist, ...)
+            sentences: list of (texts, codes) where codes is [num_codebooks, num_frames]
+        """
+
+        for texts, codes in sentences:
+            codes = np.asarray(codes)
+            assert (
+                codes.ndim == 2
+            ), f"Expected [num_codebooks, frames], got {codes.shape}"
+
+            if self.num_codebooks is None:
+                self.num_codebooks = codes.shape[0]
+            assert (
+                codes.shape[0] == self.num_codebooks
+            ), f"Expected {self.num_codebooks} codebooks, got {codes.shape[0]}"
+
+            self.codes.append(codes)
+            self.frame_lengths.append(codes.shape[1])
+            self.sentence_text_counts.append(len(texts))
+            encoded = [t.encode("utf-8") for t in texts]
+            self.texts.extend(encoded)
+            self.nbytes += codes.size * 2 + sum(len(t) for t in encoded)
+
+        self.group_sizes.append(len(sentences))
+        self.groups.append({"name": name, "source": source})
+
+    def close(self):
+        num_codebooks = self.num_codebooks or 0
+        if self.codes:
+            codes = np.concatenate(self.codes, axis=1).T
+        else:
+            codes = np.zeros((0, num_codebooks), dtype=np.int16)
+
+        code_dtype = (
+            np.int16
+            if codes.size == 0 or int(codes.max()) <= np.iinfo(np.int16).max
+            else np.int32
+        )
+
+        sections = {
+            "codes": np.ascontiguousarray(codes, dtype=code_dtype),
+            "frame_offsets": _offsets(self.frame_lengths),
+            "sentence_text_offsets": _offsets(self.sentence_text_counts),
+            "text_offsets": _offsets([len(t) for t in self.texts]),
+            "text_blob": np.frombuffer(b"".join(self.texts), dtype=np.uint8),
+            "group_offsets": _offsets(self.group_sizes),
+        }
+
+        header = {
+            "version": 1,
+            "num_codebooks": num_codebooks,
+            "groups": self.groups,
+            "sections": {},
+        }
+
+        # Section offsets depend on the header length, iterate until the layout is stable
+        offset = 0
+        for _ in range(8):
+            header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+            offset = _align(len(SHARD_MAGIC) + 8 + len(header_bytes))
+            layout = {}
+            for name, array in sections.items():
+                layout[name] = {
+                    "offset": offset,
+                    "dtype": array.dtype.str,
+                    "shape": list(array.shape),
+                }
+                offset = _align(offset + array.nbytes)
+            if layout == header["sections"]:
+                break
+            header["sections"] = layout
+
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(SHARD_MAGIC)
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            for name, array in sections.items():
+                f.seek(header["sections"][name]["offset"])
+                f.write(array.tobytes())
+            f.truncate(offset)
+
+        os.replace(tmp_path, self.path)
+
+
+class SemanticShard:
+    """
+    Read-only, memory-mapped view of a shard.
+    Only the small offset arrays are touched on open, codes and texts are paged in on demand.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+        with open(self.path, "rb") as f:
+            magic = f.read(len(SHARD_MAGIC))
+            if magic != SHARD_MAGIC:
+                raise ValueError(f"{self.path} is not a semantic shard")
+            (header_length,) = struct.unpack("<Q", f.read(8))
+            self.header = json.loads(f.read(header_length).decode("utf-8"))
+
+        self.num_codebooks = self.header["num_codebooks"]
+        self.groups = self.header["groups"]
+        self._arrays = None
+
+    def __getstate__(self):
+        # Memory maps are reopened lazily in every DataLoader worker
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+    def _section(self, name: str) -> np.ndarray:
+        if self._arrays is None:
+            self._arrays = {}
+
+        array = self._arrays.get(name)
+        if array is None:
+            meta = self.header["sections"][name]
+            shape = tuple(meta["shape"])
+            if np.prod(shape) == 0:
+                array = np.zeros(shape, dtype=meta["dtype"])
+            else:
+                array = np.memmap(
+                    self.path,
+                    dtype=meta["dtype"],
+                    mode="r",
+                    offset=meta["offset"],
+                    shape=shape,
+                )
+            self._arrays[name] = array
+
+        return array
+
+    @property
+    def num_groups(self) -> int:
+        return len(self.groups)
+
+    @property
+    def num_sentences(self) -> int:
+        return len(self._section("frame_offsets")) - 1
+
+    def group_sizes(self) -> np.ndarray:
+        return np.diff(self._section("group_offsets"))
+
+    def group_range(self, idx: int) -> tuple[int, int]:
+        offsets = self._section("group_offsets")
+        return int(offsets[idx]), int(offsets[idx + 1])
+
+    def sentence(self, idx: int) -> ShardSentence:
+        frame_offsets = self._section("frame_offsets")
+        text_index = self._section("sentence_text_offsets")
+        text_offsets = self._section("text_offsets")
+        blob = self._section("text_blob")
+
+        begin, end = int(frame_offsets[idx]), int(frame_offsets[idx + 1])
+        semantics = np.ascontiguousarray(self._section("codes")[begin:end].T)
+
+        texts = []
+        for t in range(int(text_index[idx]), int(text_index[idx + 1])):
+            start, stop = int(text_offsets[t]), int(text_offsets[t + 1])
+            texts.append(bytes(blob[start:stop]).decode("utf-8"))
+
+        return ShardSentence(texts=texts, semantics=semantics)
+
+
+class ShardGroup:
+    """A group (speaker) inside a shard, exposing its sentences lazily."""
+
+    def __init__(self, shard: SemanticShard, idx: int):
+        self.shard = shard
+        self.idx = idx
+        self.name = shard.groups[idx]["name"]
+        self.source = shard.groups[idx]["source"]
+        self.sentences = ShardSentences(shard, *shard.group_range(idx))
+
+
+class ShardSentences:
+    """Sequence view over a sentence range, sentences are materialized on access."""
+
+    def __init__(self, shard: SemanticShard, begin: int, end: int):
+        self.shard = shard
+        self.begin = begin
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.begin
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+
+        return self.shard.sentence(self.begin + idx)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _offsets(lengths: list[int]) -> np.ndarray:
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _align(offset: int) -> int:
+    return (offset + SECTION_ALIGNMENT - 1) // SECTION_ALIGNMENT * SECTION_ALIGNMENT
@@ -1,22 +1,28 @@
 import gc
 import queue
-from typing import Generator
+import time
+from typing import Generator, Optional
 
 import numpy as np
 import torch
-from loguru import logger
 
 from fish_speech.inference_engine.reference_loader import ReferenceLoader
 from fish_speech.inference_engine.utils import InferenceResult, wav_chunk_header
 from fish_speech.inference_engine.vq_manager import VQManager
 from fish_speech.models.dac.modded_dac import DAC
+from fish_speech.models.dac.onnx_codec import OnnxCodec
 from fish_speech.models.text2semantic.inference import (
+    CancellationToken,
     GenerateRequest,
     GenerateResponse,
     WrappedGenerateResponse,
 )
-from fish_speech.utils import autocast_exclude_mps, set_seed
+from fish_speech.utils import autocast_exclude_mps
 from fish_speech.utils.schema import ServeTTSRequest
+from fish_speech.utils.silence import trim_silence
+
+# Seconds of silence kept on each side of a trimmed segment, so sentences don't run together
+SEGMENT_KEEP_SILENCE = 0.1
 
 
 class TTSInferenceEngine(ReferenceLoader, VQManager):
@@ -24,9 +30,10 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
     def __init__(
         self,
         llama_queue: queue.Queue,
-        decoder_model: DAC,
+        decoder_model: DAC | OnnxCodec,
         precision: torch.dtype,
         compile: bool,
+        llama_device: str | torch.device | None = None,
     ) -> None:
 
         super().__init__()
@@ -35,16 +42,28 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
         self.decoder_model = decoder_model
         self.precision = precision
         self.compile = compile
+        # The codec may run elsewhere, e.g. on CPU with onnxruntime
+        self.llama_device = llama_device or decoder_model.device
 
     @torch.inference_mode()
-    def inference(self, req: ServeTTSRequest) -> Generator[InferenceResult, None, None]:
+    def inference(
+        self, req: ServeTTSRequest, cancel_token: Optional[CancellationToken] = None
+    ) -> Generator[InferenceResult, None, None]:
         """
         Main inference function:
         - Loads the reference audio and text.
         - Calls the LLAMA model for inference.
         - Decodes the VQ tokens to audio.
+
+        The LLAMA request is cancelled when this generator is closed before
+        the end, or once `req.timeout` seconds have passed.
         """
 
+        if cancel_token is None:
+            cancel_token = CancellationToken.with_timeout(req.timeout)
+        elif req.timeout is not None and cancel_token.deadline is None:
+            cancel_token.deadline = time.monotonic() + req.timeout
+
         ref_id: str | None = req.reference_id
         prompt_tokens, prompt_texts = [], []
         # Load the reference audio and text based on id or hash
@@ -56,13 +75,19 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
                 req.references, req.use_memory_cache
             )
 
-        # Set the random seed if provided
-        if req.seed is not None:
-            set_seed(req.seed)
-            logger.warning(f"set seed: {req.seed}")
-
         # Get the symbolic tokens from the LLAMA model
-        response_queue = self.send_Llama_request(req, prompt_tokens, prompt_texts)
+        response_queue = self.send_Llama_request(
+            req, prompt_tokens, prompt_texts, cancel_token
+        )
+        try:
+            yield from self._collect_segments(req, response_queue)
+        finally:
+            # No-op when the worker is done, otherwise the consumer went away
+            cancel_token.cancel("consumer closed")
+
+    def _collect_segments(
+        self, req: ServeTTSRequest, response_queue: queue.Queue
+    ) -> Generator[InferenceResult, None, None]:
 
         # Get the sample rate from the decoder model
         if hasattr(self.decoder_model, "spec_transform"):
@@ -107,6 +132,13 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
             result: GenerateResponse = wrapped_result.response
             if result.action != "next":
                 segment = self.get_audio_segment(result)
+                if req.trim_silence:
+                    segment = trim_silence(
+                        segment,
+                        sample_rate,
+                        keep_start=SEGMENT_KEEP_SILENCE,
+                        keep_end=SEGMENT_KEEP_SILENCE,
+                    )
 
                 if req.streaming:  # Used only by the API server
                     yield InferenceResult(
@@ -142,7 +174,11 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
         return None
 
     def send_Llama_request(
-        self, req: ServeTTSRequest, prompt_tokens: list, prompt_texts: list
+        self,
+        req: ServeTTSRequest,
+        prompt_tokens: list,
+        prompt_texts: list,
+        cancel_token: Optional[CancellationToken] = None,
     ) -> queue.Queue:
         """
         Send a request to the LLAMA model to generate the symbolic tokens.
@@ -150,7 +186,7 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
 
         # Prepare the request
         request = dict(
-            device=self.decoder_model.device,
+            device=self.llama_device,
             max_new_tokens=req.max_new_tokens,
             text=req.text,
             top_p=req.top_p,
@@ -161,6 +197,9 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
             chunk_length=req.chunk_length,
             prompt_tokens=prompt_tokens,
             prompt_text=prompt_texts,
+            voice_id=req.voice_id,
+            # Seeds the request's own generator, see generate
+            seed=req.seed,
         )
 
         # Create a queue to get the response
@@ -171,6 +210,10 @@ class TTSInferenceEngine(ReferenceLoader, VQManager):
             GenerateRequest(
                 request=request,
                 response_queue=response_queue,
+                cancel_token=cancel_token,
+                priority=req.priority,
+                tenant=req.tenant,
+                cost=self.llama_queue.estimate_cost(req.text, req.max_new_tokens),
             )
         )
 
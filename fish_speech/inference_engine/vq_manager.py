@@ -4,13 +4,14 @@ import torch
 from loguru import logger
 
 from fish_speech.models.dac.modded_dac import DAC
+from fish_speech.models.dac.onnx_codec import OnnxCodec
 
 
 class VQManager:
 
     def __init__(self):
         # Make Pylance happy (attribut/method not defined...)
-        self.decoder_model: DAC
+        self.decoder_model: DAC | OnnxCodec
         self.load_audio: Callable
 
     def decode_vq_tokens(self, codes):
@@ -19,7 +20,7 @@ class VQManager:
         )
         logger.info(f"VQ features: {codes.shape}")
 
-        if isinstance(self.decoder_model, DAC):
+        if isinstance(self.decoder_model, (DAC, OnnxCodec)):
             return self.decoder_model.decode(
                 indices=codes[None],
                 feature_lengths=feature_lengths,
@@ -47,7 +48,7 @@ class VQManager:
             )
 
             # VQ Encoder
-            if isinstance(self.decoder_model, DAC):
+            if isinstance(self.decoder_model, (DAC, OnnxCodec)):
                 prompt_tokens = self.decoder_model.encode(audios, audio_lengths)[0][0]
                 logger.info(f"Encoded prompt: {prompt_tokens.shape}")
             else:
@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 
 import click
@@ -11,6 +12,7 @@ from hydra import compose, initialize
 from hydra.utils import instantiate
 from loguru import logger
 from omegaconf import OmegaConf
+from safetensors.torch import load_file as load_safetensors
 
 pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
 
@@ -20,15 +22,28 @@ from fish_speech.utils.file import AUDIO_EXTENSIONS
 OmegaConf.register_new_resolver("eval", eval)
 
 
-def load_model(config_name, checkpoint_path, device="cuda"):
+def load_config(config_name):
     hydra.core.global_hydra.GlobalHydra.instance().clear()
     with initialize(version_base="1.3", config_path="../../configs"):
-        cfg = compose(config_name=config_name)
+        return compose(config_name=config_name)
+
+
+def load_model(config_name, checkpoint_path, device="cuda"):
+    checkpoint_path = Path(checkpoint_path)
+    config_path = checkpoint_path.with_suffix(".json")
+
+    if checkpoint_path.suffix == ".safetensors" and config_path.exists():
+        # Bundle from tools/export_bundle.py: resolved config, no Hydra composition
+        with open(config_path, encoding="utf-8") as f:
+            cfg = OmegaConf.create(json.load(f))
+        model = instantiate(cfg)
+        state_dict = load_safetensors(str(checkpoint_path), device=str(device))
+    else:
+        model = instantiate(load_config(config_name))
+        state_dict = torch.load(
+            checkpoint_path, map_location=device, mmap=True, weights_only=True
+        )
 
-    model = instantiate(cfg)
-    state_dict = torch.load(
-        checkpoint_path, map_location=device, mmap=True, weights_only=True
-    )
     if "state_dict" in state_dict:
         state_dict = state_dict["state_dict"]
 
@@ -0,0 +1,85 @@
+"""
+DAC codec on onnxruntime, for CPU boxes that only encode voice uploads and
+decode previews. The graphs are exported by tools/export_onnx.py:
+
+    <dir>/encoder.onnx, <dir>/decoder.onnx            float32
+    <dir>/encoder.int8.onnx, <dir>/decoder.int8.onnx  int8 dynamic quantization
+    <dir>/codec.json                                  sample rate, frame length
+"""
+
+import json
+import math
+from pathlib import Path
+
+import torch
+import torch.nn.functional as F
+
+ENCODER_NAME = "encoder"
+DECODER_NAME = "decoder"
+CONFIG_NAME = "codec.json"
+
+
+def onnx_path(onnx_dir: Path, name: str, int8: bool = False) -> Path:
+    return Path(onnx_dir) / f"{name}{'.int8' if int8 else ''}.onnx"
+
+
+class OnnxCodec:
+    """
+    The part of the DAC interface used for serving (encode, decode,
+    sample_rate, frame_length, device), backed by onnxruntime sessions.
+    Inputs may live on any device, outputs are CPU tensors.
+    """
+
+    def __init__(self, onnx_dir: str | Path, int8: bool = False, num_threads: int = 0):
+        # Optional dependency, only needed for this backend
+        import onnxruntime
+
+        onnx_dir = Path(onnx_dir)
+        with open(onnx_dir / CONFIG_NAME, encoding="utf-8") as f:
+            config = json.load(f)
+
+        self.sample_rate = config["sample_rate"]
+        self.hop_length = config["hop_length"]
+        self.frame_length = config["frame_length"]
+        self.device = torch.device("cpu")
+        self.int8 = int8
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+
+        def session(name):
+            return onnxruntime.InferenceSession(
+                str(onnx_path(onnx_dir, name, int8)),
+                options,
+                providers=["CPUExecutionProvider"],
+            )
+
+        self.encoder = session(ENCODER_NAME)
+        self.decoder = session(DECODER_NAME)
+
+    def encode(self, audio_data: torch.Tensor, audio_lengths: torch.Tensor = None):
+        # Same padding as DAC.encode, the graph expects whole frames
+        if audio_data.ndim == 2:
+            audio_data = audio_data.unsqueeze(1)
+        length = audio_data.shape[-1]
+        right_pad = math.ceil(length / self.frame_length) * self.frame_length - length
+        audio_data = F.pad(audio_data.detach().float().cpu(), (0, right_pad))
+        if audio_lengths is None:
+            audio_lengths = torch.LongTensor([length + right_pad])
+
+        (indices,) = self.encoder.run(None, {"audio": audio_data.numpy()})
+        indices_lens = torch.ceil(audio_lengths.cpu() / self.frame_length).long()
+        return torch.from_numpy(indices), indices_lens
+
+    def decode(self, indices: torch.Tensor, feature_lengths: torch.Tensor):
+        if indices.ndim == 2:
+            indices = indices[None]
+
+        (audio,) = self.decoder.run(
+            None, {"indices": indices.detach().long().cpu().numpy()}
+        )
+        return torch.from_numpy(audio), feature_lengths.cpu() * self.frame_length
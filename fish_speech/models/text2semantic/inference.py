@@ -1,3 +1,4 @@
+import hashlib
 import os
 import queue
 import threading
@@ -11,6 +12,7 @@ import click
 import numpy as np
 import torch
 import torch._inductor.config
+from cachetools import LRUCache
 from loguru import logger
 from tqdm import tqdm
 from transformers import AutoTokenizer
@@ -20,7 +22,6 @@ from fish_speech.content_sequence import (
     TextPart,
     VQPart,
 )
-from fish_speech.tokenizer import IM_END_TOKEN
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 torch._inductor.config.coordinate_descent_tuning = True
@@ -33,20 +34,113 @@ if hasattr(torch._inductor.config, "fx_graph_cache"):
 
 from torch.nn.attention import SDPBackend, sdpa_kernel
 
+from fish_speech.models.text2semantic.length_predictor import (
+    LengthPredictor,
+    RepetitionDetector,
+)
 from fish_speech.models.text2semantic.llama import (
     BaseTransformer,
     DualARTransformer,
     NaiveTransformer,
 )
+from fish_speech.models.text2semantic.lora_registry import LoraRegistry
+from fish_speech.models.text2semantic.scheduler import RequestScheduler
+
+# Tokens decoded between two checks of the cancellation token
+CANCEL_CHECK_INTERVAL = 16
+
+# With compile, prompts are right-padded to one of these lengths, so the
+# prefill graph only ever sees a fixed set of shapes
+PREFILL_BUCKETS = (128, 256, 384, 512, 768, 1024, 1536, 2048, 3072, 4096, 6144)
+
+# Dynamo graph count once start-up compiled everything, see compile_stats
+_graphs_at_ready: Optional[int] = None
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+class CancellationToken:
+    """
+    Set by the consumer of a request (client gone, job timed out) and polled by
+    the worker. `deadline` is a time.monotonic() timestamp, past it the token
+    counts as cancelled. Polling only reads host state, so it never syncs the GPU.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    @classmethod
+    def with_timeout(cls, timeout: Optional[float]) -> "CancellationToken":
+        return cls(None if timeout is None else time.monotonic() + timeout)
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+            return True
+        return False
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise GenerationCancelled(self.reason)
 
 
 def multinomial_sample_one_no_sync(
-    probs_sort,
+    probs_sort, noise: Optional[torch.Tensor] = None
 ):  # Does multinomial sampling without a cuda synchronization
-    q = torch.empty_like(probs_sort).exponential_(1)
+    # `noise`: Exponential(1) samples drawn beforehand, at least as wide as probs
+    if noise is None:
+        q = torch.empty_like(probs_sort).exponential_(1)
+    else:
+        q = noise[..., : probs_sort.size(-1)]
     return torch.argmax(probs_sort / q, dim=-1, keepdim=True).to(dtype=torch.int)
 
 
+def request_generator(
+    device: Union[str, torch.device], seed: Optional[int] = None
+) -> torch.Generator:
+    """The random state of one request, seeded requests don't touch the global one."""
+
+    generator = torch.Generator(device=device)
+    if seed is None:
+        generator.seed()
+    else:
+        generator.manual_seed(seed)
+    return generator
+
+
+def codebook_width(model: DualARTransformer) -> int:
+    """Number of codes the fast decoder samples a codebook from."""
+
+    return min(model.config.codebook_size, 1024)
+
+
+def sampling_noise(model: DualARTransformer, generator: torch.Generator):
+    """
+    Noise for one decode step, in one allocation: `vocab_size` values for the
+    semantic token, then `codebook_width` for each codebook from 1 on (codebook
+    0 follows from the semantic token). Drawn outside of the compiled step,
+    which only sees a tensor.
+    """
+
+    size = model.config.vocab_size
+    size += (model.config.num_codebooks - 1) * codebook_width(model)
+    return torch.empty(size, device=generator.device).exponential_(
+        1, generator=generator
+    )
+
+
 def logits_to_probs(
     logits,
     temperature: torch.Tensor,
@@ -84,6 +178,7 @@ def sample(
     top_p: torch.Tensor,
     repetition_penalty: torch.Tensor,
     previous_tokens: Optional[torch.Tensor] = None,
+    noise: Optional[torch.Tensor] = None,
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     probs = logits_to_probs(
         logits=logits[0, -1],
@@ -92,7 +187,7 @@ def sample(
         repetition_penalty=repetition_penalty,
         previous_tokens=previous_tokens,
     )
-    idx_next = multinomial_sample_one_no_sync(probs)
+    idx_next = multinomial_sample_one_no_sync(probs, noise)
     return idx_next, probs
 
 
@@ -106,6 +201,8 @@ def decode_one_token_ar(
     audio_masks: torch.Tensor,
     audio_parts: torch.Tensor,
     previous_tokens: Optional[torch.Tensor] = None,
+    last_pos: Optional[torch.Tensor] = None,
+    noise: Optional[torch.Tensor] = None,
 ) -> torch.Tensor:
     # print(x, torch.count_nonzero(vq_masks))
     forward_result = model.forward_generate(
@@ -113,6 +210,7 @@ def decode_one_token_ar(
         input_pos,
         audio_masks=audio_masks,
         audio_parts=audio_parts,
+        last_pos=last_pos,
     )
     logits = forward_result.logits  # [:, -1:]
     hidden_states = forward_result.hidden_states  # [:, -1:]
@@ -126,6 +224,7 @@ def decode_one_token_ar(
             previous_tokens=(
                 previous_tokens[:, 0] if previous_tokens is not None else None
             ),
+            noise=(noise[: model.config.vocab_size] if noise is not None else None),
         )[0]
     ]
 
@@ -142,13 +241,15 @@ def decode_one_token_ar(
     hidden_states = model.fast_embeddings(a)
     codebooks.append(a)
 
+    # Codebook c samples from noise[offset : offset + width]
+    width, offset = codebook_width(model), model.config.vocab_size
     for codebook_idx in range(1, model.config.num_codebooks):
         input_pos = torch.tensor(
             [codebook_idx], device=hidden_states.device, dtype=torch.long
         )
         logits = model.forward_generate_fast(hidden_states, input_pos)
 
-        short_logits = logits[:, :, :1024]
+        short_logits = logits[:, :, :width]
 
         # Convert logits to probs
         a = sample(
@@ -161,7 +262,9 @@ def decode_one_token_ar(
                 if previous_tokens is not None
                 else None
             ),
+            noise=noise[offset : offset + width] if noise is not None else None,
         )[0]
+        offset += width
 
         hidden_states = model.fast_embeddings(a)
         codebooks.append(a)
@@ -174,6 +277,63 @@ def decode_one_token_ar(
     return codebooks.T
 
 
+def prefill_one_token_ar(
+    model: DualARTransformer,
+    x: torch.Tensor,
+    input_pos: torch.Tensor,
+    last_pos: torch.Tensor,
+    temperature: torch.Tensor,
+    top_p: torch.Tensor,
+    repetition_penalty: torch.Tensor,
+    audio_masks: torch.Tensor,
+    audio_parts: torch.Tensor,
+    noise: Optional[torch.Tensor] = None,
+) -> torch.Tensor:
+    """
+    Prefills a right-padded prompt and samples the token following `last_pos`.
+    A function of its own so it is compiled apart from the decode step.
+    """
+
+    return decode_one_token_ar(
+        model,
+        x,
+        input_pos,
+        temperature,
+        top_p,
+        repetition_penalty,
+        audio_masks,
+        audio_parts,
+        last_pos=last_pos,
+        noise=noise,
+    )
+
+
+def prefill_buckets(max_seq_len: int) -> list[int]:
+    return [b for b in PREFILL_BUCKETS if b < max_seq_len] + [max_seq_len]
+
+
+def prefill_bucket(length: int, max_seq_len: int) -> int:
+    return next(b for b in prefill_buckets(max_seq_len) if b >= length)
+
+
+def compiled_graphs() -> int:
+    return torch._dynamo.utils.counters["stats"]["unique_graphs"]
+
+
+def mark_compile_ready():
+    """Called once start-up is done, graphs compiled after this are recompiles."""
+    global _graphs_at_ready
+    _graphs_at_ready = compiled_graphs()
+
+
+def compile_stats() -> dict:
+    graphs = compiled_graphs()
+    return {
+        "graphs": graphs,
+        "recompiles": (None if _graphs_at_ready is None else graphs - _graphs_at_ready),
+    }
+
+
 def decode_n_tokens(
     model: DualARTransformer,
     cur_token: torch.Tensor,
@@ -185,14 +345,23 @@ def decode_n_tokens(
     audio_masks: torch.Tensor,
     audio_parts: torch.Tensor,
     decode_one_token=decode_one_token_ar,
+    cancel_token: Optional[CancellationToken] = None,
+    on_token: Optional[Callable[[torch.Tensor], None]] = None,
+    generator: Optional[torch.Generator] = None,
 ):
     previous_tokens = torch.zeros(
         (model.config.num_codebooks + 1, model.config.max_seq_len),
         dtype=torch.int,
         device=cur_token.device,
     )
+    # Checked in blocks, so runaway detection costs one sync per block
+    repetition = RepetitionDetector()
+    checked = 0
 
     for i in tqdm(range(num_new_tokens)):
+        if cancel_token is not None and i % CANCEL_CHECK_INTERVAL == 0:
+            cancel_token.raise_if_cancelled()
+
         # We need to get windowed repeat penalty
         win_size = 16
         if i < win_size:
@@ -213,6 +382,9 @@ def decode_n_tokens(
                 repetition_penalty=repetition_penalty,
                 audio_masks=audio_masks,
                 audio_parts=audio_parts,
+                noise=(
+                    sampling_noise(model, generator) if generator is not None else None
+                ),
             ).clone()
 
         input_pos += 1
@@ -220,10 +392,21 @@ def decode_n_tokens(
         previous_tokens[:, i : i + 1] = next_token.view(
             model.config.num_codebooks + 1, -1
         )
+        if on_token is not None:
+            on_token(next_token)
 
-        if cur_token[0, 0, -1] == model.tokenizer.get_token_id(IM_END_TOKEN):
+        if cur_token[0, 0, -1] == model.tokenizer.im_end_id:
             break
 
+        if (i + 1) % CANCEL_CHECK_INTERVAL == 0:
+            loop_start = repetition.extend(previous_tokens[0, checked : i + 1].tolist())
+            checked = i + 1
+            if loop_start is not None:
+                logger.warning(f"Runaway repetition from token {loop_start}, stopping")
+                # The caller drops the last token as im_end, one looped token is kept
+                i = loop_start
+                break
+
     # Only clean up the large tensor
     del cur_token
 
@@ -241,10 +424,19 @@ def generate(
     audio_parts: torch.Tensor,
     decode_one_token=decode_one_token_ar,
     num_samples: int = 1,
+    cancel_token: Optional[CancellationToken] = None,
+    on_token: Optional[Callable[[torch.Tensor], None]] = None,
+    draft_model: Optional[DualARTransformer] = None,
+    num_draft_tokens: int = 4,
+    seed: Optional[int] = None,
     **sampling_kwargs,
 ):
     """
     Takes a conditioning sequence (prompt) as input and continues to generate as many tokens as requested.
+    `on_token` is called with every generated [num_codebooks + 1, 1] token, as soon as it is sampled.
+    With `draft_model`, decoding is speculative, see speculative.py.
+    Sampling draws from a generator of the request's own, the same `seed` gives the
+    same tokens whatever ran before or next to it.
     """
 
     # create an empty tensor of the expected final shape and fill in the current tokens
@@ -266,6 +458,7 @@ def generate(
         max_new_tokens = T_new - T
 
     device, dtype = prompt.device, prompt.dtype
+    generator = request_generator(device, seed)
 
     # Critical fix: Only set up cache on first run or when necessary
     if not hasattr(model, "_cache_setup_done") or not model._cache_setup_done:
@@ -312,8 +505,6 @@ def generate(
     if abs(repetition_penalty.item() - rep_val) > 1e-6:
         repetition_penalty.fill_(rep_val)
 
-    prefill_decode = decode_one_token_ar
-
     # v12.15 FIX: Clamp Out-of-Bounds Tokens
     if prompt is not None:
         vocab_size = model.config.vocab_size
@@ -325,35 +516,79 @@ def generate(
             logger.warning(f"--- [v12.15 FIX] CLAMPING {max_val} -> 0 (Exceeds Vocab {vocab_size}) ---")
             # Replace out-of-bounds tokens with 0 (Padding/UNK)
             prompt = torch.where(prompt >= vocab_size, torch.tensor(0, device=prompt.device, dtype=prompt.dtype), prompt)
-    
-    
-    first_token = prefill_decode(
+
+    # Padding comes after the prompt, so the causal mask already hides it and
+    # decoding overwrites its cache entries before they become visible.
+    # Audio parts have a data dependent shape, those prompts aren't padded.
+    buckets = getattr(model, "prefill_buckets", None)
+    if buckets and audio_parts is None:
+        length = prefill_bucket(T, model.config.max_seq_len)
+        x = torch.zeros((1, codebook_dim, length), dtype=dtype, device=device)
+        x[0, :, :T] = prompt.view(codebook_dim, -1)
+        input_pos = torch.arange(0, length, device=device, dtype=torch.long)
+    else:
+        x = prompt.view(1, codebook_dim, -1)
+
+    first_token = getattr(model, "prefill_one_token", prefill_one_token_ar)(
         model,
-        prompt.view(1, codebook_dim, -1),
+        x,
         input_pos,
+        torch.tensor([T - 1], device=device, dtype=torch.long),
         temperature,
         top_p,
         repetition_penalty,
         audio_masks,
         audio_parts,
+        sampling_noise(model, generator),
     )
     seq[:, T : T + 1] = first_token
+    if on_token is not None:
+        on_token(first_token)
+
+    # The draft model has no audio projector, audio prompts decode normally
+    speculative = draft_model is not None and audio_parts is None
+    if speculative:
+        draft_model.forward_generate(x, input_pos)
 
     # Recreate input_pos
     input_pos = torch.tensor([T], device=device, dtype=torch.int)
 
-    x = decode_n_tokens(
-        model,
-        first_token.view(1, codebook_dim, -1),
-        input_pos,
-        max_new_tokens - 1,
-        temperature=temperature,
-        top_p=top_p,
-        repetition_penalty=repetition_penalty,
-        audio_masks=audio_masks,
-        audio_parts=audio_parts,
-        decode_one_token=decode_one_token,
-    )
+    if speculative:
+        # Imported here, speculative.py builds on this module
+        from fish_speech.models.text2semantic.speculative import (
+            decode_n_tokens_speculative,
+        )
+
+        x = decode_n_tokens_speculative(
+            model,
+            draft_model,
+            first_token.view(1, codebook_dim, -1),
+            input_pos,
+            max_new_tokens - 1,
+            temperature=temperature,
+            top_p=top_p,
+            repetition_penalty=repetition_penalty,
+            num_draft_tokens=num_draft_tokens,
+            cancel_token=cancel_token,
+            on_token=on_token,
+            generator=generator,
+        )
+    else:
+        x = decode_n_tokens(
+            model,
+            first_token.view(1, codebook_dim, -1),
+            input_pos,
+            max_new_tokens - 1,
+            temperature=temperature,
+            top_p=top_p,
+            repetition_penalty=repetition_penalty,
+            audio_masks=audio_masks,
+            audio_parts=audio_parts,
+            decode_one_token=decode_one_token,
+            cancel_token=cancel_token,
+            on_token=on_token,
+            generator=generator,
+        )
     seq = seq[:, : T + 1 + x.size(1)]
     seq[:, T + 1 :] = x
 
@@ -384,6 +619,9 @@ def init_model(checkpoint_path, device, precision, compile=False):
     # Mark whether cache has been initialized
     model._cache_setup_done = False
 
+    model.prefill_one_token = prefill_one_token_ar
+    model.prefill_buckets = None
+
     if compile:
         logger.info("Compiling function...")
         decode_one_token = torch.compile(
@@ -393,9 +631,99 @@ def init_model(checkpoint_path, device, precision, compile=False):
             fullgraph=True,
         )
 
+        # One static graph per bucket. No CUDA graphs, prefill is compute bound
+        # and a graph pool per bucket would pin a lot of memory.
+        model.prefill_buckets = prefill_buckets(model.config.max_seq_len)
+        model.prefill_one_token = torch.compile(
+            prefill_one_token_ar,
+            backend="inductor" if torch.cuda.is_available() else "aot_eager",
+            dynamic=False,
+            fullgraph=True,
+        )
+        torch._dynamo.config.cache_size_limit = max(
+            torch._dynamo.config.cache_size_limit, len(model.prefill_buckets) + 8
+        )
+
     return model.eval(), decode_one_token
 
 
+def precompile(model, decode_one_token):
+    """
+    Runs a dummy prompt through every prefill bucket and a few decode steps,
+    so the first real prompt of each length doesn't compile at serve time.
+    """
+
+    codebook_dim = 1 + model.config.num_codebooks
+    device = next(model.parameters()).device
+    previous = 0
+    for bucket in model.prefill_buckets:
+        start = time.perf_counter()
+        generate(
+            model=model,
+            prompt=torch.zeros(
+                (codebook_dim, previous + 1), dtype=torch.int, device=device
+            ),
+            max_new_tokens=4,
+            audio_masks=None,
+            audio_parts=None,
+            decode_one_token=decode_one_token,
+        )
+        logger.info(
+            f"Compiled prefill bucket {bucket} in {time.perf_counter() - start:.2f}s"
+        )
+        previous = bucket
+
+
+PROMPT_CACHE_SIZE = 32
+prompt_block_cache = LRUCache(maxsize=PROMPT_CACHE_SIZE)
+prompt_block_cache_lock = threading.Lock()
+
+
+def encode_prompt_block(
+    tokenizer,
+    num_codebooks: int,
+    prompt_text: list[str],
+    prompt_tokens: list[torch.Tensor],
+) -> torch.Tensor:
+    """
+    Encode the modality token and the reference turns of the prompt.
+    The result only depends on the references, so it is cached per reference set.
+    """
+
+    key = (
+        id(tokenizer),
+        num_codebooks,
+        tuple(prompt_text),
+        tuple(
+            (tuple(c.shape), hashlib.sha1(c.contiguous().numpy().tobytes()).digest())
+            for c in prompt_tokens
+        ),
+    )
+
+    with prompt_block_cache_lock:
+        block = prompt_block_cache.get(key)
+    if block is not None:
+        return block
+
+    sequence = ContentSequence(modality="interleave")
+    for t, c in zip(prompt_text, prompt_tokens):
+        sequence.append(
+            [
+                TextPart(text=t),
+                VQPart(codes=c),
+            ],
+            add_end=True,
+            speaker=0,
+        )
+
+    block, _, _ = sequence.encode_for_inference(tokenizer, num_codebooks=num_codebooks)
+
+    with prompt_block_cache_lock:
+        prompt_block_cache[key] = block
+
+    return block
+
+
 @dataclass
 class GenerateResponse:
     action: Literal["sample", "next"]
@@ -419,7 +747,17 @@ def generate_long(
     chunk_length: int = 512,
     prompt_text: Optional[Union[str, list[str]]] = None,
     prompt_tokens: Optional[Union[torch.Tensor, list[torch.Tensor]]] = None,
+    cancel_token: Optional[CancellationToken] = None,
+    draft_model: Optional[DualARTransformer] = None,
+    num_draft_tokens: int = 4,
+    length_predictor: Optional[LengthPredictor] = None,
+    seed: Optional[int] = None,
 ):
+    """
+    With `length_predictor`, decoding stops at its ceiling for `text`, well
+    before max_seq_len when the model never emits im_end.
+    """
+
     assert 0 < top_p <= 1, "top_p must be in (0, 1]"
     assert 0 < repetition_penalty < 2, "repetition_penalty must be in (0, 2)"
     assert 0 < temperature < 2, "temperature must be in (0, 2)"
@@ -439,36 +777,42 @@ def generate_long(
 
     model_size = sum(p.numel() for p in model.parameters() if p.requires_grad)
     tokenizer = model.tokenizer
-    base_content_sequence = ContentSequence(modality="interleave")
+    num_codebooks = model.config.num_codebooks
 
     max_length = model.config.max_seq_len
-    if use_prompt:
-        for t, c in zip(prompt_text, prompt_tokens):
-            base_content_sequence.append(
-                [
-                    TextPart(text=t),
-                    VQPart(codes=c),
-                ],
-                add_end=True,
-                speaker=0,
-            )
-    base_content_sequence.append(
+
+    # The reference block is identical across requests, only the new text is encoded
+    prompt_block = encode_prompt_block(
+        tokenizer,
+        num_codebooks,
+        prompt_text if use_prompt else [],
+        prompt_tokens if use_prompt else [],
+    )
+    text_sequence = ContentSequence()
+    text_sequence.append(
         [
             TextPart(text=text),
         ],
         add_end=False,
         speaker=0,
     )
-
-    encoded, audio_masks, audio_parts = base_content_sequence.encode_for_inference(
-        tokenizer, num_codebooks=model.config.num_codebooks
+    text_block, audio_masks, audio_parts = text_sequence.encode_for_inference(
+        tokenizer, num_codebooks=num_codebooks
     )
+    encoded = torch.cat([prompt_block, text_block], dim=1)
     if encoded.size(1) > max_length - 2048:
         raise ValueError(f"Prompt is too long: {encoded.size(1)} > {max_length - 2048}")
 
     encoded = encoded.to(device=device)
     logger.info(f"Encoded text: {text}")
 
+    if length_predictor is not None:
+        max_new_tokens = length_predictor.ceiling(text, max_new_tokens)
+        logger.info(
+            f"Expected {length_predictor.expected_frames(text):.0f} tokens, "
+            f"ceiling {max_new_tokens}"
+        )
+
     for sample_idx in range(num_samples):
         if torch.cuda.is_available():
             torch.cuda.synchronize()
@@ -489,6 +833,11 @@ def generate_long(
             temperature=temperature,
             top_p=top_p,
             repetition_penalty=repetition_penalty,
+            cancel_token=cancel_token,
+            draft_model=draft_model,
+            num_draft_tokens=num_draft_tokens,
+            # Samples after the first differ, but stay reproducible
+            seed=None if seed is None else seed + sample_idx,
         )
 
         if sample_idx == 0 and seg_idx == 0 and compile:
@@ -528,6 +877,53 @@ def generate_long(
         yield GenerateResponse(action="next")
 
 
+def generate_agent(
+    *,
+    model,
+    decode_one_token: Callable,
+    prompt: torch.Tensor,
+    response_queue: queue.Queue,
+    max_new_tokens: int,
+    im_end_id: int,
+    num_samples: int = 1,
+    early_stop_threshold: float = 1.0,
+    cancel_token: Optional[CancellationToken] = None,
+    draft_model: Optional[DualARTransformer] = None,
+    num_draft_tokens: int = 4,
+    **sampling_kwargs,
+):
+    """
+    Chat generation from an encoded conversation. Every token is put on
+    `response_queue` as a [num_samples, num_codebooks + 1, 1] CPU tensor as soon
+    as it is sampled, followed by "stop" (or "error" when it fails).
+    """
+
+    if num_samples != 1:
+        raise ValueError("Chat generation supports a single sample per request")
+    if im_end_id != model.tokenizer.im_end_id:
+        raise ValueError(f"Unexpected im_end id {im_end_id}")
+
+    codebook_dim = model.config.num_codebooks + 1
+
+    def on_token(token: torch.Tensor):
+        response_queue.put(token.view(1, codebook_dim, 1).cpu())
+
+    generate(
+        model=model,
+        prompt=prompt,
+        max_new_tokens=max_new_tokens,
+        audio_masks=None,
+        audio_parts=None,
+        decode_one_token=decode_one_token,
+        cancel_token=cancel_token,
+        on_token=on_token,
+        draft_model=draft_model,
+        num_draft_tokens=num_draft_tokens,
+        **sampling_kwargs,
+    )
+    response_queue.put("stop")
+
+
 @dataclass
 class WrappedGenerateResponse:
     status: Literal["success", "error"]
@@ -538,6 +934,11 @@ class WrappedGenerateResponse:
 class GenerateRequest:
     request: dict
     response_queue: queue.Queue
+    cancel_token: Optional[CancellationToken] = None
+    # Scheduling: class, tenant for the concurrency caps, estimated semantic tokens
+    priority: Literal["interactive", "batch"] = "interactive"
+    tenant: Optional[str] = None
+    cost: float = 0.0
 
 
 def launch_thread_safe_queue(
@@ -545,20 +946,59 @@ def launch_thread_safe_queue(
     device,
     precision,
     compile: bool = False,
+    lora_dir: Optional[str] = None,
+    lora_cache_size: int = 8,
+    lora_max_rank: int = 16,
+    max_running_per_tenant: int = 0,
+    max_pending_per_tenant: int = 0,
+    draft_checkpoint_path: Optional[str] = None,
+    num_draft_tokens: int = 4,
+    length_predictor_path: Optional[str] = None,
 ):
-    input_queue = queue.Queue()
+    # Calibrated with tools/llama/calibrate_length.py, defaults otherwise
+    length_predictor = (
+        LengthPredictor.load(length_predictor_path)
+        if length_predictor_path
+        else LengthPredictor()
+    )
+    # Short interactive requests go first instead of waiting behind long batch jobs
+    input_queue = RequestScheduler(
+        max_running_per_tenant=max_running_per_tenant,
+        max_pending_per_tenant=max_pending_per_tenant,
+        length_predictor=length_predictor,
+    )
     init_event = threading.Event()
 
     def worker():
         model, decode_one_token = init_model(
             checkpoint_path, device, precision, compile=compile
         )
+
+        # Per-voice LoRA adapters on top of the shared base weights
+        lora_registry = None
+        if lora_dir:
+            lora_registry = LoraRegistry(
+                model, lora_dir, capacity=lora_cache_size, max_rank=lora_max_rank
+            )
         with torch.device(device):
             model.setup_caches(
                 max_batch_size=1,
                 max_seq_len=model.config.max_seq_len,
                 dtype=next(model.parameters()).dtype,
             )
+
+        # Small model proposing tokens for speculative decoding
+        draft_model = None
+        if draft_checkpoint_path:
+            from fish_speech.models.text2semantic.speculative import load_draft_model
+
+            draft_model = load_draft_model(
+                draft_checkpoint_path, model, device, precision
+            )
+
+        if compile:
+            precompile(model, decode_one_token)
+        graphs_seen = compiled_graphs()
         init_event.set()
 
         while True:
@@ -568,26 +1008,78 @@ def launch_thread_safe_queue(
 
             kwargs = item.request
             response_queue = item.response_queue
+            cancel_token = item.cancel_token
+            voice_id = kwargs.pop("voice_id", None)
+            # Chat requests carry an encoded conversation and get raw tokens back
+            is_chat = "prompt" in kwargs
+
+            def put_error(e: Exception):
+                response_queue.put(
+                    "error"
+                    if is_chat
+                    else WrappedGenerateResponse(status="error", response=e)
+                )
 
             try:
-                for chunk in generate_long(
-                    model=model, decode_one_token=decode_one_token, **kwargs
-                ):
-                    response_queue.put(
-                        WrappedGenerateResponse(status="success", response=chunk)
+                # Abandoned while queued, don't even prefill it
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+
+                if lora_registry is not None:
+                    lora_registry.activate(voice_id)
+
+                if is_chat:
+                    generate_agent(
+                        model=model,
+                        decode_one_token=decode_one_token,
+                        response_queue=response_queue,
+                        cancel_token=cancel_token,
+                        draft_model=draft_model,
+                        num_draft_tokens=num_draft_tokens,
+                        **kwargs,
                     )
+                else:
+                    for chunk in generate_long(
+                        model=model,
+                        decode_one_token=decode_one_token,
+                        cancel_token=cancel_token,
+                        draft_model=draft_model,
+                        num_draft_tokens=num_draft_tokens,
+                        length_predictor=length_predictor,
+                        **kwargs,
+                    ):
+                        response_queue.put(
+                            WrappedGenerateResponse(status="success", response=chunk)
+                        )
 
                 # Only clear cache after complete request batch
                 if torch.cuda.is_available():
                     torch.cuda.empty_cache()
 
+            except GenerationCancelled as e:
+                logger.info(f"Generation cancelled: {e}")
+                # Unblocks a consumer that may still be waiting, e.g. on a deadline
+                put_error(e)
+
             except Exception as e:
                 logger.error(traceback.format_exc())
-                response_queue.put(WrappedGenerateResponse(status="error", response=e))
+                put_error(e)
                 # Clear cache on error
                 if torch.cuda.is_available():
                     torch.cuda.empty_cache()
 
+            finally:
+                input_queue.done(item)
+
+            if compile:
+                graphs = compiled_graphs()
+                if _graphs_at_ready is not None and graphs > graphs_seen:
+                    logger.warning(
+                        f"Compiled {graphs - graphs_seen} new graph(s) while serving, "
+                        f"{graphs - _graphs_at_ready} since start-up"
+                    )
+                graphs_seen = graphs
+
     threading.Thread(target=worker, daemon=True).start()
     init_event.wait()
 
@@ -624,6 +1116,19 @@ def launch_thread_safe_queue(
 @click.option("--iterative-prompt/--no-iterative-prompt", default=True)
 @click.option("--chunk-length", type=int, default=300)
 @click.option("--output-dir", type=Path, default="temp")
+@click.option(
+    "--draft-checkpoint-path",
+    type=click.Path(path_type=Path, exists=True),
+    default=None,
+    help="Small DualAR model for speculative decoding",
+)
+@click.option("--num-draft-tokens", type=int, default=4)
+@click.option(
+    "--length-predictor-path",
+    type=click.Path(path_type=Path, exists=True),
+    default=None,
+    help="Calibration from tools/llama/calibrate_length.py",
+)
 def main(
     text: str,
     prompt_text: Optional[tuple[str, ...]],
@@ -641,6 +1146,9 @@ def main(
     iterative_prompt: bool,
     chunk_length: int,
     output_dir: Path,
+    draft_checkpoint_path: Optional[Path],
+    num_draft_tokens: int,
+    length_predictor_path: Optional[Path],
 ) -> None:
     os.makedirs(output_dir, exist_ok=True)
     precision = torch.half if half else torch.bfloat16
@@ -665,6 +1173,12 @@ def main(
             max_seq_len=model.config.max_seq_len,
             dtype=next(model.parameters()).dtype,
         )
+    draft_model = None
+    if draft_checkpoint_path is not None:
+        from fish_speech.models.text2semantic.speculative import load_draft_model
+
+        draft_model = load_draft_model(draft_checkpoint_path, model, device, precision)
+
     if torch.cuda.is_available():
         torch.cuda.synchronize()
 
@@ -674,11 +1188,6 @@ def main(
     if prompt_tokens is not None:
         prompt_tokens_list = [torch.from_numpy(np.load(p)) for p in prompt_tokens]
 
-    torch.manual_seed(seed)
-
-    if torch.cuda.is_available():
-        torch.cuda.manual_seed(seed)
-
     generator = generate_long(
         model=model,
         device=device,
@@ -694,6 +1203,14 @@ def main(
         chunk_length=chunk_length,
         prompt_text=list(prompt_text) if prompt_text else None,
         prompt_tokens=prompt_tokens_list,
+        draft_model=draft_model,
+        num_draft_tokens=num_draft_tokens,
+        length_predictor=(
+            LengthPredictor.load(length_predictor_path)
+            if length_predictor_path
+            else LengthPredictor()
+        ),
+        seed=seed,
     )
 
     idx = 0
@@ -0,0 +1,165 @@
+"""
+Length control for semantic decoding.
+
+The codec emits ~21 semantic frames per second of speech. `LengthPredictor`
+estimates how many frames a text will take from a few counts over it (letters
+as a stand-in for phonemes, CJK syllables, digits, pauses, words), with
+weights fitted on (text, frames) pairs of a dataset, see
+tools/llama/calibrate_length.py. The estimate sets a per-request ceiling on
+the number of decoded tokens and is the cost the scheduler orders requests by.
+
+`RepetitionDetector` catches the other way decoding runs away: the model stuck
+repeating the same few frames until it hits the ceiling.
+"""
+
+import json
+import re
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+FRAME_RATE = 21.0
+
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+LETTER_PATTERN = re.compile(r"[^\W\d_]")
+DIGIT_PATTERN = re.compile(r"\d")
+PAUSE_PATTERN = re.compile(r"[,.;:!?，。；：！？、…—]")
+
+FEATURES = ("bias", "letters", "cjk", "digits", "pauses", "words")
+
+# Frames per unit. English runs at ~14 chars per second (~1.5 frames per char),
+# a CJK syllable at ~4.5 per second, a digit is read as a whole word
+DEFAULT_WEIGHTS = {
+    "bias": 4.0,
+    "letters": 1.3,
+    "cjk": 4.5,
+    "digits": 3.0,
+    "pauses": 4.0,
+    "words": 1.0,
+}
+
+
+def text_features(text: str) -> dict[str, int]:
+    cjk = len(CJK_PATTERN.findall(text))
+    return {
+        "bias": 1,
+        "letters": len(LETTER_PATTERN.findall(text)) - cjk,
+        "cjk": cjk,
+        "digits": len(DIGIT_PATTERN.findall(text)),
+        "pauses": len(PAUSE_PATTERN.findall(text)),
+        "words": len(text.split()),
+    }
+
+
+@dataclass
+class LengthPredictor:
+    weights: dict[str, float] = field(default_factory=lambda: dict(DEFAULT_WEIGHTS))
+    # Decoding stops at ceiling_ratio x expected frames + ceiling_margin
+    ceiling_ratio: float = 2.0
+    ceiling_margin: int = 64
+
+    def expected_frames(self, text: str) -> float:
+        features = text_features(text)
+        return sum(self.weights.get(name, 0.0) * features[name] for name in FEATURES)
+
+    def expected_seconds(self, text: str) -> float:
+        return self.expected_frames(text) / FRAME_RATE
+
+    def ceiling(self, text: str, max_new_tokens: int = 0) -> int:
+        """
+        Tokens `text` may decode at most. An explicit `max_new_tokens` (> 0)
+        only ever lowers it.
+        """
+
+        ceiling = int(self.ceiling_ratio * self.expected_frames(text))
+        ceiling += self.ceiling_margin
+        return min(ceiling, max_new_tokens) if max_new_tokens > 0 else ceiling
+
+    def estimate_cost(self, text: str, max_new_tokens: int = 0) -> float:
+        """Expected number of semantic tokens to decode for `text`."""
+
+        cost = self.expected_frames(text)
+        return min(cost, max_new_tokens) if max_new_tokens > 0 else cost
+
+    @classmethod
+    def fit(cls, samples: Iterable[tuple[str, int]], **kwargs) -> "LengthPredictor":
+        """
+        Least squares fit on (text, frames) pairs. Weights are kept non-negative,
+        features fitted as negative are dropped and the rest refitted.
+        """
+
+        samples = list(samples)
+        if not samples:
+            raise ValueError("No samples to fit")
+
+        x = np.array(
+            [[text_features(text)[name] for name in FEATURES] for text, _ in samples],
+            dtype=np.float64,
+        )
+        y = np.array([frames for _, frames in samples], dtype=np.float64)
+
+        active = list(range(len(FEATURES)))
+        while True:
+            solution = np.linalg.lstsq(x[:, active], y, rcond=None)[0]
+            negative = [a for a, w in zip(active, solution) if w < 0]
+            if not negative:
+                break
+            active = [a for a in active if a not in negative]
+
+        weights = dict.fromkeys(FEATURES, 0.0)
+        for a, w in zip(active, solution):
+            weights[FEATURES[a]] = float(w)
+        return cls(weights=weights, **kwargs)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "LengthPredictor":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    def save(self, path: str | Path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+
+
+class RepetitionDetector:
+    """
+    Fed the semantic tokens as they are decoded, reports a loop once the last
+    `min_frames` tokens (and at least `min_repeats` periods) repeat with a
+    period of at most `max_period` tokens.
+    """
+
+    def __init__(
+        self, max_period: int = 32, min_repeats: int = 4, min_frames: int = 64
+    ):
+        self.max_period = max_period
+        self.min_repeats = min_repeats
+        self.min_frames = min_frames
+        self._recent = deque(maxlen=max_period)
+        # _runs[p - 1]: consecutive tokens equal to the token p positions before
+        self._runs = [0] * max_period
+        self._count = 0
+
+    def extend(self, tokens: Iterable[int]) -> Optional[int]:
+        """
+        Returns where the loop starts repeating (the first period is kept), as a
+        number of tokens fed so far, or None.
+        """
+
+        for token in tokens:
+            for p in range(1, self.max_period + 1):
+                if len(self._recent) >= p and self._recent[-p] == token:
+                    self._runs[p - 1] += 1
+                else:
+                    self._runs[p - 1] = 0
+
+                run = self._runs[p - 1]
+                if run + p >= max(self.min_repeats * p, self.min_frames):
+                    return self._count + 1 - run
+
+            self._recent.append(token)
+            self._count += 1
+
+        return None
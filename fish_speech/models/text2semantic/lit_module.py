@@ -120,6 +120,9 @@ class TextToSemantic(L.LightningModule):
             inp=batch["inputs"],
             key_padding_mask=batch["attention_masks"],
             labels=batch["labels"],
+            # Only present when the collator packs several samples per row
+            document_ids=batch.get("document_ids"),
+            position_ids=batch.get("position_ids"),
         )
         token_logits = outputs.token_logits
         codebook_logits = outputs.codebook_logits
@@ -10,6 +10,7 @@ import torch
 import torch.nn as nn
 from einops import rearrange
 from loguru import logger
+from safetensors.torch import load_file as load_safetensors
 from torch import Tensor
 from torch.nn import functional as F
 from torch.nn.attention import SDPBackend, sdpa_kernel
@@ -19,6 +20,9 @@ from transformers import AutoTokenizer
 from fish_speech.models.text2semantic.lora import LoraConfig, setup_lora
 from fish_speech.tokenizer import SEMANTIC_TOKENS, FishTokenizer
 
+# Weights of a checkpoint converted by tools/export_bundle.py, preferred over model.pth
+BUNDLE_WEIGHTS_NAME = "model.safetensors"
+
 
 def find_multiple(n: int, k: int) -> int:
     if n % k == 0:
@@ -275,19 +279,35 @@ class BaseTransformer(nn.Module):
         self,
         inp: Tensor,
         key_padding_mask: Optional[Tensor] = None,
+        document_ids: Optional[Tensor] = None,
+        position_ids: Optional[Tensor] = None,
     ) -> BaseTransformerForwardResult:
         seq_len = inp.size(2)
 
         # Here we want to merge the embeddings of the codebooks
         x = self.embed(inp)
 
-        freqs_cis = self.freqs_cis[:seq_len]
+        # Packed rows restart positions at every document
+        if position_ids is None:
+            freqs_cis = self.freqs_cis[:seq_len]
+        else:
+            freqs_cis = self.freqs_cis[position_ids]
 
         # Not that the causal mask here follows the definition of scaled_dot_product_attention
         # That is, FALSE means masked out
         # To maintain consistency, key_padding_mask use TRUE to mask out
         mask = None
-        if key_padding_mask is not None:
+        if document_ids is not None:
+            # Packed rows: block-diagonal causal mask, tokens only see their own document.
+            # Padding is its own document, so no query row is fully masked.
+            causal = self.causal_mask[:seq_len, :seq_len]
+            causal = rearrange(causal, "q k -> 1 1 q k")
+
+            same_document = rearrange(document_ids, "b q -> b 1 q 1") == rearrange(
+                document_ids, "b k -> b 1 1 k"
+            )
+            mask = causal & same_document
+        elif key_padding_mask is not None:
             causal = self.causal_mask[:seq_len, :seq_len]
             causal = rearrange(causal, "q k -> 1 1 q k")
 
@@ -323,6 +343,7 @@ class BaseTransformer(nn.Module):
         audio_masks: Optional[Tensor] = None,
         audio_parts: Optional[Tensor] = None,
         return_all: bool = False,
+        last_pos: Optional[Tensor] = None,
     ) -> BaseTransformerForwardResult:
         # This is used for generation, optimized for torch compile
         # assert (
@@ -373,8 +394,9 @@ class BaseTransformer(nn.Module):
             x = layer(x, freqs_cis, mask, input_pos=input_pos)
 
         # If prefill, we only calculate the logits of last token
+        # (`last_pos` of a right-padded prompt)
         if x.size(1) > 1 and not return_all:
-            x = x[:, -1:]
+            x = x[:, -1:] if last_pos is None else x.index_select(1, last_pos)
 
         # We got slow_out here
         slow_out = self.norm(x)
@@ -453,12 +475,17 @@ class BaseTransformer(nn.Module):
                 simple_quantizer = WeightOnlyInt4QuantHandler(model, groupsize)
                 model = simple_quantizer.convert_for_runtime()
 
-            weights = torch.load(
-                Path(path) / "model.pth",
-                map_location="cpu",
-                mmap=True,
-                weights_only=True,
-            )
+            bundle_path = Path(path) / BUNDLE_WEIGHTS_NAME
+            if bundle_path.exists():
+                # Pre-converted by tools/export_bundle.py: clean keys, target dtype, mmapped
+                weights = load_safetensors(str(bundle_path), device="cpu")
+            else:
+                weights = torch.load(
+                    Path(path) / "model.pth",
+                    map_location="cpu",
+                    mmap=True,
+                    weights_only=True,
+                )
 
             if "state_dict" in weights:
                 logger.warning(
@@ -550,10 +577,14 @@ class NaiveTransformer(BaseTransformer):
         self,
         inp: Tensor,
         key_padding_mask: Optional[Tensor] = None,
+        document_ids: Optional[Tensor] = None,
+        position_ids: Optional[Tensor] = None,
     ) -> TransformerForwardResult:
         result = super().forward(
             inp=inp,
             key_padding_mask=key_padding_mask,
+            document_ids=document_ids,
+            position_ids=position_ids,
         )
         return self.decode(result)
 
@@ -638,10 +669,14 @@ class DualARTransformer(BaseTransformer):
         vq_require_losses: Optional[Tensor] = None,
         mel_parts: Optional[Tensor] = None,
         mel_masks: Optional[Tensor] = None,
+        document_ids: Optional[Tensor] = None,
+        position_ids: Optional[Tensor] = None,
     ) -> TransformerForwardResult:
         parent_result = super().forward(
             inp=inp,
             key_padding_mask=key_padding_mask,
+            document_ids=document_ids,
+            position_ids=position_ids,
         )
         token_logits = parent_result.logits
         x = parent_result.hidden_states
@@ -726,8 +761,17 @@ class DualARTransformer(BaseTransformer):
         input_pos: Optional[Tensor] = None,
         audio_masks: Optional[Tensor] = None,
         audio_parts: Optional[Tensor] = None,
+        last_pos: Optional[Tensor] = None,
+        return_all: bool = False,
     ) -> TransformerForwardResult:
-        x = super().forward_generate(x, input_pos, audio_masks, audio_parts)
+        x = super().forward_generate(
+            x,
+            input_pos,
+            audio_masks,
+            audio_parts,
+            return_all=return_all,
+            last_pos=last_pos,
+        )
         x.hidden_states = self.fast_project_in(x.hidden_states)
         return x
 
@@ -927,7 +971,8 @@ def precompute_freqs_cis(seq_len: int, n_elem: int, base: int = 10000) -> Tensor
 
 def apply_rotary_emb(x: Tensor, freqs_cis: Tensor) -> Tensor:
     xshaped = x.float().reshape(*x.shape[:-1], -1, 2)
-    freqs_cis = freqs_cis.view(1, xshaped.size(1), 1, xshaped.size(3), 2)
+    # freqs_cis is [seq_len, ...] or, with per-row positions, [batch, seq_len, ...]
+    freqs_cis = freqs_cis.view(-1, xshaped.size(1), 1, xshaped.size(3), 2)
     x_out2 = torch.stack(
         [
             xshaped[..., 0] * freqs_cis[..., 0] - xshaped[..., 1] * freqs_cis[..., 1],
@@ -1,6 +1,9 @@
 from dataclasses import dataclass
 
 import loralib as lora
+import torch
+import torch.nn.functional as F
+from torch import Tensor, nn
 
 
 @dataclass
@@ -10,23 +13,10 @@ class LoraConfig:
     lora_dropout: float = 0.0
 
 
-def setup_lora(model, lora_config):
-    # Replace the embedding layer with a LoRA layer
-    model.embeddings = lora.Embedding(
-        num_embeddings=model.embeddings.num_embeddings,
-        embedding_dim=model.embeddings.embedding_dim,
-        padding_idx=model.embeddings.padding_idx,
-        r=lora_config.r,
-        lora_alpha=lora_config.lora_alpha,
-    )
-
-    model.codebook_embeddings = lora.Embedding(
-        num_embeddings=model.codebook_embeddings.num_embeddings,
-        embedding_dim=model.codebook_embeddings.embedding_dim,
-        padding_idx=model.codebook_embeddings.padding_idx,
-        r=lora_config.r,
-        lora_alpha=lora_config.lora_alpha,
-    )
+def lora_targets(model):
+    """(module, attribute) pairs of the embeddings and linears that get adapters."""
+
+    embeddings = [(model, "embeddings"), (model, "codebook_embeddings")]
 
     # Replace output layer with a LoRA layer
     linears = [(model, "output")]
@@ -43,13 +33,7 @@ def setup_lora(model, lora_config):
         )
 
     if hasattr(model, "fast_layers"):
-        model.fast_embeddings = lora.Embedding(
-            num_embeddings=model.fast_embeddings.num_embeddings,
-            embedding_dim=model.fast_embeddings.embedding_dim,
-            padding_idx=model.fast_embeddings.padding_idx,
-            r=lora_config.r,
-            lora_alpha=lora_config.lora_alpha,
-        )
+        embeddings.append((model, "fast_embeddings"))
 
         # Dual-AR model
         linears.append((model, "fast_output"))
@@ -64,6 +48,26 @@ def setup_lora(model, lora_config):
                 ]
             )
 
+    return embeddings, linears
+
+
+def setup_lora(model, lora_config):
+    embeddings, linears = lora_targets(model)
+
+    # Replace the embedding layers with LoRA layers
+    for module, layer in embeddings:
+        setattr(
+            module,
+            layer,
+            lora.Embedding(
+                num_embeddings=getattr(module, layer).num_embeddings,
+                embedding_dim=getattr(module, layer).embedding_dim,
+                padding_idx=getattr(module, layer).padding_idx,
+                r=lora_config.r,
+                lora_alpha=lora_config.lora_alpha,
+            ),
+        )
+
     for module, layer in linears:
         updated_linear = lora.Linear(
             in_features=getattr(module, layer).in_features,
@@ -79,6 +83,132 @@ def setup_lora(model, lora_config):
     lora.mark_only_lora_as_trainable(model, bias="none")
 
 
+class MultiLoraLinear(nn.Module):
+    """
+    Inference-only linear layer that shares the base weight and adds an unmerged
+    LoRA delta per batch row. Adapters are copied into fixed-size slot buffers
+    (rank padded with zeros, B pre-scaled), so switching adapters neither
+    reallocates nor changes the compiled / CUDA graph.
+    """
+
+    def __init__(self, base: nn.Linear, slots: int, max_rank: int):
+        super().__init__()
+        self.in_features = base.in_features
+        self.out_features = base.out_features
+        self.register_parameter("weight", base.weight)
+        self.register_parameter("bias", base.bias)
+
+        # Row i of the batch uses slot i
+        self.register_buffer(
+            "lora_A",
+            base.weight.new_zeros(slots, max_rank, self.in_features),
+            persistent=False,
+        )
+        self.register_buffer(
+            "lora_B",
+            base.weight.new_zeros(slots, self.out_features, max_rank),
+            persistent=False,
+        )
+
+    def forward(self, x: Tensor) -> Tensor:
+        rows = x.shape[0]
+        if rows > self.lora_A.shape[0]:
+            # Leading dim isn't the batch (e.g. flattened fast-transformer tokens), use slot 0
+            delta = F.linear(F.linear(x, self.lora_A[0]), self.lora_B[0])
+        else:
+            hidden = torch.einsum("b...i,bri->b...r", x, self.lora_A[:rows])
+            delta = torch.einsum("b...r,bor->b...o", hidden, self.lora_B[:rows])
+
+        return F.linear(x, self.weight, self.bias) + delta
+
+    def load_slot(self, slot: int, lora_A: Tensor, lora_B: Tensor):
+        """lora_A: [r, in_features], lora_B: [out_features, r], already scaled."""
+        rank = lora_A.shape[0]
+        self.lora_A[slot].zero_()
+        self.lora_B[slot].zero_()
+        self.lora_A[slot, :rank].copy_(lora_A)
+        self.lora_B[slot, :, :rank].copy_(lora_B)
+
+    def clear_slot(self, slot: int):
+        self.lora_A[slot].zero_()
+        self.lora_B[slot].zero_()
+
+
+class MultiLoraEmbedding(nn.Module):
+    """Embedding counterpart of MultiLoraLinear, A is stored transposed to gather by token."""
+
+    def __init__(self, base: nn.Embedding, slots: int, max_rank: int):
+        super().__init__()
+        self.num_embeddings = base.num_embeddings
+        self.embedding_dim = base.embedding_dim
+        self.padding_idx = base.padding_idx
+        self.register_parameter("weight", base.weight)
+
+        self.register_buffer(
+            "lora_A",
+            base.weight.new_zeros(slots, self.num_embeddings, max_rank),
+            persistent=False,
+        )
+        self.register_buffer(
+            "lora_B",
+            base.weight.new_zeros(slots, self.embedding_dim, max_rank),
+            persistent=False,
+        )
+
+    def forward(self, x: Tensor) -> Tensor:
+        rows = x.shape[0]
+        if rows > self.lora_A.shape[0]:
+            delta = F.linear(F.embedding(x, self.lora_A[0]), self.lora_B[0])
+        else:
+            row_index = torch.arange(rows, device=x.device).view(
+                rows, *([1] * (x.ndim - 1))
+            )
+            hidden = self.lora_A[row_index, x]
+            delta = torch.einsum("b...r,bor->b...o", hidden, self.lora_B[:rows])
+
+        return F.embedding(x, self.weight, self.padding_idx) + delta
+
+    def load_slot(self, slot: int, lora_A: Tensor, lora_B: Tensor):
+        """lora_A: [r, num_embeddings] (loralib layout), lora_B: [embedding_dim, r], already scaled."""
+        rank = lora_A.shape[0]
+        self.lora_A[slot].zero_()
+        self.lora_B[slot].zero_()
+        self.lora_A[slot, :, :rank].copy_(lora_A.T)
+        self.lora_B[slot, :, :rank].copy_(lora_B)
+
+    def clear_slot(self, slot: int):
+        self.lora_A[slot].zero_()
+        self.lora_B[slot].zero_()
+
+
+def setup_multi_lora(model, slots: int = 1, max_rank: int = 16) -> dict[str, nn.Module]:
+    """
+    Wraps the LoRA target layers of a loaded model with multi-adapter layers.
+    Base weights stay shared, returns the wrapped layers by qualified name
+    (the same names as the keys of a LoRA checkpoint).
+    """
+
+    embeddings, linears = lora_targets(model)
+
+    for module, layer in embeddings:
+        setattr(
+            module, layer, MultiLoraEmbedding(getattr(module, layer), slots, max_rank)
+        )
+
+    for module, layer in linears:
+        # Tied output heads have no separate linear
+        if hasattr(module, layer):
+            setattr(
+                module, layer, MultiLoraLinear(getattr(module, layer), slots, max_rank)
+            )
+
+    return {
+        name: module
+        for name, module in model.named_modules()
+        if isinstance(module, (MultiLoraLinear, MultiLoraEmbedding))
+    }
+
+
 def get_merged_state_dict(model):
     # This line will merge the state dict of the model and the LoRA parameters
     model.eval()
@@ -0,0 +1,176 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import torch
+from cachetools import TTLCache
+from loguru import logger
+
+from fish_speech.models.text2semantic.lora import setup_multi_lora
+
+VOICE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+$")
+DEFAULT_LORA_ALPHA = 16.0
+
+
+@dataclass
+class LoraAdapter:
+    voice_id: str
+    # Layer name -> (lora_A, lora_B * scaling), on the model device
+    weights: dict[str, tuple[torch.Tensor, torch.Tensor]]
+    nbytes: int
+
+
+class LoraRegistry:
+    """
+    LoRA adapters keyed by voice_id, applied on top of one shared base model.
+
+    Adapters are read from `root/<voice_id>.pth` (a LoRA checkpoint as written by
+    training, optional `root/<voice_id>.json` with `lora_alpha`). The `capacity` most
+    recently used ones stay resident on the device, activating one only copies
+    a few megabytes into the slot buffers of the wrapped layers.
+    Voices without an adapter run on the base weights.
+    """
+
+    def __init__(
+        self,
+        model,
+        root: str | Path,
+        capacity: int = 8,
+        slots: int = 1,
+        max_rank: int = 16,
+        lora_alpha: float = DEFAULT_LORA_ALPHA,
+    ):
+        self.root = Path(root)
+        self.capacity = capacity
+        self.max_rank = max_rank
+        self.lora_alpha = lora_alpha
+
+        parameter = next(model.parameters())
+        self.device, self.dtype = parameter.device, parameter.dtype
+        self.layers = setup_multi_lora(model, slots=slots, max_rank=max_rank)
+
+        self.adapters: "OrderedDict[str, LoraAdapter]" = OrderedDict()
+        # Voices without adapter, re-checked after a minute so new uploads are picked up
+        self.missing = TTLCache(maxsize=4096, ttl=60)
+        self.active: list[Optional[str]] = [None] * slots
+        self.lock = threading.Lock()
+        self.hits = self.loads = 0
+
+        logger.info(
+            f"LoRA registry on {self.root}: {len(self.layers)} layers, "
+            f"{slots} slots, rank <= {max_rank}, {capacity} resident adapters"
+        )
+
+    def adapter_path(self, voice_id: str) -> Optional[Path]:
+        if not VOICE_ID_PATTERN.match(voice_id):
+            return None
+
+        path = self.root / f"{voice_id}.pth"
+        return path if path.is_file() else None
+
+    def load(self, voice_id: str) -> Optional[LoraAdapter]:
+        path = self.adapter_path(voice_id)
+        if path is None:
+            return None
+
+        state_dict = torch.load(path, map_location="cpu", weights_only=True)
+        if "state_dict" in state_dict:
+            state_dict = state_dict["state_dict"]
+        state_dict = {
+            k[len("model.") :] if k.startswith("model.") else k: v
+            for k, v in state_dict.items()
+        }
+
+        lora_alpha = self.lora_alpha
+        config_path = path.with_suffix(".json")
+        if config_path.is_file():
+            lora_alpha = json.loads(config_path.read_text())["lora_alpha"]
+
+        weights, nbytes = {}, 0
+        for name, layer in self.layers.items():
+            lora_A = state_dict.get(f"{name}.lora_A")
+            lora_B = state_dict.get(f"{name}.lora_B")
+            if lora_A is None or lora_B is None:
+                continue
+
+            rank = lora_A.shape[0]
+            if rank > self.max_rank:
+                raise ValueError(
+                    f"Adapter {voice_id} has rank {rank} > max rank {self.max_rank}"
+                )
+
+            scaling = lora_alpha / rank
+            lora_A = lora_A.to(device=self.device, dtype=self.dtype)
+            lora_B = (lora_B.float() * scaling).to(device=self.device, dtype=self.dtype)
+            weights[name] = (lora_A, lora_B)
+            nbytes += lora_A.nbytes + lora_B.nbytes
+
+        if not weights:
+            raise ValueError(f"{path} contains no LoRA weights for this model")
+
+        logger.info(
+            f"Loaded LoRA adapter {voice_id}: {len(weights)} layers, {nbytes / 1e6:.1f} MB"
+        )
+        return LoraAdapter(voice_id=voice_id, weights=weights, nbytes=nbytes)
+
+    def get(self, voice_id: str) -> Optional[LoraAdapter]:
+        adapter = self.adapters.get(voice_id)
+        if adapter is not None:
+            self.adapters.move_to_end(voice_id)
+            self.hits += 1
+            return adapter
+
+        if voice_id in self.missing:
+            return None
+
+        adapter = self.load(voice_id)
+        if adapter is None:
+            self.missing[voice_id] = True
+            return None
+
+        self.loads += 1
+        self.adapters[voice_id] = adapter
+
+        # Evict least recently used adapters that are not in a slot
+        for evicted in list(self.adapters):
+            if len(self.adapters) <= self.capacity:
+                break
+            if evicted not in self.active and evicted != voice_id:
+                del self.adapters[evicted]
+
+        return adapter
+
+    @torch.inference_mode()
+    def activate(self, voice_id: Optional[str], slot: int = 0) -> bool:
+        """
+        Applies the adapter of `voice_id` to batch row `slot`, or the base
+        weights when it has none. Returns whether an adapter is applied.
+        """
+
+        with self.lock:
+            adapter = self.get(voice_id) if voice_id else None
+            key = adapter.voice_id if adapter is not None else None
+            if self.active[slot] == key:
+                return adapter is not None
+
+            for name, layer in self.layers.items():
+                if adapter is not None and name in adapter.weights:
+                    layer.load_slot(slot, *adapter.weights[name])
+                else:
+                    layer.clear_slot(slot)
+
+            self.active[slot] = key
+            return adapter is not None
+
+    def stats(self) -> dict:
+        return {
+            "resident": len(self.adapters),
+            "resident_mb": sum(a.nbytes for a in self.adapters.values()) / 1e6,
+            "active": list(self.active),
+            "hits": self.hits,
+            "loads": self.loads,
+        }
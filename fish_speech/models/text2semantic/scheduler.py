@@ -0,0 +1,204 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+from collections import Counter, deque
+from typing import Optional
+
+from fish_speech.models.text2semantic.length_predictor import LengthPredictor
+
+PRIORITY_CLASSES = ("interactive", "batch")
+
+# A batch request is scheduled as if it were this many tokens longer
+BATCH_PENALTY = 2048.0
+# Tokens of estimated cost forgiven per second of waiting, so long jobs are never starved
+AGING_RATE = 64.0
+# Wait times kept per class for the percentiles
+WAIT_WINDOW = 1024
+
+
+class TenantLimitExceeded(Exception):
+    pass
+
+
+class RequestScheduler:
+    """
+    Drop-in replacement of the FIFO input queue of the LLAMA worker.
+
+    Requests are served by increasing score:
+        estimated cost + class penalty - aging_rate * seconds waited
+    All pending requests age at the same rate, so the order only depends on
+    `cost + penalty + aging_rate * enqueue_time` and a heap is enough.
+
+    `max_running_per_tenant` limits the requests of a tenant handed to workers
+    at the same time, `max_pending_per_tenant` rejects new ones from a tenant
+    that already has that many queued or running (0 disables either limit).
+    Workers call `done(item)` when a request is finished.
+    Costs come from `length_predictor`, the one the worker also caps decoding with.
+    """
+
+    def __init__(
+        self,
+        aging_rate: float = AGING_RATE,
+        batch_penalty: float = BATCH_PENALTY,
+        max_running_per_tenant: int = 0,
+        max_pending_per_tenant: int = 0,
+        length_predictor: Optional[LengthPredictor] = None,
+    ):
+        self.aging_rate = aging_rate
+        self.batch_penalty = batch_penalty
+        self.max_running_per_tenant = max_running_per_tenant
+        self.max_pending_per_tenant = max_pending_per_tenant
+        self.length_predictor = length_predictor or LengthPredictor()
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._queued = Counter()
+        self._running = Counter()
+        self._enqueued_at = {}
+        self._waits = {name: deque(maxlen=WAIT_WINDOW) for name in PRIORITY_CLASSES}
+        self._totals = Counter()
+
+    def estimate_cost(self, text: str, max_new_tokens: int = 0) -> float:
+        return self.length_predictor.estimate_cost(text, max_new_tokens)
+
+    def score(self, item, now: float) -> float:
+        penalty = self.batch_penalty if item.priority == "batch" else 0.0
+        return item.cost + penalty + self.aging_rate * now
+
+    def put(self, item, block: bool = True, timeout: Optional[float] = None):
+        # block / timeout keep the queue.Queue signature, the queue is unbounded
+        with self._cond:
+            if item is None:
+                self._closed = True
+                self._cond.notify_all()
+                return
+
+            if item.priority not in PRIORITY_CLASSES:
+                raise ValueError(f"Unknown priority class: {item.priority}")
+
+            tenant = item.tenant
+            if (
+                tenant is not None
+                and self.max_pending_per_tenant > 0
+                and self._queued[tenant] + self._running[tenant]
+                >= self.max_pending_per_tenant
+            ):
+                self._totals["rejected"] += 1
+                raise TenantLimitExceeded(
+                    f"Tenant {tenant} already has {self.max_pending_per_tenant} requests in flight"
+                )
+
+            now = time.monotonic()
+            seq = next(self._counter)
+            heapq.heappush(self._heap, (self.score(item, now), seq, item))
+            self._enqueued_at[id(item)] = now
+            self._queued[tenant] += 1
+            self._totals["submitted"] += 1
+            self._cond.notify()
+
+    def _eligible(self, item) -> bool:
+        return (
+            item.tenant is None
+            or self.max_running_per_tenant <= 0
+            or self._running[item.tenant] < self.max_running_per_tenant
+        )
+
+    def _pop_eligible(self):
+        skipped, found = [], None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if self._eligible(entry[2]):
+                found = entry[2]
+                break
+            skipped.append(entry)
+
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return found
+
+    def get(self, block: bool = True, timeout: Optional[float] = None):
+        """Next request to run, None once the scheduler is closed."""
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+
+                item = self._pop_eligible()
+                if item is not None:
+                    break
+
+                if not block or not self._cond.wait(timeout):
+                    raise queue.Empty
+
+            wait = time.monotonic() - self._enqueued_at.pop(id(item))
+            self._waits[item.priority].append(wait)
+            self._queued[item.tenant] -= 1
+            self._running[item.tenant] += 1
+            self._totals["dispatched"] += 1
+            return item
+
+    def done(self, item):
+        with self._cond:
+            self._running[item.tenant] -= 1
+            self._totals["completed"] += 1
+            # A tenant under its cap again may unblock a waiting worker
+            self._cond.notify_all()
+
+    def position(self, cancel_token) -> Optional[int]:
+        """
+        Pending requests that would be served before the one carrying
+        `cancel_token`, None if it isn't pending (not submitted yet, running or done).
+        """
+
+        with self._cond:
+            entry = next(
+                (e for e in self._heap if e[2].cancel_token is cancel_token), None
+            )
+            if entry is None:
+                return None
+            return sum(1 for e in self._heap if e[:2] < entry[:2])
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            depth = Counter(item.priority for _, _, item in self._heap)
+            waits = {}
+            for name, values in self._waits.items():
+                ordered = sorted(values)
+                waits[name] = {
+                    "count": len(ordered),
+                    "p50": ordered[len(ordered) // 2] if ordered else 0.0,
+                    "p95": ordered[int(len(ordered) * 0.95)] if ordered else 0.0,
+                    "max": ordered[-1] if ordered else 0.0,
+                }
+
+            return {
+                "queue_depth": {name: depth[name] for name in PRIORITY_CLASSES},
+                "oldest_wait": max(
+                    (now - t for t in self._enqueued_at.values()), default=0.0
+                ),
+                "running": sum(self._running.values()),
+                "wait_seconds": waits,
+                "tenants": {
+                    str(tenant): {
+                        "queued": self._queued[tenant],
+                        "running": self._running[tenant],
+                    }
+                    for tenant in set(self._queued) | set(self._running)
+                    if self._queued[tenant] or self._running[tenant]
+                },
+                **{
+                    key: self._totals[key]
+                    for key in ("submitted", "dispatched", "completed", "rejected")
+                },
+            }
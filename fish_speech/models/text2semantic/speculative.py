@@ -0,0 +1,409 @@
+"""
+Speculative decoding for the slow transformer.
+
+A small draft DualARTransformer (same tokenizer and codebook layout) proposes
+`num_draft_tokens` frames. The target model scores all of them in a single
+forward_generate over consecutive input positions. Every token of a frame
+(semantic token, then codebooks 1..N-1) is accepted with probability
+min(1, p / q), p and q being the target and draft sampling distributions, so
+the output follows the target distribution. The first rejected token is
+resampled from max(0, p - q) and the rest of its frame from the target. When
+every drafted frame is accepted, the target samples one bonus frame.
+
+KV caches roll back by position. Entries written for rejected frames stay past
+the committed position, where the causal mask hides them, and the next step
+overwrites them.
+"""
+
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Optional
+
+import torch
+from loguru import logger
+
+from fish_speech.models.text2semantic.inference import (
+    CancellationToken,
+    logits_to_probs,
+    multinomial_sample_one_no_sync,
+    request_generator,
+)
+from fish_speech.models.text2semantic.length_predictor import RepetitionDetector
+from fish_speech.models.text2semantic.llama import DualARTransformer
+
+# Same repetition penalty window as decode_n_tokens
+WINDOW_SIZE = 16
+
+
+@dataclass
+class SpeculativeStats:
+    steps: int = 0  # Target forwards
+    drafted: int = 0  # Frames proposed by the draft model
+    accepted: int = 0  # Drafted frames the target kept
+    frames: int = 0  # Frames generated, accepted + one per step
+    draft_seconds: float = 0.0
+    verify_seconds: float = 0.0
+
+    def merge(self, other: "SpeculativeStats"):
+        for name, value in asdict(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    @property
+    def frames_per_step(self) -> float:
+        return self.frames / self.steps if self.steps else 0.0
+
+    @property
+    def eager_speedup(self) -> float:
+        # Relative to eager decoding, not to the compiled decode step: at batch 1
+        # an eager target forward over k + 1 positions costs about as much as
+        # an eager single decode step, so eager decoding would take
+        # frames * verify_seconds / steps
+        total = self.draft_seconds + self.verify_seconds
+        if not total:
+            return 0.0
+        return self.frames_per_step * self.verify_seconds / total
+
+    def as_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "acceptance_rate": self.acceptance_rate,
+            "frames_per_step": self.frames_per_step,
+            "eager_speedup": self.eager_speedup,
+        }
+
+    def summary(self) -> str:
+        return (
+            f"accepted {self.accepted}/{self.drafted} drafted frames "
+            f"({self.acceptance_rate:.1%}), {self.frames_per_step:.2f} frames per "
+            f"target forward, {self.eager_speedup:.2f}x faster than eager decoding"
+        )
+
+
+# Totals since start-up, see /v1/metrics
+speculative_stats = SpeculativeStats()
+
+
+def load_draft_model(
+    checkpoint_path, model: DualARTransformer, device, precision
+) -> DualARTransformer:
+    draft = DualARTransformer.from_pretrained(checkpoint_path, load_weights=True)
+    draft = draft.to(device=device, dtype=precision).eval()
+
+    for name in ("num_codebooks", "codebook_size", "vocab_size"):
+        if getattr(draft.config, name) != getattr(model.config, name):
+            raise ValueError(
+                f"Draft model {name} {getattr(draft.config, name)} doesn't match "
+                f"the target's {getattr(model.config, name)}"
+            )
+    if draft.config.max_seq_len < model.config.max_seq_len:
+        raise ValueError(
+            f"Draft model max_seq_len {draft.config.max_seq_len} is shorter than "
+            f"the target's {model.config.max_seq_len}"
+        )
+
+    with torch.device(device):
+        draft.setup_caches(
+            max_batch_size=1,
+            max_seq_len=model.config.max_seq_len,
+            dtype=next(draft.parameters()).dtype,
+        )
+    logger.info(f"Loaded draft model from {checkpoint_path}")
+
+    return draft
+
+
+def penalty_window(previous_tokens: torch.Tensor, i: int) -> torch.Tensor:
+    if i < WINDOW_SIZE:
+        # Frames from i on are drafts, decode_n_tokens still has zeros there
+        window = previous_tokens[:, :WINDOW_SIZE].clone()
+        window[:, i:] = 0
+        return window
+    return previous_tokens[:, i - WINDOW_SIZE : i]
+
+
+class FrameSampler:
+    """Sampling distributions of one frame, as in decode_one_token_ar."""
+
+    def __init__(
+        self, model, window, temperature, top_p, repetition_penalty, generator
+    ):
+        self.model = model
+        self.window = window
+        self.temperature = temperature
+        self.top_p = top_p
+        self.repetition_penalty = repetition_penalty
+        self.generator = generator
+
+    def sample(self, probs: torch.Tensor) -> torch.Tensor:
+        noise = torch.empty_like(probs).exponential_(1, generator=self.generator)
+        return multinomial_sample_one_no_sync(probs, noise)[0]
+
+    def accept(self, p: torch.Tensor, q: torch.Tensor, token: torch.Tensor) -> bool:
+        ratio = p[token] / q[token].clamp(min=1e-10)
+        u = torch.rand((), device=p.device, generator=self.generator)
+        return bool(u < ratio)
+
+    def residual(self, p: torch.Tensor, q: torch.Tensor) -> torch.Tensor:
+        residual = (p - q).clamp(min=0)
+        if residual.sum() <= 0:
+            residual = p
+        # Sampling from unnormalized weights is fine, see multinomial_sample_one_no_sync
+        return self.sample(residual)
+
+    def probs(self, logits: torch.Tensor, index: int) -> torch.Tensor:
+        # index 0 is the semantic token, c + 1 is codebook c
+        if index == 0:
+            previous_tokens = self.window[:, 0]
+        else:
+            previous_tokens = self.window[index]
+            logits = logits[:1024]
+
+        # logits_to_probs writes the penalty into the logits
+        return logits_to_probs(
+            logits.clone(),
+            temperature=self.temperature,
+            top_p=self.top_p,
+            repetition_penalty=self.repetition_penalty,
+            previous_tokens=previous_tokens,
+        )
+
+    def first_codebook(self, frame: torch.Tensor):
+        # Codebook 0 is the semantic token itself
+        frame[1] = (frame[0] - self.model.tokenizer.semantic_begin_id).clamp(min=0)
+
+    def sample_codebooks(
+        self, frame: torch.Tensor, start: int, hidden: Optional[torch.Tensor] = None
+    ) -> list[torch.Tensor]:
+        """
+        Samples codebooks start..N-1 of `frame` with the fast transformer. With
+        `hidden`, the fast cache is filled from position 0 first; otherwise it
+        must already hold positions up to `start - 1`.
+        """
+
+        model = self.model
+        device = frame.device
+        if hidden is not None:
+            model.forward_generate_fast(
+                hidden.view(1, 1, -1), torch.tensor([0], device=device)
+            )
+
+        probs = []
+        for c in range(start, model.config.num_codebooks):
+            x = model.fast_embeddings(frame[c : c + 1])
+            logits = model.forward_generate_fast(x, torch.tensor([c], device=device))
+            p = self.probs(logits[0, -1], c + 1)
+            frame[c + 1] = self.sample(p)
+            probs.append(p)
+        return probs
+
+
+def fast_codebook_logits(
+    model: DualARTransformer, hidden: torch.Tensor, frame: torch.Tensor
+) -> torch.Tensor:
+    """
+    Logits of codebooks 1..N-1 given the codebooks of `frame` before each of
+    them (teacher forcing), in one fast transformer forward. Leaves the fast
+    cache valid for the positions up to the first codebook that gets replaced.
+    """
+
+    n = model.config.num_codebooks
+    x = torch.cat(
+        [hidden.view(1, 1, -1), model.fast_embeddings(frame[1:n]).view(1, n - 1, -1)],
+        dim=1,
+    )
+    input_pos = torch.arange(n, device=x.device)
+    mask = model.causal_mask[None, None, input_pos, :n]
+    freqs_cis = model.fast_freqs_cis[input_pos]
+    for layer in model.fast_layers:
+        x = layer(x, freqs_cis, mask, input_pos=input_pos)
+
+    return model.fast_output(model.fast_norm(x))[0, 1:]
+
+
+def draft_frame(draft, x, input_pos, sampler: FrameSampler):
+    """One draft frame and the distributions it was sampled from."""
+
+    result = draft.forward_generate(x, input_pos)
+    frame = torch.zeros(
+        draft.config.num_codebooks + 1, dtype=torch.int, device=x.device
+    )
+    q_semantic = sampler.probs(result.logits[0, -1], 0)
+    frame[0] = sampler.sample(q_semantic)
+    sampler.first_codebook(frame)
+    q_codebooks = sampler.sample_codebooks(frame, 1, result.hidden_states[0, -1])
+
+    return frame, q_semantic, q_codebooks
+
+
+def verify_frame(model, frame, hidden, logits, q_semantic, q_codebooks, sampler):
+    """
+    Speculative sampling of one drafted frame against the target. Returns the
+    frame to commit, and whether it is the drafted one unchanged.
+    """
+
+    p_semantic = sampler.probs(logits, 0)
+    if not sampler.accept(p_semantic, q_semantic, frame[0]):
+        frame = frame.clone()
+        frame[0] = sampler.residual(p_semantic, q_semantic)
+        sampler.first_codebook(frame)
+        sampler.sample_codebooks(frame, 1, hidden)
+        return frame, False
+
+    codebook_logits = fast_codebook_logits(model, hidden, frame)
+    for c in range(1, model.config.num_codebooks):
+        p = sampler.probs(codebook_logits[c - 1], c + 1)
+        if not sampler.accept(p, q_codebooks[c - 1], frame[c + 1]):
+            frame = frame.clone()
+            frame[c + 1] = sampler.residual(p, q_codebooks[c - 1])
+            sampler.sample_codebooks(frame, c + 1)
+            return frame, False
+
+    return frame, True
+
+
+def decode_n_tokens_speculative(
+    model: DualARTransformer,
+    draft_model: DualARTransformer,
+    cur_token: torch.Tensor,
+    input_pos: torch.Tensor,
+    num_new_tokens: int,
+    temperature: torch.Tensor,
+    top_p: torch.Tensor,
+    repetition_penalty: torch.Tensor,
+    num_draft_tokens: int = 4,
+    cancel_token: Optional[CancellationToken] = None,
+    on_token: Optional[Callable[[torch.Tensor], None]] = None,
+    generator: Optional[torch.Generator] = None,
+):
+    """
+    Drop-in for decode_n_tokens. Both models must have been prefilled up to
+    (excluding) `input_pos`, the position of `cur_token`.
+    """
+
+    codebook_dim = model.config.num_codebooks + 1
+    device = cur_token.device
+    previous_tokens = torch.zeros(
+        (codebook_dim, model.config.max_seq_len + num_draft_tokens + 1),
+        dtype=torch.int,
+        device=device,
+    )
+    stats = SpeculativeStats()
+    if generator is None:
+        generator = request_generator(device)
+    repetition = RepetitionDetector()
+
+    pos = int(input_pos[0])
+    cur_token = cur_token.view(codebook_dim, 1)
+    # Frames the draft model hasn't seen yet, from position draft_pos
+    draft_input, draft_pos = cur_token, pos
+    i = 0
+
+    def sampler_for(model_, index):
+        return FrameSampler(
+            model_,
+            penalty_window(previous_tokens, index),
+            temperature,
+            top_p,
+            repetition_penalty,
+            generator,
+        )
+
+    while i < num_new_tokens:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+
+        # Leave room for the frame the target adds to every step
+        k = min(num_draft_tokens, num_new_tokens - i - 1)
+
+        start = time.perf_counter()
+        drafts = []
+        x, x_pos = draft_input, torch.arange(draft_pos, pos + 1, device=device)
+        for j in range(k):
+            frame, q_semantic, q_codebooks = draft_frame(
+                draft_model, x[None], x_pos, sampler_for(draft_model, i + j)
+            )
+            # Later draft frames see it in their penalty window
+            previous_tokens[:, i + j] = frame
+            drafts.append((frame, q_semantic, q_codebooks))
+            x, x_pos = frame.view(codebook_dim, 1), torch.tensor(
+                [pos + j + 1], device=device
+            )
+        if device.type == "cuda":
+            # Otherwise the draft kernels would be timed as verification
+            torch.cuda.synchronize(device)
+        drafted_at = time.perf_counter()
+
+        # The target scores the current frame and every draft in one forward
+        x = torch.cat([cur_token] + [d[0].view(codebook_dim, 1) for d in drafts], 1)
+        result = model.forward_generate(
+            x[None], torch.arange(pos, pos + k + 1, device=device), return_all=True
+        )
+        logits, hidden = result.logits[0], result.hidden_states[0]
+
+        committed = []
+        for j, (frame, q_semantic, q_codebooks) in enumerate(drafts):
+            frame, accepted = verify_frame(
+                model,
+                frame,
+                hidden[j],
+                logits[j],
+                q_semantic,
+                q_codebooks,
+                sampler_for(model, i + j),
+            )
+            committed.append(frame)
+            if not accepted:
+                break
+            stats.accepted += 1
+        else:
+            # Every draft accepted, the last target position gives a bonus frame
+            sampler = sampler_for(model, i + k)
+            frame = torch.zeros(codebook_dim, dtype=torch.int, device=device)
+            frame[0] = sampler.sample(sampler.probs(logits[k], 0))
+            sampler.first_codebook(frame)
+            sampler.sample_codebooks(frame, 1, hidden[k])
+            committed.append(frame)
+
+        stats.steps += 1
+        stats.drafted += k
+        stats.draft_seconds += drafted_at - start
+        stats.verify_seconds += time.perf_counter() - drafted_at
+
+        finished = False
+        for frame in committed:
+            previous_tokens[:, i] = frame
+            i += 1
+            stats.frames += 1
+            if on_token is not None:
+                on_token(frame.view(codebook_dim, 1))
+            if frame[0] == model.tokenizer.im_end_id:
+                finished = True
+                break
+        if finished:
+            break
+
+        m = len(committed)
+        loop_start = repetition.extend(previous_tokens[0, i - m : i].tolist())
+        if loop_start is not None:
+            logger.warning(f"Runaway repetition from token {loop_start}, stopping")
+            # Same as decode_n_tokens: one looped token is kept for the caller to drop
+            i = loop_start + 1
+            break
+
+        cur_token = committed[-1].view(codebook_dim, 1)
+        if m == k + 1 and k > 0:
+            # The draft model never saw its last frame
+            draft_input = torch.cat([drafts[-1][0].view(codebook_dim, 1), cur_token], 1)
+            draft_pos = pos + k
+        else:
+            draft_input, draft_pos = cur_token, pos + m
+        pos += m
+
+    speculative_stats.merge(stats)
+    logger.info(f"Speculative decoding: {stats.summary()}")
+
+    return previous_tokens[:, :i]
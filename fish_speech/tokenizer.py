@@ -1,9 +1,12 @@
 import base64
+import functools
+import itertools
 import json
 import logging
 import re
 from pathlib import Path
 
+import numpy as np
 import tiktoken
 
 logger = logging.getLogger(__name__)
@@ -23,6 +26,11 @@ FISH_TIKTOKEN_PATTERN = "|".join(
 )
 TIKTOKEN_MAX_ENCODE_CHARS = 400_000
 
+# Short strings (reference transcripts, speaker / special-token sequences) repeat on
+# every request, so their token ids are memoized per tokenizer instance.
+TOKENIZER_CACHE_MAX_CHARS = 2048
+TOKENIZER_CACHE_SIZE = 8192
+
 BOS_TOKEN = "<|begin_of_text|>"
 EOS_TOKEN = "<|end_of_text|>"
 PAD_TOKEN = "<|pad|>"
@@ -94,6 +102,12 @@ class FishTokenizer:
         self.semantic_begin_id = self.semantic_id_to_token_id[0]
         self.semantic_end_id = self.semantic_id_to_token_id[end_idx]
 
+        # Dense semantic id -> token id lookup table, so codes can be mapped
+        # with a single indexing op instead of a dict lookup per frame
+        self.semantic_token_ids = np.full(end_idx + 1, -1, dtype=np.int32)
+        for idx, token_id in self.semantic_id_to_token_id.items():
+            self.semantic_token_ids[idx] = token_id
+
         self.tkt_model = tiktoken.core.Encoding(
             name=Path(model_path).stem,
             pat_str=FISH_TIKTOKEN_PATTERN,
@@ -101,6 +115,34 @@ class FishTokenizer:
             special_tokens=self.all_special_tokens_with_ids,
         )
 
+        # Resolve the frequently used special tokens once
+        get = self.all_special_tokens_with_ids.get
+        self.bos_token_id = get(BOS_TOKEN)
+        self.eos_token_id = get(EOS_TOKEN)
+        self.pad_token_id = get(PAD_TOKEN)
+        self.im_start_id = get(IM_START_TOKEN)
+        self.im_end_id = get(IM_END_TOKEN)
+        self.audio_start_id = get(AUDIO_START_TOKEN)
+        self.audio_end_id = get(AUDIO_END_TOKEN)
+        self.audio_embed_id = get(AUDIO_EMBED_TOKEN)
+
+        self._setup_cache()
+
+    def _setup_cache(self):
+        self._encode_cached = functools.lru_cache(maxsize=TOKENIZER_CACHE_SIZE)(
+            self._encode_uncached
+        )
+
+    def __getstate__(self):
+        # lru_cache wrappers are not picklable (DataLoader workers, spawn)
+        state = self.__dict__.copy()
+        state.pop("_encode_cached", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._setup_cache()
+
     @property
     def vocab_size(self):
         return len(self.tkt_model._mergeable_ranks)
@@ -124,24 +166,92 @@ class FishTokenizer:
     def get_token_id(self, token: str) -> int:
         return self.all_special_tokens_with_ids[token]
 
+    def _resolve_allowed_special(self, allowed_special: bool | set[str]) -> set[str]:
+        if allowed_special is True:
+            return self.tkt_model.special_tokens_set
+        elif allowed_special is False:
+            return set()
+        return allowed_special
+
+    @staticmethod
+    def _split(s: str) -> list[str]:
+        return [
+            s[i : i + TIKTOKEN_MAX_ENCODE_CHARS]
+            for i in range(0, len(s), TIKTOKEN_MAX_ENCODE_CHARS)
+        ]
+
+    def _encode_uncached(
+        self, s: str, allowed_special: bool | set[str] = True
+    ) -> tuple[int, ...]:
+        allowed_special = self._resolve_allowed_special(allowed_special)
+
+        if len(s) <= TIKTOKEN_MAX_ENCODE_CHARS:
+            return tuple(
+                self.tkt_model.encode(
+                    s, allowed_special=allowed_special, disallowed_special=set()
+                )
+            )
+
+        return tuple(
+            itertools.chain.from_iterable(
+                self.tkt_model.encode_batch(
+                    self._split(s),
+                    allowed_special=allowed_special,
+                    disallowed_special=set(),
+                )
+            )
+        )
+
     def encode(self, s: str, allowed_special: bool | set[str] = True) -> list[int]:
         assert isinstance(s, str)
 
-        subs = []
-        for i in range(0, len(s), TIKTOKEN_MAX_ENCODE_CHARS):
-            subs.append(s[i : i + TIKTOKEN_MAX_ENCODE_CHARS])
+        if len(s) <= TOKENIZER_CACHE_MAX_CHARS and isinstance(allowed_special, bool):
+            return list(self._encode_cached(s, allowed_special))
 
-        if allowed_special is True:
-            allowed_special = self.tkt_model.special_tokens_set
-        elif allowed_special is False:
-            allowed_special = set()
+        return list(self._encode_uncached(s, allowed_special))
+
+    def encode_batch(
+        self, texts: list[str], allowed_special: bool | set[str] = True
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Encode many strings at once.
+
+        Returns a flat int32 buffer with the tokens of every string and an int64
+        offsets array of length len(texts) + 1, so that the tokens of texts[i]
+        are tokens[offsets[i] : offsets[i + 1]].
+        """
 
-        return sum(
-            self.tkt_model.encode_batch(
-                subs, allowed_special=allowed_special, disallowed_special=set()
-            ),
-            start=[],
+        allowed_special = self._resolve_allowed_special(allowed_special)
+
+        # Long strings are split into several tiktoken chunks,
+        # owners maps every chunk back to its source string.
+        chunks, owners = [], []
+        for idx, text in enumerate(texts):
+            assert isinstance(text, str)
+            for sub in self._split(text):
+                chunks.append(sub)
+                owners.append(idx)
+
+        encoded = self.tkt_model.encode_batch(
+            chunks, allowed_special=allowed_special, disallowed_special=set()
+        )
+
+        lengths = np.zeros(len(texts), dtype=np.int64)
+        np.add.at(
+            lengths,
+            np.asarray(owners, dtype=np.int64),
+            np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)),
         )
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        tokens = np.fromiter(
+            itertools.chain.from_iterable(encoded),
+            dtype=np.int32,
+            count=int(offsets[-1]),
+        )
+
+        return tokens, offsets
 
     def decode(self, tokens: list[int]) -> str:
         return self.tkt_model.decode(tokens)
@@ -0,0 +1,61 @@
+"""
+Length-prefixed binary framing used by the streaming endpoints.
+
+Every frame is a little-endian uint32 body length followed by the body.
+The writer sends the header and the body as separate chunks, so the body is
+never copied to prepend the header. The reader appends incoming chunks to one
+growing buffer and hands out memoryviews of complete bodies. Consumed bytes
+are only dropped once they make up half of the buffer, so parsing stays linear
+in the stream size however the chunks are split.
+"""
+
+import struct
+from typing import Iterator
+
+HEADER = struct.Struct("<I")
+
+
+def pack_frame(body: bytes) -> tuple[bytes, bytes]:
+    """Header and body of one frame, to be written one after the other."""
+    return HEADER.pack(len(body)), body
+
+
+class FrameReader:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def feed(self, chunk: bytes) -> Iterator[memoryview]:
+        """
+        Appends `chunk` and yields the bodies completed by it. A body is only
+        valid until the next call to feed, copy it (bytes(body)) to keep it.
+        """
+
+        # Drop consumed bytes before growing, nobody holds a view at this point
+        if self.offset and self.offset * 2 >= len(self.buffer):
+            del self.buffer[: self.offset]
+            self.offset = 0
+
+        self.buffer += chunk
+        view = memoryview(self.buffer)
+        try:
+            while len(view) - self.offset >= HEADER.size:
+                (size,) = HEADER.unpack_from(view, self.offset)
+                start = self.offset + HEADER.size
+                if len(view) - start < size:
+                    break
+
+                self.offset = start + size
+                body = view[start : self.offset]
+                try:
+                    yield body
+                finally:
+                    body.release()
+        finally:
+            # A bytearray can't be resized while views on it are alive
+            view.release()
+
+    @property
+    def pending(self) -> int:
+        """Bytes received that don't form a complete frame yet."""
+        return len(self.buffer) - self.offset
@@ -5,11 +5,14 @@ from dataclasses import dataclass
 from typing import Literal
 
 import torch
-from pydantic import BaseModel, Field, conint, model_validator
+from pydantic import BaseModel, ConfigDict, Field, conint, model_validator
 from pydantic.functional_validators import SkipValidation
 from typing_extensions import Annotated
 
 from fish_speech.content_sequence import TextPart, VQPart
+from fish_speech.conversation import Message
+from fish_speech.conversation import TextPart as ConversationTextPart
+from fish_speech.conversation import VQPart as ConversationVQPart
 
 
 class ServeVQPart(BaseModel):
@@ -24,7 +27,11 @@ class ServeTextPart(BaseModel):
 
 class ServeAudioPart(BaseModel):
     type: Literal["audio"] = "audio"
+    # 16-bit mono PCM when streamed by /v1/chat, base64 in JSON
     audio: bytes
+    sample_rate: int | None = None
+
+    model_config = ConfigDict(ser_json_bytes="base64", val_json_bytes="base64")
 
 
 class ServeRequest(BaseModel):
@@ -39,6 +46,59 @@ class ServeRequest(BaseModel):
     early_stop_threshold: float = 1.0
 
 
+class ServeMessage(BaseModel):
+    role: Literal["system", "assistant", "user", "raw"]
+    parts: list[ServeVQPart | ServeTextPart]
+
+    def to_conversation_message(self) -> Message:
+        new_message = Message(role=self.role, parts=[])
+        if self.role == "assistant":
+            new_message.modality = "voice"
+
+        for part in self.parts:
+            if isinstance(part, ServeTextPart):
+                new_message.parts.append(ConversationTextPart(text=part.text))
+            elif isinstance(part, ServeVQPart):
+                new_message.parts.append(
+                    ConversationVQPart(codes=torch.tensor(part.codes, dtype=torch.int))
+                )
+            else:
+                raise ValueError(f"Unsupported part type: {part}")
+
+        return new_message
+
+
+class ServeChatRequest(BaseModel):
+    messages: Annotated[list[ServeMessage], Field(min_length=1)]
+    max_new_tokens: int = 1024
+    top_p: float = 0.7
+    repetition_penalty: float = 1.2
+    temperature: float = 0.7
+    streaming: bool = False
+    num_samples: int = 1
+    early_stop_threshold: float = 1.0
+    # Streaming only: every VQ run is also decoded by the server codec and sent as PCM
+    decode_audio: bool = False
+
+
+class ServeResponse(BaseModel):
+    messages: list[ServeMessage]
+    finish_reason: Literal["stop", "error"] | None = None
+    stats: dict[str, int | float | str] = {}
+
+
+class ServeStreamDelta(BaseModel):
+    role: Literal["system", "assistant", "user"] | None = None
+    part: ServeVQPart | ServeTextPart | ServeAudioPart | None = None
+
+
+class ServeStreamResponse(BaseModel):
+    sample_id: int = 0
+    delta: ServeStreamDelta | None = None
+    finish_reason: Literal["stop", "error"] | None = None
+    stats: dict[str, int | float | str] | None = None
+
+
 class ServeVQGANEncodeRequest(BaseModel):
     # The audio here should be in wav, mp3, etc
     audios: list[bytes]
@@ -89,10 +149,21 @@ class ServeTTSRequest(BaseModel):
     # For example, if you want use https://fish.audio/m/7f92f8afb8ec43bf81429cc1c9199cb1/
     # Just pass 7f92f8afb8ec43bf81429cc1c9199cb1
     reference_id: str | None = None
+    # Voice whose LoRA adapter is applied, when the server runs with a LoRA registry
+    voice_id: str | None = None
     seed: int | None = None
     use_memory_cache: Literal["on", "off"] = "off"
     # Normalize text for en & zh, this increase stability for numbers
     normalize: bool = True
+    # Trim the silence around every generated segment before concatenation
+    trim_silence: bool = False
+    # Seconds after which the generation is abandoned, None waits indefinitely
+    timeout: Annotated[float, Field(gt=0)] | None = None
+    # Scheduling class, interactive requests are served before batch ones
+    priority: Literal["interactive", "batch"] = "interactive"
+    # Requests of one tenant are capped by the scheduler. The HTTP API sets it from
+    # the caller's credentials, see tools/server/api_utils.py request_tenant
+    tenant: str | None = None
     # not usually used below
     streaming: bool = False
     max_new_tokens: int = 1024
@@ -0,0 +1,215 @@
+"""
+Vectorized leading / trailing silence detection and trimming.
+
+Loudness is the RMS of `frame_length` windows every `hop_length` samples.
+A frame is voiced when its RMS is above the threshold, and the voiced range
+goes from the first voiced frame to the end of the last one, both found with
+a single argmax over the thresholded RMS.
+
+Files are scanned and rewritten block by block, so memory stays bounded
+regardless of their length.
+"""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import soundfile as sf
+
+DEFAULT_THRESHOLD_DB = -50.0
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+BLOCK_SIZE = 1 << 20
+
+
+def db_to_amplitude(db: float) -> float:
+    return 10 ** (db / 20.0)
+
+
+def frame_rms(
+    samples: np.ndarray,
+    frame_length: int = FRAME_LENGTH,
+    hop_length: int = HOP_LENGTH,
+) -> np.ndarray:
+    """
+    RMS of every frame of a mono signal, the tail is zero padded so every
+    sample belongs to at least one frame. Computed from a cumulative sum of
+    squares, O(n) whatever the frame length.
+    """
+
+    samples = np.asarray(samples, dtype=np.float64)
+    if samples.size == 0:
+        return np.zeros(0)
+
+    num_frames = max(0, -(-(samples.size - frame_length) // hop_length)) + 1
+    padded_length = (num_frames - 1) * hop_length + frame_length
+
+    energy = np.zeros(padded_length + 1)
+    np.cumsum(np.square(samples), out=energy[1 : samples.size + 1])
+    energy[samples.size + 1 :] = energy[samples.size]
+
+    starts = np.arange(num_frames) * hop_length
+    sums = energy[starts + frame_length] - energy[starts]
+    return np.sqrt(np.maximum(sums, 0) / frame_length)
+
+
+def voiced_frames(rms: np.ndarray, threshold: float) -> Optional[tuple[int, int]]:
+    """First and last voiced frame, None if every frame is below the threshold."""
+
+    voiced = rms > threshold
+    if not voiced.any():
+        return None
+
+    first = int(np.argmax(voiced))
+    last = len(voiced) - 1 - int(np.argmax(voiced[::-1]))
+    return first, last
+
+
+def voiced_range(
+    samples: np.ndarray,
+    threshold_db: float = DEFAULT_THRESHOLD_DB,
+    frame_length: int = FRAME_LENGTH,
+    hop_length: int = HOP_LENGTH,
+) -> Optional[tuple[int, int]]:
+    """Sample range [start, end) between the first and last voiced frames."""
+
+    samples = np.asarray(samples)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=0)
+
+    frames = voiced_frames(
+        frame_rms(samples, frame_length, hop_length), db_to_amplitude(threshold_db)
+    )
+    if frames is None:
+        return None
+
+    first, last = frames
+    return first * hop_length, min(last * hop_length + frame_length, samples.size)
+
+
+def trim_silence(
+    samples: np.ndarray,
+    sample_rate: int,
+    threshold_db: float = DEFAULT_THRESHOLD_DB,
+    keep_start: float = 0.02,
+    keep_end: float = 0.02,
+) -> np.ndarray:
+    """
+    Trims leading and trailing silence of a [..., time] array, keeping
+    `keep_start` / `keep_end` seconds around the voiced range.
+    Fully silent inputs are returned unchanged.
+    """
+
+    bounds = voiced_range(samples, threshold_db)
+    if bounds is None:
+        return samples
+
+    start = max(0, bounds[0] - int(keep_start * sample_rate))
+    end = min(samples.shape[-1], bounds[1] + int(keep_end * sample_rate))
+    return samples[..., start:end]
+
+
+def scan_voiced_range(
+    path: str | Path,
+    threshold_db: float = DEFAULT_THRESHOLD_DB,
+    frame_length: int = FRAME_LENGTH,
+    hop_length: int = HOP_LENGTH,
+    block_size: int = BLOCK_SIZE,
+) -> tuple[Optional[tuple[int, int]], int, int]:
+    """
+    Streams a file and returns (voiced range or None, sample rate, number of samples).
+    Frames are identical to the in-memory `voiced_range` of the downmixed signal.
+    """
+
+    threshold = db_to_amplitude(threshold_db)
+    first = last = None
+    carry = np.zeros(0, dtype=np.float32)
+    offset = 0  # Sample index of carry[0]
+
+    with sf.SoundFile(str(path)) as f:
+        sample_rate, num_samples = f.samplerate, f.frames
+
+        for block in f.blocks(blocksize=block_size, dtype="float32", always_2d=True):
+            buffer = np.concatenate([carry, block.mean(axis=1)])
+            if buffer.size < frame_length:
+                carry = buffer
+                continue
+
+            # Only complete frames, the rest is carried into the next block
+            num_frames = (buffer.size - frame_length) // hop_length + 1
+            rms = frame_rms(
+                buffer[: (num_frames - 1) * hop_length + frame_length],
+                frame_length,
+                hop_length,
+            )
+            frames = voiced_frames(rms, threshold)
+            if frames is not None:
+                first = offset // hop_length + frames[0] if first is None else first
+                last = offset // hop_length + frames[1]
+
+            consumed = num_frames * hop_length
+            carry, offset = buffer[consumed:], offset + consumed
+
+    # Zero padded frames over the tail
+    if carry.size > 0:
+        frames = voiced_frames(frame_rms(carry, frame_length, hop_length), threshold)
+        if frames is not None:
+            first = offset // hop_length + frames[0] if first is None else first
+            last = offset // hop_length + frames[1]
+
+    if first is None:
+        return None, sample_rate, num_samples
+
+    return (
+        (first * hop_length, min(last * hop_length + frame_length, num_samples)),
+        sample_rate,
+        num_samples,
+    )
+
+
+def write_range(
+    source: str | Path,
+    target: str | Path,
+    start: int,
+    end: int,
+    pad_end: int = 0,
+    block_size: int = BLOCK_SIZE,
+):
+    """
+    Copies samples [start, end) of `source` followed by `pad_end` zero samples
+    into `target`, in blocks and in the source format. `target` is replaced
+    atomically, so it may be the source itself.
+    """
+
+    target = Path(target)
+    tmp_path = target.with_name(f".{target.name}.tmp")
+
+    with sf.SoundFile(str(source)) as src:
+        try:
+            with sf.SoundFile(
+                str(tmp_path),
+                "w",
+                samplerate=src.samplerate,
+                channels=src.channels,
+                format=src.format,
+                subtype=src.subtype,
+            ) as dst:
+                src.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    block = src.read(min(block_size, remaining), dtype="float32")
+                    if len(block) == 0:
+                        break
+                    dst.write(block)
+                    remaining -= len(block)
+
+                while pad_end > 0:
+                    size = min(block_size, pad_end)
+                    dst.write(np.zeros((size, src.channels), dtype=np.float32))
+                    pad_end -= size
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    os.replace(tmp_path, target)
@@ -0,0 +1,43 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from loguru import logger
+
+
+class StartupTimeline:
+    """
+    Wall-clock start / end of named startup steps, relative to `origin`
+    (perf_counter timestamp, defaults to creation). Steps may overlap when
+    they run in different threads.
+    """
+
+    def __init__(self, origin: float | None = None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.steps: list[tuple[str, float, float]] = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name: str):
+        start = time.perf_counter() - self.origin
+        try:
+            yield
+        finally:
+            end = time.perf_counter() - self.origin
+            with self.lock:
+                self.steps.append((name, start, end))
+            logger.info(f"[startup] {name}: {end - start:.2f}s (at {end:.2f}s)")
+
+    def summary(self) -> str:
+        with self.lock:
+            steps = sorted(self.steps, key=lambda s: s[1])
+
+        total = max((end for _, _, end in steps), default=0.0)
+        lines = [f"Startup timeline, {total:.2f}s total:"]
+        for name, start, end in steps:
+            lines.append(f"  {start:7.2f}s -> {end:7.2f}s  {end - start:7.2f}s  {name}")
+        return "\n".join(lines)
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {name: round(end - start, 3) for name, start, end in self.steps}
@@ -1,4 +1,5 @@
 import sys
+import time
 import traceback
 import os
 import io
@@ -8,6 +9,9 @@ from loguru import logger
 import soundfile as sf
 import numpy as np
 
+# Origin of the startup timeline
+PROCESS_START = time.perf_counter()
+
 # Force unbuffered output for RunPod
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
@@ -117,14 +121,57 @@ try:
     import torch
     import numpy as np
     import runpod
-    import boto3
     import soundfile as sf
-    from botocore.exceptions import ClientError
 
-    
+    class JobFailed(Exception):
+        # Raised instead of yielded: an error item would end the stream as COMPLETED,
+        # an exception makes the SDK report the job as FAILED with this message
+        pass
+
+    def make_s3_client(**kwargs):
+        # boto3 is slow to import and only needed by upload / reference tasks
+        import boto3
+        return boto3.client('s3', **kwargs)
+
+    def to_wav_bytes(audio, sample_rate):
+        # v12.18 / v12.20: Mono PCM_16, normalized only when it would clip
+        audio = np.asarray(audio).flatten()
+        if audio.dtype.kind != 'i':
+            max_val = np.max(np.abs(audio)) if audio.size else 0.0
+            if max_val > 1.0:
+                audio = audio / max_val
+            audio = (audio * 32767).clip(-32768, 32767).astype(np.int16)
+
+        wav_buffer = io.BytesIO()
+        sf.write(wav_buffer, audio, sample_rate, format='WAV', subtype='PCM_16')
+        return wav_buffer.getvalue()
+
+    def encode_mp3(wav_bytes):
+        """WAV -> MP3 through a direct FFmpeg pipe (v12.19), None if FFmpeg fails."""
+        try:
+            process = subprocess.Popen(
+                ["ffmpeg", "-y", "-i", "pipe:0", "-acodec", "libmp3lame", "-b:a", "192k", "-f", "mp3", "pipe:1"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            # Communicate sends input and waits for output
+            mp3_bytes, stderr_output = process.communicate(input=wav_bytes)
+        except Exception as e:
+            logger.error(f"--- [v12.19 EXCEPTION] FFmpeg Pipe Failed: {e} ---")
+            return None
+
+        if process.returncode != 0:
+            logger.error(f"--- [v12.19 FFMPEG ERROR] FFmpeg failed: {stderr_output.decode()} ---")
+            return None
+        return mp3_bytes
+
     print("--- [DEBUG] Importing Fish Speech Engines... ---", file=sys.stderr, flush=True)
-    from tools.server.model_manager import ModelManager
-    from fish_speech.utils.schema import ServeTTSRequest, ServeReferenceAudio
+    from fish_speech.utils.timeline import StartupTimeline
+    timeline = StartupTimeline(origin=PROCESS_START)
+    with timeline.step("engine imports"):
+        from tools.server.model_manager import ModelManager
+        from fish_speech.utils.schema import ServeTTSRequest, ServeReferenceAudio
 
     # --- Configuration ---
     LLAMA_CHECKPOINT_PATH = checkpoint_dir
@@ -144,6 +191,13 @@ try:
             
     DECODER_CHECKPOINT_PATH = os.path.join(checkpoint_dir, decoder_file)
     DECODER_CONFIG_NAME = "modded_dac_vq"
+
+    # Cold-start bundle from tools/export_bundle.py: mmapped safetensors, no Hydra
+    BUNDLE_DIR = os.getenv("MODEL_BUNDLE_DIR") or os.path.join(checkpoint_dir, "bundle")
+    if os.path.exists(os.path.join(BUNDLE_DIR, "model.safetensors")):
+        LLAMA_CHECKPOINT_PATH = BUNDLE_DIR
+        DECODER_CHECKPOINT_PATH = os.path.join(BUNDLE_DIR, "codec.safetensors")
+        print(f"--- [COLD START] Using model bundle {BUNDLE_DIR} ---", file=sys.stderr, flush=True)
     DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
     print(f"--- [v12.10 CONFIG] Llama: {LLAMA_CHECKPOINT_PATH} ---", file=sys.stderr, flush=True)
@@ -158,14 +212,30 @@ try:
         compile=True, # v10.7: Re-enable JIT for 186 tokens/s speed (Trade-off: slower startup)       
         llama_checkpoint_path=LLAMA_CHECKPOINT_PATH,
         decoder_checkpoint_path=DECODER_CHECKPOINT_PATH,
-        decoder_config_name=DECODER_CONFIG_NAME
+        decoder_config_name=DECODER_CONFIG_NAME,
+        # Premium voices: <voice_id>.pth LoRA adapters on the network volume
+        lora_dir=os.getenv("LORA_ADAPTER_DIR") or None,
+        lora_cache_size=int(os.getenv("LORA_CACHE_SIZE", "8")),
+        # Speculative decoding with a small draft model, when one is deployed
+        draft_checkpoint_path=os.getenv("DRAFT_CHECKPOINT_PATH") or None,
+        num_draft_tokens=int(os.getenv("NUM_DRAFT_TOKENS", "4")),
+        # Calibrated expected lengths, caps runaway generations per request
+        length_predictor_path=os.getenv("LENGTH_PREDICTOR_PATH") or None,
+        timeline=timeline,
+        # Real texts / voices / lengths instead of a single "Hello world."
+        warm_up_plan=os.getenv("WARM_UP_PLAN") or None,
     )
     engine = model_manager.tts_inference_engine
     print("--- [COLD START] Models Loaded Successfully! ---", file=sys.stderr, flush=True)
+    print(timeline.summary(), file=sys.stderr, flush=True)
 
     def handler(job):
         """
-        RunPod Serverless Handler
+        RunPod Serverless Handler (generator)
+
+        TTS jobs yield one IN_PROGRESS item per paragraph (progress %, chunk audio
+        or its R2 URL) and end with the COMPLETED item holding the full MP3.
+        Other tasks yield a single item. Failures raise, so the job ends FAILED.
         """
         job_id = job.get('id', 'unknown')
         
@@ -178,7 +248,7 @@ try:
              logger.error("--- [CRITICAL] This model is incompatible with v12.10+ logic. ---")
              logger.error("--- [ACTION] Please attach the Network Volume to /runpod-volume ---")
              # Fail fast to prevent confusing CUDA errors later
-             return {"error": "Network Volume Missing: /runpod-volume/checkpoints/fish-speech-1.5 not found. Please attach Volume."}
+             raise JobFailed("Network Volume Missing: /runpod-volume/checkpoints/fish-speech-1.5 not found. Please attach Volume.")
 
         print(f"--- [DEBUG] Handling Request: {job_id} ---", file=sys.stderr, flush=True)
         
@@ -187,6 +257,21 @@ try:
             text = job_input.get("text")
             task = job_input.get("task", "tts") # Default to TTS
 
+            # --- Batch of short TTS requests for one voice (runpod_dispatcher.py) ---
+            # One job, one reference load; every item is tagged with its request index
+            if task == "tts_batch":
+                batch_requests = job_input.get("requests") or []
+                print(f"--- [BATCH] {len(batch_requests)} requests in job {job_id} ---", file=sys.stderr, flush=True)
+                for k, request_input in enumerate(batch_requests):
+                    try:
+                        sub_job = {"id": f"{job_id}-{k}", "input": {"chunk_delivery": "none", **request_input}}
+                        for item in handler(sub_job):
+                            yield {**item, "batch_index": k}
+                    except Exception as e:
+                        print(f"--- [BATCH ERROR] Request {k} failed: {e} ---", file=sys.stderr, flush=True)
+                        yield {"error": str(e), "status": "FAILED", "batch_index": k}
+                return
+
             # --- v11: Proxy Upload (Bypass CORS) ---
             if task == "proxy_upload":
                 filename = job_input.get("filename")
@@ -194,7 +279,7 @@ try:
                 text_content = job_input.get("text", "") # Optional transcript
                 
                 if not filename or not audio_b64:
-                    return {"error": "Filename and audio data required", "status": "failed"}
+                    raise JobFailed("Filename and audio data required")
 
                 print(f"--- [v11 PROXY] Uploading: {filename} ---", file=sys.stderr, flush=True)
 
@@ -204,7 +289,7 @@ try:
                 s3_endpoint_url = os.environ.get("S3_ENDPOINT_URL")
 
                 if not (s3_access_key and s3_secret_key and s3_bucket_name):
-                    return {"error": "S3 Not Configured on Backend", "status": "failed"}
+                    raise JobFailed("S3 Not Configured on Backend")
 
                 try:
                     s3_kwargs = {
@@ -214,7 +299,7 @@ try:
                     if s3_endpoint_url:
                         s3_kwargs['endpoint_url'] = s3_endpoint_url
 
-                    s3_client = boto3.client('s3', **s3_kwargs)
+                    s3_client = make_s3_client(**s3_kwargs)
                     
                     # Sanitize filename & ID
                     voice_name = os.path.splitext(filename)[0]
@@ -243,20 +328,21 @@ try:
                         )
 
                     print(f"--- [v11 PROXY] Successfully saved: {safe_name} ---", file=sys.stderr, flush=True)
-                    return {
+                    yield {
                         "message": f"Voice '{safe_name}' saved successfully",
                         "voice_id": safe_name,
                         "status": "COMPLETED"
                     }
+                    return
                 except Exception as e:
                     print(f"--- [v11 ERROR] Proxy Upload Failed: {e} ---", file=sys.stderr, flush=True)
-                    return {"error": str(e), "status": "failed"}
+                    raise
 
             # --- v10: Presigned URL Generation (LEAVE FOR LEGACY COMPATIBILITY) ---
             if task == "generate_presigned_url":
                 filename = job_input.get("filename")
                 if not filename:
-                    return {"error": "Filename required", "status": "failed"}
+                    raise JobFailed("Filename required")
 
                 print(f"--- [v10 UPLOAD] Generating URL for: {filename} ---", file=sys.stderr, flush=True)
 
@@ -266,7 +352,7 @@ try:
                 s3_endpoint_url = os.environ.get("S3_ENDPOINT_URL")
 
                 if not (s3_access_key and s3_secret_key and s3_bucket_name):
-                    return {"error": "S3 Not Configured", "status": "failed"}
+                    raise JobFailed("S3 Not Configured")
 
                 try:
                     s3_kwargs = {
@@ -276,7 +362,7 @@ try:
                     if s3_endpoint_url:
                         s3_kwargs['endpoint_url'] = s3_endpoint_url
 
-                    s3_client = boto3.client('s3', **s3_kwargs)
+                    s3_client = make_s3_client(**s3_kwargs)
                     
                     # Sanitize filename
                     safe_filename = "".join([c for c in filename if c.isalpha() or c.isdigit() or c in (' ', '_', '-', '.')]).strip()
@@ -288,14 +374,15 @@ try:
                         ExpiresIn=300 # 5 minutes
                     )
                     
-                    return {
+                    yield {
                         "upload_url": presigned_url,
                         "file_key": safe_filename, # The ID the frontend should save
                         "status": "COMPLETED"
                     }
+                    return
                 except Exception as e:
                      print(f"--- [v10 ERROR] Failed to generate URL: {e} ---", file=sys.stderr, flush=True)
-                     return {"error": str(e), "status": "failed"}
+                     raise
 
             # --- v10: List Voices from S3 ---
             if task == "list_voices":
@@ -306,7 +393,8 @@ try:
                 s3_endpoint_url = os.environ.get("S3_ENDPOINT_URL")
 
                 if not (s3_access_key and s3_secret_key and s3_bucket_name):
-                    return {"voices": [], "status": "COMPLETED", "warning": "S3 Not Configured"}
+                    yield {"voices": [], "status": "COMPLETED", "warning": "S3 Not Configured"}
+                    return
 
                 try:
                     s3_kwargs = {
@@ -316,7 +404,7 @@ try:
                     if s3_endpoint_url:
                         s3_kwargs['endpoint_url'] = s3_endpoint_url
 
-                    s3_client = boto3.client('s3', **s3_kwargs)
+                    s3_client = make_s3_client(**s3_kwargs)
                     response = s3_client.list_objects_v2(Bucket=s3_bucket_name)
                     
                     voices = []
@@ -328,17 +416,18 @@ try:
                                 name = os.path.splitext(key)[0]
                                 voices.append({"id": key, "name": name})
                     
-                    return {
+                    yield {
                         "voices": voices,
                         "status": "COMPLETED"
                     }
+                    return
                 except Exception as e:
                     print(f"--- [v10 ERROR] Failed to list voices: {e} ---", file=sys.stderr, flush=True)
-                    return {"error": str(e), "status": "failed"}
+                    raise
             
             # --- Standard TTS Task ---
             if not text:
-                return {"error": "No text provided"}
+                raise JobFailed("No text provided")
 
             # v8 Module 3: 500 Character Threshold REMOVED (v15.5)
             # if len(text) < 500:
@@ -378,7 +467,8 @@ try:
                 if s3_endpoint_url:
                     s3_kwargs['endpoint_url'] = s3_endpoint_url
                 
-                s3_client = boto3.client('s3', **s3_kwargs)
+                s3_client = make_s3_client(**s3_kwargs)
+                from botocore.exceptions import ClientError
 
                 # Local Cache Path
                 # Sanitize voice_id to prevent path traversal
@@ -497,21 +587,86 @@ try:
                 ))
 
             from tools.server.inference import inference_wrapper
+            from fish_speech.models.text2semantic.inference import CancellationToken
+
+            # Generations still running past the job timeout are abandoned, freeing the GPU
+            job_timeout = float(job_input.get("timeout") or os.getenv("TTS_JOB_TIMEOUT", "0"))
+            job_deadline = time.monotonic() + job_timeout if job_timeout > 0 else None
             
-            # Seed random for reproducibility if seed provided
-            if job_input.get("seed"):
-                random.seed(job_input.get("seed"))
+            # Pauses and speeds of this job only, a seed reproduces them without
+            # reseeding the process-wide generator shared with concurrent jobs
+            rng = random.Random(job_input.get("seed"))
 
             sample_rate = engine.decoder_model.sample_rate
+            # v12.20: Enforce Fish Speech 1.5 Sample Rate (44100 Hz)
+            # If engine didn't report it, or reported something odd, we default to 44100
+            if not sample_rate or sample_rate != 44100:
+                 logger.warning(f"--- [v12.20 RATE] Correcting Sample Rate from {sample_rate} to 44100 Hz ---")
+                 sample_rate = 44100
             final_audio_segments = []
             
             # Prosody: Split Text logic (Paragraphs -> Sentences -> Phrases)
             paragraphs = [p for p in text.splitlines() if p.strip()]
             
             print(f"--- [v10.5 PROSODY] Processing {len(paragraphs)} paragraphs (Stochastic Mode)... ---", file=sys.stderr, flush=True)
-            
+
+            # Progressive results: every paragraph is yielded as soon as it is generated,
+            # as an R2 object URL ("url") or inline ("base64"), or as progress only ("none").
+            # Not inline by default: the aggregated output would hold every chunk on top
+            # of the full MP3, twice the audio against RunPod's output size limit
+            chunk_delivery = job_input.get("chunk_delivery") or (
+                "url" if s3_access_key and s3_secret_key and s3_bucket_name else "none"
+            )
+            chunk_s3_client = None
+            total_chars = sum(len(p) for p in paragraphs)
+            done_chars = 0
+
+            def stream_chunk(index, segments):
+                nonlocal chunk_s3_client
+                item = {
+                    "status": "IN_PROGRESS",
+                    "chunk_index": index,
+                    "chunk_count": len(paragraphs),
+                    "progress": round(100.0 * done_chars / total_chars, 1),
+                }
+                if not segments or chunk_delivery == "none":
+                    return item
+
+                wav_bytes = to_wav_bytes(np.concatenate(segments), sample_rate)
+                chunk_bytes = encode_mp3(wav_bytes)
+                item["format"] = "mp3" if chunk_bytes is not None else "wav"
+                if chunk_bytes is None:
+                    chunk_bytes = wav_bytes
+
+                if chunk_delivery == "url":
+                    if chunk_s3_client is None:
+                        s3_kwargs = {
+                            'aws_access_key_id': s3_access_key,
+                            'aws_secret_access_key': s3_secret_key,
+                        }
+                        if s3_endpoint_url:
+                            s3_kwargs['endpoint_url'] = s3_endpoint_url
+                        chunk_s3_client = make_s3_client(**s3_kwargs)
+
+                    chunk_key = f"tts-chunks/{job_id}/{index:04d}.{item['format']}"
+                    chunk_s3_client.put_object(
+                        Bucket=s3_bucket_name,
+                        Key=chunk_key,
+                        Body=chunk_bytes,
+                        ContentType=f"audio/{'mpeg' if item['format'] == 'mp3' else 'wav'}"
+                    )
+                    item["url"] = chunk_s3_client.generate_presigned_url(
+                        'get_object',
+                        Params={'Bucket': s3_bucket_name, 'Key': chunk_key},
+                        ExpiresIn=int(os.getenv("CHUNK_URL_TTL", "3600"))
+                    )
+                else:
+                    item["audio_base64"] = base64.b64encode(chunk_bytes).decode('utf-8')
+                return item
+
             for i, paragraph in enumerate(paragraphs):
                 is_last_paragraph = (i == len(paragraphs) - 1)
+                paragraph_segments = []
                 
                 # regex to capture: ... | . | ! | ? | , | ; | — (em dash) | - (hyphen acting as break)
                 # We prioritize ... over . by placing it first
@@ -535,26 +690,26 @@ try:
                         # 1. Comma / Semicolon (Barely noticeable breath)
                         if punct in [",", ";"]:
                              # v10.8: 0.1s - 0.2s
-                             pause_duration = random.uniform(0.1, 0.2)
+                             pause_duration = rng.uniform(0.1, 0.2)
                         
                         # 2. Period / Exclamation / Question (Natural Flow)
                         elif any(c in punct for c in ".!?") and "..." not in punct:
                              # v10.8: 0.4s - 0.6s
-                             pause_duration = random.uniform(0.4, 0.6)
+                             pause_duration = rng.uniform(0.4, 0.6)
                         
                         # 3. Ellipsis (Hesitation)
                         elif "..." in punct:
                              # v10.8: 1.0s - 1.2s
-                             pause_duration = random.uniform(1.0, 1.2)
+                             pause_duration = rng.uniform(1.0, 1.2)
                         
                         # 4. Dash (Quick Break)
                         elif "—" in punct or "-" in punct:
                              # v10.8: 0.2s - 0.4s
-                             pause_duration = random.uniform(0.2, 0.4)
+                             pause_duration = rng.uniform(0.2, 0.4)
                         
                         # --- VARIABLE SPEED DE-CELERATION (Landing the message) ---
                         # Default Speed: Slightly brisk (0.95 - 1.05)
-                        chunk_speed = random.uniform(0.95, 1.05)
+                        chunk_speed = rng.uniform(0.95, 1.05)
                         
                         # Check if it's a sentence end AND it's the last chunk of the paragraph
                         # We check if we are within the last 2 items (Ref accounting for potential trailing empty string)
@@ -563,7 +718,7 @@ try:
                         
                         if is_sentence_end and is_paragraph_end:
                             # Slow down ONLY at the very end to "land" the thought
-                            chunk_speed = random.uniform(0.80, 0.85)
+                            chunk_speed = rng.uniform(0.80, 0.85)
 
                         # Generate Audio for this chunk
                         logger.info(f"--- [v12.15 TRACE] Inference Start ---")
@@ -579,9 +734,13 @@ try:
                             format="wav", 
                             references=references, # Passing the loaded [ServeReferenceAudio]
                             reference_id=None, # IMPORTANT: Force use of 'references' list, ignore ID to prevent lookup conflicts
+                            voice_id=voice_id,
                             seed=job_input.get("seed"),
+                            # Authenticated by the Hostinger API, which sets it
+                            tenant=job_input.get("user_id"),
                             use_memory_cache=job_input.get("use_memory_cache", "off"),
                             normalize=job_input.get("normalize", True),
+                            trim_silence=job_input.get("trim_silence", False),
                             streaming=False,
                             max_new_tokens=job_input.get("max_new_tokens", 1024),
                             top_p=job_input.get("top_p", 0.7),
@@ -592,21 +751,21 @@ try:
                         )
                         
                         chunk_audio_data = []
-                        for res in inference_wrapper(req, engine):
+                        for res in inference_wrapper(req, engine, CancellationToken(job_deadline)):
                             if isinstance(res, np.ndarray):
                                 chunk_audio_data.append(res)
                         
                         if chunk_audio_data:
-                            final_audio_segments.extend(chunk_audio_data)
+                            paragraph_segments.extend(chunk_audio_data)
                             
                             # Append Silence
                             if pause_duration > 0:
                                 silence_samples = int(sample_rate * pause_duration)
                                 # Match dtype of audio (usually float32 from model, but let's check)
                                 if chunk_audio_data[0].dtype.kind == 'i':
-                                     final_audio_segments.append(np.zeros(silence_samples, dtype=chunk_audio_data[0].dtype))
+                                     paragraph_segments.append(np.zeros(silence_samples, dtype=chunk_audio_data[0].dtype))
                                 else:
-                                     final_audio_segments.append(np.zeros(silence_samples, dtype=np.float32))
+                                     paragraph_segments.append(np.zeros(silence_samples, dtype=np.float32))
 
                         current_chunk_text = "" # Reset
                         
@@ -614,38 +773,44 @@ try:
                         current_chunk_text += token
                 
                 # Loose end (End of paragraph without punctuation)
-                        print(f"--- [PROSODY] Final Chunk (Para): '{current_chunk_text[:15]}...' ---", file=sys.stderr, flush=True)
-                        req = ServeTTSRequest(
-                            text=current_chunk_text,
-                            chunk_length=job_input.get("chunk_length", 200),
-                            format="wav", 
-                            references=references,
-                            reference_id=None, # Fix: Use loaded references
-                            seed=job_input.get("seed"),
-                            use_memory_cache=job_input.get("use_memory_cache", "off"),
-                            normalize=job_input.get("normalize", True),
-                            streaming=False,
-                            max_new_tokens=job_input.get("max_new_tokens", 1024),
-                            top_p=job_input.get("top_p", 0.7),
-                            repetition_penalty=job_input.get("repetition_penalty", 1.2),
-                            temperature=job_input.get("temperature", 0.7),
-                            pause_amount=0.0,
-                            speed=0.9,
-                        )
-                        for res in inference_wrapper(req, engine):
-                            if isinstance(res, np.ndarray):
-                                final_audio_segments.append(res)
+                if current_chunk_text.strip():
+                    print(f"--- [PROSODY] Final Chunk (Para): '{current_chunk_text[:15]}...' ---", file=sys.stderr, flush=True)
+                    req = ServeTTSRequest(
+                        text=current_chunk_text,
+                        chunk_length=job_input.get("chunk_length", 200),
+                        format="wav", 
+                        references=references,
+                        reference_id=None, # Fix: Use loaded references
+                        voice_id=voice_id,
+                        seed=job_input.get("seed"),
+                        tenant=job_input.get("user_id"),
+                        use_memory_cache=job_input.get("use_memory_cache", "off"),
+                        normalize=job_input.get("normalize", True),
+                        trim_silence=job_input.get("trim_silence", False),
+                        streaming=False,
+                        max_new_tokens=job_input.get("max_new_tokens", 1024),
+                        top_p=job_input.get("top_p", 0.7),
+                        repetition_penalty=job_input.get("repetition_penalty", 1.2),
+                        temperature=job_input.get("temperature", 0.7),
+                        pause_amount=0.0,
+                        speed=0.9,
+                    )
+                    for res in inference_wrapper(req, engine, CancellationToken(job_deadline)):
+                        if isinstance(res, np.ndarray):
+                            paragraph_segments.append(res)
+
+                final_audio_segments.extend(paragraph_segments)
+                done_chars += len(paragraph)
+                yield stream_chunk(i, paragraph_segments)
                 
                 # Paragraph Pause (v10.8: 0.8s - 1.2s)
                 if not is_last_paragraph:
-                     para_pause = random.uniform(0.8, 1.2)
+                     para_pause = rng.uniform(0.8, 1.2)
                      silence_samples = int(sample_rate * para_pause)
                      print(f"--- [PROSODY] Paragraph Break: {para_pause:.2f}s ---", file=sys.stderr, flush=True)
                      final_audio_segments.append(np.zeros(silence_samples, dtype=np.float32))
 
             # Final Stitching
-            audio_buffer = io.BytesIO()
-            
             if final_audio_segments:
                 if final_audio_segments[0].dtype.kind == 'i':
                     final_audio = np.concatenate(final_audio_segments)
@@ -653,95 +818,68 @@ try:
                     final_audio = np.concatenate(final_audio_segments).astype(np.float32)
                 
                 # Force PCM_16 for 50% smaller transfer size and better compatibility
-            # v12.20 FIX: Force 1D Array (Mono) and Check Sample Rate
-            # 1. Flatten to ensure 1D shape (N,) not (N, 1)
+            # v12.20 FIX: Force 1D Array (Mono)
+            # Flatten to ensure 1D shape (N,) not (N, 1)
             if final_audio.ndim > 1:
                 logger.warning(f"--- [v12.20 SHAPE] Audio was {final_audio.shape}, flattening to Mono. ---")
                 final_audio = final_audio.flatten()
             
-            # 2. Enforce Fish Speech 1.5 Sample Rate (44100 Hz)
-            # If engine didn't report it, or reported something odd, we default to 44100
-            if not sample_rate or sample_rate != 44100:
-                 logger.warning(f"--- [v12.20 RATE] Correcting Sample Rate from {sample_rate} to 44100 Hz ---")
-                 sample_rate = 44100
-            
             logger.info(f"--- [v12.20 CONFIG] Final Audio: Shape={final_audio.shape}, Rate={sample_rate} Hz ---")
 
             # v12.18 DEBUG: Audio Statistics & Normalization
             # Check for NaNs/Infs
             if np.isnan(final_audio).any() or np.isinf(final_audio).any():
                 logger.error("--- [v12.18 ERROR] Audio contains NaN or Inf! Returning Error. ---")
-                return {"error": "Model generated invalid audio (NaN/Inf)", "status": "failed"}
+                raise JobFailed("Model generated invalid audio (NaN/Inf)")
 
             max_val = np.max(np.abs(final_audio))
             logger.info(f"--- [v12.18 SAFETY] Audio Stats: Min={np.min(final_audio):.4f}, Max={np.max(final_audio):.4f}, Mean={np.mean(final_audio):.4f} ---")
 
             # Validate Max Value (Prevent Clipping or Silence)
             if max_val == 0:
-                 return {"error": "Generated audio is silent", "status": "failed"}
+                 raise JobFailed("Generated audio is silent")
             
             # Normalize if needed (safest to always normalize to -3dB or similar, but let's just ensure it's in range)
             # If max_val > 1.0, we MUST normalize to prevent clipping (buzzing)
             if max_val > 1.0:
                 logger.info(f"--- [v12.18 NORM] Normalizing audio (Max {max_val:.2f} > 1.0) ---")
-                final_audio = final_audio / max_val
-            
-            # v12.18 FIX: Explicitly convert to Int16 to prevent format interpretation errors
-            # Float32 -> Int16 safely
-            final_audio_int16 = (final_audio * 32767).clip(-32768, 32767).astype(np.int16)
 
             # 1. Write to WAV buffer (RAM) using explicitly PCM_16
-            wav_buffer = io.BytesIO()
-            sf.write(wav_buffer, final_audio_int16, sample_rate, format='WAV', subtype='PCM_16')
-            wav_buffer.seek(0)
-            
-            wav_bytes = wav_buffer.getvalue()
+            wav_bytes = to_wav_bytes(final_audio, sample_rate)
             logger.info(f"--- [v12.19 FORMAT] Written WAV as PCM_16. Size: {len(wav_bytes)/1024:.2f} KB ---")
 
             # 2. Convert to MP3 using DIRECT FFmpeg Pipe (v12.19)
             # This is more robust than pydub/soundfile for RAW stream handling
             logger.info(f"--- [v12.19 COMPRESS] Converting WAV to MP3 using Pipe... ---")
-            
-            try:
-                process = subprocess.Popen(
-                    ["ffmpeg", "-y", "-i", "pipe:0", "-acodec", "libmp3lame", "-b:a", "192k", "-f", "mp3", "pipe:1"],
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
-                
-                # Communicate sends input and waits for output
-                mp3_bytes, stderr_output = process.communicate(input=wav_bytes)
-                
-                if process.returncode != 0:
-                     logger.error(f"--- [v12.19 FFMPEG ERROR] FFmpeg failed: {stderr_output.decode()} ---")
-                     # Fallback to returning WAV if compression fails (better than nothing)
-                     logger.warning("--- [v12.19 FALLBACK] Returning original WAV (Base64) ---")
-                     audio_base64 = base64.b64encode(wav_bytes).decode('utf-8')
-                     return {"audio_base64": audio_base64, "format": "wav", "status": "COMPLETED", "warning": "Compression Failed"}
-
-                logger.info(f"--- [v12.19 COMPRESS] Success! Final MP3 Size: {len(mp3_bytes)/1024/1024:.2f} MB ---")
-                
-                # 3. Return MP3 Bytes
-                audio_base64 = base64.b64encode(mp3_bytes).decode('utf-8')
+            mp3_bytes = encode_mp3(wav_bytes)
 
-            except Exception as e:
-                 logger.error(f"--- [v12.19 EXCEPTION] FFmpeg Pipe Failed: {e} ---")
-                 # Fallback
+            if mp3_bytes is None:
+                 # Fallback to returning WAV if compression fails (better than nothing)
+                 logger.warning("--- [v12.19 FALLBACK] Returning original WAV (Base64) ---")
                  audio_base64 = base64.b64encode(wav_bytes).decode('utf-8')
-                 return {"audio_base64": audio_base64, "format": "wav", "status": "COMPLETED", "warning": "Compression Exception"}
+                 yield {"audio_base64": audio_base64, "format": "wav", "status": "COMPLETED", "progress": 100.0, "chunk_count": len(paragraphs), "warning": "Compression Failed"}
+                 return
+
+            logger.info(f"--- [v12.19 COMPRESS] Success! Final MP3 Size: {len(mp3_bytes)/1024/1024:.2f} MB ---")
+
+            # 3. Return MP3 Bytes
+            audio_base64 = base64.b64encode(mp3_bytes).decode('utf-8')
 
             # v10.1: Memory Cleanup
-            del final_audio_segments, mp3_bytes, wav_buffer, wav_bytes
+            del final_audio_segments, mp3_bytes, wav_bytes
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
                 print(f"--- [v10.1 MEMORY] Cleanup complete. Max VRAM: {torch.cuda.max_memory_allocated() / 1024**2:.2f} MiB ---", file=sys.stderr, flush=True)
 
-            return {
+            # Last stream item, also the job output for clients polling /status
+            yield {
                 "audio_base64": audio_base64,
                 "format": "mp3",
-                "status": "COMPLETED"
+                "status": "COMPLETED",
+                "progress": 100.0,
+                "chunk_count": len(paragraphs),
             }
+            return
         finally:
             if torch.cuda.is_available():
                 torch.cuda.empty_cache()
@@ -749,7 +887,9 @@ try:
     # Start the worker
     if __name__ == "__main__":
         print("--- [DEBUG] RunPod Worker Starting... ---", file=sys.stderr, flush=True)
-        runpod.serverless.start({"handler": handler})
+        # Generator handler: /stream/{id} serves every yielded item as it is produced,
+        # /status/{id} (and the webhook) report the list of all items as the output
+        runpod.serverless.start({"handler": handler, "return_aggregate_stream": True})
 
 except Exception as e:
     print("\n" + "="*50, file=sys.stderr, flush=True)
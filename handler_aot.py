@@ -101,26 +101,26 @@ def init_background():
         ensure_models()
         
         # Step 2: Define paths for ModelManager
-        DECODER_CHECKPOINT = os.path.join(CHECKPOINT_DIR, "firefly-gan-vq-fsq-8x1024-21hz-generator.pth")
-        DECODER_CONFIG = "firefly_gan_vq"
-        
+        DECODER_CHECKPOINT = os.path.join(CHECKPOINT_DIR, "codec.pth")
+        if not os.path.exists(DECODER_CHECKPOINT):
+            DECODER_CHECKPOINT = os.path.join(CHECKPOINT_DIR, "firefly-gan-vq-fsq-8x1024-21hz-generator.pth")
+        DECODER_CONFIG = "modded_dac_vq"
+
+        # Step 3: Load and warm up. ModelManager runs the warm-up plan
+        # (WARM_UP_PLAN, see tools/server/warm_up.py) before returning, so
+        # the first job doesn't pay for reference encoding or new shapes.
         manager = ModelManager(
             mode="tts",
             device=DEVICE,
             half=True, 
             compile=True,
-            asr_enabled=False,
             llama_checkpoint_path=CHECKPOINT_DIR,
             decoder_config_name=DECODER_CONFIG,
-            decoder_checkpoint_path=DECODER_CHECKPOINT
+            decoder_checkpoint_path=DECODER_CHECKPOINT,
+            warm_up_plan=os.getenv("WARM_UP_PLAN") or None,
         )
-        print(f"ModelManager Initialized ({time.time() - start_init:.2f}s).")
-        
-        # Step 3: Warmup (Explicit call, strictly minimal)
-        print("Starting warmup (minimal)...")
-        manager.warm_up(manager.tts_inference_engine)
-        print("Warmup complete. signaling READY.")
-        
+        print(f"ModelManager Initialized and warmed up ({time.time() - start_init:.2f}s). signaling READY.")
+
         READY_EVENT.set()
         
     except Exception as e:
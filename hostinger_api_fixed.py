@@ -9,11 +9,29 @@ import json
 import shutil
 import re
 import traceback
+import asyncio
+import functools
+import time as _time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from io import BytesIO
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from supabase import create_client, Client
 from dotenv import load_dotenv
 from r2_utils import upload_file_object
+from api_cache import AsyncCache, SingleFlight, TTLCache
+from runpod_dispatcher import (
+    BATCH_TASK,
+    TERMINAL_STATUSES,
+    BatchDispatcher,
+    StreamFanout,
+    aggregate_output,
+    batch_result,
+    is_batch_output,
+    split_job_id,
+)
+from silence_cutter import cut_silence_file
 import subprocess
 import tempfile
 
@@ -30,6 +48,10 @@ SUPABASE_URL = os.getenv("SUPABASE_URL", "").strip()
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "").strip()
 RUNPOD_ENDPOINT_ID = os.getenv("RUNPOD_ENDPOINT_ID", "").strip()
 RUNPOD_API_KEY = os.getenv("RUNPOD_API_KEY", "").strip()
+RUNPOD_BASE_URL = f"https://api.runpod.ai/v2/{RUNPOD_ENDPOINT_ID}"
+# Public URL of /api/runpod/webhook, when set RunPod pushes job completion to us
+RUNPOD_WEBHOOK_URL = os.getenv("RUNPOD_WEBHOOK_URL", "").strip()
+RUNPOD_WEBHOOK_SECRET = os.getenv("RUNPOD_WEBHOOK_SECRET", "").strip()
 
 # --- SePay Config ---
 SEPAY_API_KEY = os.getenv("SEPAY_API_KEY", "").strip()
@@ -39,17 +61,349 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-# Sync def for auth because supabase.auth.get_user is sync and blocks
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)):
+# --- Supabase access off the event loop ---
+# supabase-py is synchronous; every call goes through this bounded pool so a slow
+# database round trip never stalls the event loop for other users.
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "8"))
+_supabase_pool = ThreadPoolExecutor(max_workers=SUPABASE_POOL_SIZE, thread_name_prefix="supabase")
+
+
+async def run_supabase(fn, *args, **kwargs):
+    """Run a blocking supabase call in the bounded thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_supabase_pool, functools.partial(fn, *args, **kwargs))
+
+
+# --- Auth: local JWT verification ---
+# Access tokens are verified locally against the project's JWKS (asymmetric keys)
+# or SUPABASE_JWT_SECRET (legacy HS256). Verified users are cached until the
+# token expires or AUTH_CACHE_TTL elapses, whichever comes first.
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "").strip()
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "300"))
+AUTH_CACHE_SIZE = 10000
+JWKS_CACHE_TTL = int(os.getenv("JWKS_CACHE_TTL", "3600"))
+JWT_ALGORITHMS = {"HS256", "RS256", "ES256"}
+
+try:
+    import jwt
+    _jwks_client = jwt.PyJWKClient(
+        f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json",
+        cache_keys=True,
+        lifespan=JWKS_CACHE_TTL,
+    ) if SUPABASE_URL else None
+except ImportError:
+    jwt = None
+    _jwks_client = None
+    logger.warning("PyJWT not installed, falling back to remote token verification")
+
+
+@dataclass
+class AuthUser:
+    id: str
+    email: Optional[str] = None
+
+
+_auth_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+
+def _verify_token_locally(token: str):
+    """Returns (user, expires_at), or None when the token can't be verified locally."""
+    if jwt is None:
+        return None
+
+    alg = jwt.get_unverified_header(token).get("alg")
+    if alg not in JWT_ALGORITHMS:
+        raise jwt.InvalidTokenError(f"Unsupported algorithm: {alg}")
+
+    if alg == "HS256":
+        if not SUPABASE_JWT_SECRET:
+            return None
+        key = SUPABASE_JWT_SECRET
+    else:
+        if _jwks_client is None:
+            return None
+        # PyJWKClient keeps the fetched JWKS for JWKS_CACHE_TTL seconds
+        key = _jwks_client.get_signing_key_from_jwt(token).key
+
+    claims = jwt.decode(token, key, algorithms=[alg], audience="authenticated")
+    return AuthUser(id=claims["sub"], email=claims.get("email")), float(claims["exp"])
+
+
+def _verify_token_remotely(token: str):
+    user = supabase.auth.get_user(token)
+    if not user or not user.user:
+        return None
+    return AuthUser(id=user.user.id, email=user.user.email), _time.time() + AUTH_CACHE_TTL
+
+
+async def get_current_user(token: HTTPAuthorizationCredentials = Depends(security)):
+    credentials = token.credentials
+
+    cached = _auth_cache.get(credentials)
+    if cached is not None:
+        return cached
+
     try:
-        user = supabase.auth.get_user(token.credentials)
-        if not user or not user.user:
+        # JWKS fetches and remote fallbacks are blocking, keep them off the loop
+        verified = await run_supabase(_verify_token_locally, credentials)
+        if verified is None:
+            verified = await run_supabase(_verify_token_remotely, credentials)
+        if verified is None:
             raise HTTPException(status_code=401, detail="Invalid token")
-        return user.user
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Auth Error: {e}")
         raise HTTPException(status_code=401, detail="Authentication failed")
 
+    user, expires_at = verified
+    _auth_cache.set(credentials, user, ttl=min(expires_at - _time.time(), AUTH_CACHE_TTL))
+    return user
+
+
+# --- Credit deduction ---
+# With CREDIT_BATCH_WINDOW_MS > 0, deductions arriving within the window are sent
+# as one validate_and_subtract_credits_batch RPC (see migration_v3_credit_batch.sql).
+CREDIT_BATCH_WINDOW_MS = int(os.getenv("CREDIT_BATCH_WINDOW_MS", "0"))
+CREDIT_BATCH_MAX_SIZE = int(os.getenv("CREDIT_BATCH_MAX_SIZE", "64"))
+
+
+class CreditBatcher:
+    """Coalesces concurrent credit deductions into a single database round trip."""
+
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self._pending: list = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def deduct(self, user_id: str, amount: int) -> bool:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((user_id, amount, future))
+
+        if len(self._pending) >= self.max_size:
+            self._schedule_flush(loop, delay=0)
+        elif self._flush_handle is None:
+            self._schedule_flush(loop, delay=self.window)
+
+        return await future
+
+    def _schedule_flush(self, loop, delay: float):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_later(delay, lambda: asyncio.ensure_future(self._flush()))
+
+    async def _flush(self):
+        self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        items = [{"user_id": user_id, "char_count": amount} for user_id, amount, _ in batch]
+        try:
+            response = await run_supabase(
+                lambda: supabase.rpc("validate_and_subtract_credits_batch", {"p_items": items}).execute()
+            )
+            results = response.data or []
+            if len(results) != len(batch):
+                raise RuntimeError(f"Credit batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            logger.error(f"Credit batch failed ({len(batch)} items): {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, _, future), ok in zip(batch, results):
+            if not future.done():
+                future.set_result(bool(ok))
+
+
+_credit_batcher = (
+    CreditBatcher(CREDIT_BATCH_WINDOW_MS / 1000, CREDIT_BATCH_MAX_SIZE)
+    if CREDIT_BATCH_WINDOW_MS > 0 else None
+)
+
+
+async def deduct_credits(user_id: str, amount: int) -> bool:
+    """Atomically subtract credits, returns False when the balance is insufficient."""
+    if _credit_batcher is not None:
+        return await _credit_batcher.deduct(user_id, amount)
+
+    response = await run_supabase(
+        lambda: supabase.rpc("validate_and_subtract_credits", {
+            "p_user_id": user_id,
+            "p_char_count": amount
+        }).execute()
+    )
+    return bool(response.data)
+
+# --- Shared HTTP client ---
+# One pooled client for the app lifetime, so RunPod / video API calls reuse
+# TCP+TLS connections (and HTTP/2 streams when h2 is installed).
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+
+http_client: Optional[httpx.AsyncClient] = None
+
+
+@app.on_event("startup")
+async def _create_http_client():
+    global http_client
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+
+    http_client = httpx.AsyncClient(
+        http2=http2,
+        timeout=20.0,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=60.0,
+        ),
+    )
+    logger.info(f"Shared HTTP client ready (http2={http2})")
+
+
+@app.on_event("shutdown")
+async def _close_http_client():
+    if http_client is not None:
+        await http_client.aclose()
+    _supabase_pool.shutdown(wait=False)
+    _silence_pool.shutdown(wait=False)
+
+
+# --- RunPod job status ---
+# Concurrent polls for the same job share one upstream request and its result is
+# reused for STATUS_CACHE_TTL seconds. Finished jobs (from polling or the webhook)
+# are kept in a small local job table and never go upstream again.
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "1.0"))
+# With the webhook enabled, completion is pushed to us, so running jobs can be polled less often
+WEBHOOK_STATUS_CACHE_TTL = float(os.getenv("WEBHOOK_STATUS_CACHE_TTL", "10.0"))
+JOB_TABLE_SIZE = int(os.getenv("JOB_TABLE_SIZE", "64"))
+JOB_TABLE_TTL = float(os.getenv("JOB_TABLE_TTL", "900"))
+# Finished payloads hold the audio (base64), the table is also bounded by their size.
+# Evicted jobs are fetched from RunPod again when polled.
+JOB_TABLE_MAX_BYTES = int(os.getenv("JOB_TABLE_MAX_BYTES", str(32 * 1024 * 1024)))
+TERMINAL_JOB_STATUSES = TERMINAL_STATUSES
+
+
+def _payload_size(value) -> int:
+    """Rough memory held by a JSON payload, dominated by its strings."""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_payload_size(k) + _payload_size(v) for k, v in value.items())
+    if isinstance(value, list):
+        return sum(_payload_size(v) for v in value)
+    return 8
+
+
+class JobStatusAggregator:
+    def __init__(self, ttl: float, table_size: int, table_ttl: float, table_max_bytes: int = 0):
+        self._recent = TTLCache(maxsize=10000, ttl=ttl)  # running jobs
+        self._finished = TTLCache(
+            maxsize=table_size, ttl=table_ttl, max_bytes=table_max_bytes, sizeof=_payload_size
+        )
+        self._flight = SingleFlight()
+
+    def record(self, payload: dict):
+        """Store a status payload coming from /run, /status or the webhook."""
+        job_id = payload.get("id")
+        if not job_id:
+            return
+
+        # The worker streams (return_aggregate_stream), so the output is the list of
+        # every streamed item. Keep only the final result(s) polling clients expect.
+        output = payload.get("output")
+        if isinstance(output, list):
+            payload = {**payload, "output": aggregate_output(output)}
+
+        if payload.get("status") in TERMINAL_JOB_STATUSES:
+            self._recent.pop(job_id)
+            self._finished.set(job_id, payload)
+        else:
+            self._recent.set(job_id, payload)
+
+    async def get(self, job_id: str) -> dict:
+        payload = self._finished.get(job_id)
+        if payload is None:
+            payload = self._recent.get(job_id)
+        if payload is not None:
+            return payload
+
+        return await self._flight.do(job_id, lambda: self._fetch(job_id))
+
+    async def _fetch(self, job_id: str) -> dict:
+        response = await http_client.get(
+            f"{RUNPOD_BASE_URL}/status/{job_id}",
+            headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
+            timeout=20.0,
+        )
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+
+        payload = response.json()
+        self.record(payload)
+        return payload
+
+
+job_statuses = JobStatusAggregator(
+    ttl=WEBHOOK_STATUS_CACHE_TTL if RUNPOD_WEBHOOK_URL else STATUS_CACHE_TTL,
+    table_size=JOB_TABLE_SIZE,
+    table_ttl=JOB_TABLE_TTL,
+    table_max_bytes=JOB_TABLE_MAX_BYTES,
+)
+
+
+# --- Request batching ---
+# Short requests arriving within BATCH_WINDOW seconds for the same voice are sent
+# as one multi-request job (see runpod_dispatcher.py). 0 disables batching.
+BATCH_WINDOW = float(os.getenv("BATCH_WINDOW", "0.05"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_CHARS = int(os.getenv("BATCH_MAX_CHARS", "600"))
+# RunPod ids of batch jobs sent from this process. Their results are only served
+# per request ("<id>:<index>"), the bare id would return every request's audio.
+_batch_jobs = TTLCache(maxsize=10000, ttl=JOB_TABLE_TTL)
+
+
+async def _submit_runpod_job(runpod_payload: dict) -> dict:
+    if RUNPOD_WEBHOOK_URL:
+        runpod_payload["webhook"] = f"{RUNPOD_WEBHOOK_URL}?secret={RUNPOD_WEBHOOK_SECRET}"
+
+    response = await http_client.post(
+        f"{RUNPOD_BASE_URL}/run",
+        headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
+        json=runpod_payload,
+        timeout=40.0
+    )
+    if response.status_code != 200:
+        raise HTTPException(status_code=502, detail="Inference Dispatch Error")
+    job = response.json()
+    if runpod_payload["input"].get("task") == BATCH_TASK:
+        _batch_jobs.set(job.get("id"), True)
+    job_statuses.record(job)
+    return job
+
+
+def _check_batch_access(runpod_job_id: str, batch_index: Optional[int], output=None):
+    """404 for the bare id of a batch job, only its per-request ids are served."""
+    if batch_index is None and (runpod_job_id in _batch_jobs or is_batch_output(output)):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+
+dispatcher = BatchDispatcher(
+    _submit_runpod_job,
+    window=BATCH_WINDOW,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_chars=BATCH_MAX_CHARS,
+)
+
+
 class AudioRequest(BaseModel):
     text: str
     voice_id: str
@@ -60,69 +414,171 @@ class AudioRequest(BaseModel):
 @app.get("/health")
 async def health_test():
     try:
-        # Sync call inside async is okay for a simple health check
-        supabase.table("profiles").select("count", count="exact").limit(1).execute()
+        await run_supabase(
+            lambda: supabase.table("profiles").select("count", count="exact").limit(1).execute()
+        )
         return {"status": "ok", "database": "connected", "endpoint": RUNPOD_ENDPOINT_ID}
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
 @app.get("/api/status/{job_id}")
 async def get_job_status(job_id: str, user=Depends(get_current_user)):
-    url = f"https://api.runpod.ai/v2/{RUNPOD_ENDPOINT_ID}/status/{job_id}"
-    headers = {"Authorization": f"Bearer {RUNPOD_API_KEY}"}
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers, timeout=20.0)
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=response.text)
-            return response.json()
-        except Exception as e:
-            logger.error(f"Status check failed: {traceback.format_exc()}")
-            raise HTTPException(status_code=502, detail=str(e))
+    try:
+        runpod_job_id, batch_index = split_job_id(job_id)
+        _check_batch_access(runpod_job_id, batch_index)
+        payload = await job_statuses.get(runpod_job_id)
+        _check_batch_access(runpod_job_id, batch_index, payload.get("output"))
+        if batch_index is None:
+            return payload
+        result = batch_result(payload.get("output"), batch_index)
+        if (result or {}).get("status") == "FAILED":
+            # Only this request failed, the batch job itself completed
+            return {**payload, "id": job_id, "status": "FAILED", "error": result.get("error"), "output": result}
+        return {**payload, "id": job_id, "output": result}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Status check failed: {traceback.format_exc()}")
+        raise HTTPException(status_code=502, detail=str(e))
+
+
+# --- Progressive results over SSE ---
+# The worker yields one item per paragraph; RunPod's /stream/{job_id} returns the
+# items produced since the previous call, so each job is polled once and its items
+# shared by the relays of every request batched into it (see StreamFanout).
+# They are relayed to the browser as Server-Sent Events (read with fetch(),
+# EventSource can't send the bearer token).
+STREAM_POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "0.5"))
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+STREAM_MAX_DURATION = float(os.getenv("STREAM_MAX_DURATION", "1800"))
+# Seconds a job's streamed items are kept after it ends, for relays opened late
+STREAM_LINGER = float(os.getenv("STREAM_LINGER", "60"))
+
+
+async def _fetch_stream(runpod_job_id: str) -> dict:
+    try:
+        response = await http_client.get(
+            f"{RUNPOD_BASE_URL}/stream/{runpod_job_id}",
+            headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
+            timeout=40.0,
+        )
+    except httpx.HTTPError as e:
+        # Nothing new this time, polled again after STREAM_POLL_INTERVAL
+        logger.warning(f"RunPod stream poll failed for {runpod_job_id}: {e}")
+        return {}
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=response.text)
+    return response.json()
+
+
+job_streams = StreamFanout(_fetch_stream, interval=STREAM_POLL_INTERVAL, linger=STREAM_LINGER)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _relay_stream(job_id: str):
+    # Requests batched into one job only get their own items
+    runpod_job_id, batch_index = split_job_id(job_id)
+    stream = job_streams.subscribe(runpod_job_id)
+    try:
+        started = last_sent = _time.monotonic()
+        # A failed request of a batch job, the job itself still completes
+        request_error = None
+        relayed = 0
+        while _time.monotonic() - started < STREAM_MAX_DURATION:
+            outputs = stream.items[relayed:]
+            relayed += len(outputs)
+            for output in outputs:
+                if batch_index is None and "batch_index" in (output or {}):
+                    # The bare id of a batch job, see _check_batch_access
+                    yield _sse("error", {"status_code": 404, "detail": "Job not found"})
+                    return
+                if batch_index is not None and (output or {}).get("batch_index") != batch_index:
+                    continue
+                if (output or {}).get("status") == "FAILED":
+                    request_error = output.get("error")
+                yield _sse("chunk", output)
+                last_sent = _time.monotonic()
+
+            if isinstance(stream.failure, HTTPException):
+                yield _sse("error", {"status_code": stream.failure.status_code, "detail": stream.failure.detail})
+                return
+            if stream.failure is not None:
+                yield _sse("error", {"detail": str(stream.failure)})
+                return
+
+            if stream.status is not None:
+                status = "FAILED" if request_error is not None else stream.status
+                error = request_error or stream.error
+                yield _sse("done", {"id": job_id, "status": status, "error": error})
+                return
+
+            if _time.monotonic() - last_sent >= STREAM_KEEPALIVE:
+                # SSE comment, keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                last_sent = _time.monotonic()
+            await stream.wait(relayed, last_sent + STREAM_KEEPALIVE - _time.monotonic())
+
+        yield _sse("error", {"detail": "Stream timed out"})
+    finally:
+        job_streams.unsubscribe(runpod_job_id, stream)
+
+
+@app.get("/api/stream/{job_id}")
+async def stream_job(job_id: str, user=Depends(get_current_user)):
+    _check_batch_access(*split_job_id(job_id))
+    return StreamingResponse(
+        _relay_stream(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/runpod/webhook")
+async def runpod_webhook(request: Request, secret: str = ""):
+    """RunPod calls this when a job finishes (see RUNPOD_WEBHOOK_URL)."""
+    if not RUNPOD_WEBHOOK_SECRET or secret != RUNPOD_WEBHOOK_SECRET:
+        raise HTTPException(status_code=403, detail="Invalid webhook secret")
+
+    payload = await request.json()
+    job_statuses.record(payload)
+    logger.info(f"RunPod webhook: {payload.get('id')} -> {payload.get('status')}")
+    return {"status": "ok"}
 
 @app.post("/api/generate")
 async def generate_audio(request: AudioRequest, user=Depends(get_current_user)):
     user_id = user.id
     estimated_cost = len(request.text)
 
-    # 1. ATOMIC CREDIT DEDUCTION (Sync call, slightly blocking but safer here)
+    # 1. ATOMIC CREDIT DEDUCTION (runs in the supabase pool, optionally batched)
     try:
-        rpc_response = supabase.rpc("validate_and_subtract_credits", {
-            "p_user_id": user_id,
-            "p_char_count": estimated_cost
-        }).execute()
-
-        if not rpc_response.data:
-            raise HTTPException(status_code=402, detail="Insufficient Credits")
+        has_credits = await deduct_credits(user_id, estimated_cost)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database Error: {str(e)}")
 
-    # 2. DISPATCH TO RUNPOD
-    runpod_payload = {
-        "input": {
-            "text": request.text,
-            "reference_id": request.voice_id,
-            "user_id": user_id,
-            "top_p": request.top_p,
-            "repetition_penalty": request.repetition_penalty,
-            "temperature": request.temperature
-        }
+    if not has_credits:
+        raise HTTPException(status_code=402, detail="Insufficient Credits")
+
+    # 2. DISPATCH TO RUNPOD (short requests for the same voice share one job)
+    job_input = {
+        "text": request.text,
+        "reference_id": request.voice_id,
+        "user_id": user_id,
+        "top_p": request.top_p,
+        "repetition_penalty": request.repetition_penalty,
+        "temperature": request.temperature
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"https://api.runpod.ai/v2/{RUNPOD_ENDPOINT_ID}/run",
-                headers={"Authorization": f"Bearer {RUNPOD_API_KEY}"},
-                json=runpod_payload,
-                timeout=40.0
-            )
-            if response.status_code != 200:
-                raise HTTPException(status_code=502, detail="Inference Dispatch Error")
-            return response.json()
-        except Exception as e:
-            logger.error(f"Generation failed: {traceback.format_exc()}")
-            raise HTTPException(status_code=502, detail=str(e))
+    try:
+        return await dispatcher.dispatch(job_input)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Generation failed: {traceback.format_exc()}")
+        raise HTTPException(status_code=502, detail=str(e))
 
 @app.get("/api/voices")
 def list_voices(user=Depends(get_current_user)):
@@ -168,6 +624,15 @@ def upload_reference(
         logger.error(f"Upload failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- Silence cutter ---
+# Decoding and cutting run in a small dedicated pool (ffmpeg does the heavy lifting in
+# its own process), so the event loop stays free and concurrent jobs are bounded.
+# Memory no longer grows with the input duration, only the upload size is capped.
+SILENCE_WORKERS = int(os.getenv("SILENCE_WORKERS", "2"))
+SILENCE_MAX_UPLOAD_MB = int(os.getenv("SILENCE_MAX_UPLOAD_MB", "500"))
+_silence_pool = ThreadPoolExecutor(max_workers=SILENCE_WORKERS, thread_name_prefix="silence")
+
+
 @app.post("/api/audio/cut-silence")
 async def cut_silence(
     file: UploadFile = File(...),
@@ -176,98 +641,76 @@ async def cut_silence(
     user=Depends(get_current_user)
 ):
     """
-    Local silence removal using pydub & ffmpeg.
+    Local silence removal with a streaming ffmpeg + numpy cutter.
     Returns the processed file directly (no R2 upload needed).
     """
     from fastapi.responses import FileResponse
-    
-    try:
-        import psutil
-        from pydub import AudioSegment
-        from pydub.silence import split_on_silence
-    except ImportError as e:
-        logger.error(f"Missing dependency: {e}")
-        return {"status": "error", "error": f"Missing dependency: {e}"}
-
-    process_info = psutil.Process(os.getpid())
-    start_ram = process_info.memory_info().rss / 1024 / 1024
-    
+
     # Use a persistent output directory (not tempfile, so FileResponse can serve it)
     output_dir = "/tmp/silence_cutter"
     os.makedirs(output_dir, exist_ok=True)
-    
+
     unique_id = str(uuid.uuid4())
-    input_path = os.path.join(output_dir, f"{unique_id}_input.wav")
+    input_path = os.path.join(output_dir, f"{unique_id}_input")
     output_path = os.path.join(output_dir, f"{unique_id}_output.wav")
 
     try:
-        logger.info(f"Cutting silence [pydub]: {file.filename} (Thresh: {threshold}dB, Dur: {duration}s)")
+        logger.info(f"Cutting silence: {file.filename} (Thresh: {threshold}dB, Dur: {duration}s)")
 
-        # 1. Save uploaded file
+        # 1. Save uploaded file, in chunks and without blocking the loop
+        max_bytes = SILENCE_MAX_UPLOAD_MB * 1024 * 1024
+        file_size = 0
         with open(input_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # 2. Check size (safety for 2GiB RAM)
-        file_size = os.path.getsize(input_path)
+            while chunk := await file.read(1024 * 1024):
+                file_size += len(chunk)
+                if file_size > max_bytes:
+                    break
+                buffer.write(chunk)
+
+        if file_size > max_bytes:
+            os.remove(input_path)
+            return {"status": "error", "error": f"Audio file too large (>{SILENCE_MAX_UPLOAD_MB}MB)"}
         logger.info(f"Input file size: {file_size / 1024:.1f} KB")
-        if file_size > 50 * 1024 * 1024:
-            return {"status": "error", "error": "Audio file too large (>50MB)"}
 
-        # 3. Load with pydub
-        audio = AudioSegment.from_file(input_path)
-        logger.info(f"Audio loaded: {audio.duration_seconds:.1f}s, {audio.frame_rate}Hz, {audio.channels}ch")
-        
-        # Safeguard: Limit to 5 minutes
-        if audio.duration_seconds > 300:
-            return {"status": "error", "error": "Audio duration exceeds 5 minute limit"}
-
-        # 4. Remove silence
-        chunks = split_on_silence(
-            audio,
-            min_silence_len=int(duration * 1000),
-            silence_thresh=int(threshold),
-            keep_silence=200
+        # 2. Decode, cut and write in the worker pool
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(
+            _silence_pool,
+            functools.partial(
+                cut_silence_file,
+                input_path,
+                output_path,
+                threshold_db=threshold,
+                min_silence=duration,
+                keep_silence=0.2,
+            ),
         )
-        logger.info(f"Found {len(chunks)} non-silent chunks")
 
-        if not chunks:
-            logger.info("No non-silent chunks found, returning original.")
-            # Cleanup input
-            try: os.remove(input_path)
+        try: os.remove(input_path)
+        except: pass
+
+        if not stats.voiced:
+            logger.info("No non-silent audio found, returning original.")
+            try: os.remove(output_path)
             except: pass
             return {"status": "success", "duration_changed": False, "message": "No silence removed."}
 
-        # 5. Combine chunks & export
-        combined = chunks[0]
-        for chunk in chunks[1:]:
-            combined += chunk
-
-        combined.export(output_path, format="wav")
+        logger.info(f"Removed {stats.removed_silences} silences, "
+                    f"Duration: {stats.original_duration:.1f}s → {stats.new_duration:.1f}s")
 
-        # 6. Monitor usage
-        end_ram = process_info.memory_info().rss / 1024 / 1024
-        cpu_usage = process_info.cpu_percent(interval=0.1)
-        logger.info(f"Stats: RAM Δ{end_ram - start_ram:.1f}MB, CPU {cpu_usage}%, "
-                     f"Duration: {audio.duration_seconds:.1f}s → {combined.duration_seconds:.1f}s")
-
-        # 7. Cleanup input file
-        try: os.remove(input_path)
-        except: pass
-
-        # 8. Return the processed file directly
+        # 3. Return the processed file directly
         return FileResponse(
             output_path,
             media_type="audio/wav",
             filename=f"cleaned_{unique_id}.wav",
             headers={
-                "X-Original-Duration": str(round(audio.duration_seconds, 2)),
-                "X-New-Duration": str(round(combined.duration_seconds, 2)),
-                "X-RAM-Usage-MB": str(round(end_ram, 2)),
+                "X-Original-Duration": str(round(stats.original_duration, 2)),
+                "X-New-Duration": str(round(stats.new_duration, 2)),
             }
         )
 
     except Exception as e:
-        logger.error(f"Pydub processing failed: {traceback.format_exc()}")
+        logger.error(f"Silence removal failed: {traceback.format_exc()}")
         # Cleanup
         for p in [input_path, output_path]:
             try: os.remove(p)
@@ -275,13 +718,14 @@ async def cut_silence(
         return {"status": "error", "error": f"Silence removal failed: {str(e)}"}
 
 # --- B-roll Search (Multi-Source Video API Proxy) ---
-import time as _time
-
 PEXELS_API_KEY = os.getenv("PEXELS_API_KEY", "").strip()
 PIXABAY_API_KEY = os.getenv("PIXABAY_API_KEY", "").strip()
 COVERR_API_KEY = os.getenv("COVERR_API_KEY", "").strip()
-_broll_cache: dict = {}
 BROLL_CACHE_TTL = 1800  # 30 minutes
+BROLL_CACHE_SIZE = int(os.getenv("BROLL_CACHE_SIZE", "1000"))
+# Optional sqlite file shared by all uvicorn workers, e.g. /tmp/broll_cache.sqlite
+BROLL_CACHE_DB = os.getenv("BROLL_CACHE_DB", "").strip() or None
+BROLL_TIMEOUT = 15.0
 
 
 async def _search_pixabay(client: httpx.AsyncClient, query: str, per_page: int):
@@ -291,6 +735,7 @@ async def _search_pixabay(client: httpx.AsyncClient, query: str, per_page: int):
     try:
         resp = await client.get(
             "https://pixabay.com/api/videos/",
+            timeout=BROLL_TIMEOUT,
             params={"key": PIXABAY_API_KEY, "q": query, "per_page": min(per_page, 20)},
         )
         if resp.status_code != 200:
@@ -333,6 +778,7 @@ async def _search_coverr(client: httpx.AsyncClient, query: str, per_page: int):
     try:
         resp = await client.get(
             "https://api.coverr.co/videos",
+            timeout=BROLL_TIMEOUT,
             params={"query": query, "page_size": min(per_page, 25), "urls": "true"},
             headers={"Authorization": f"Bearer {COVERR_API_KEY}"},
         )
@@ -376,6 +822,7 @@ async def _search_pexels(client: httpx.AsyncClient, query: str, per_page: int):
     try:
         resp = await client.get(
             "https://api.pexels.com/videos/search",
+            timeout=BROLL_TIMEOUT,
             params={"query": query, "per_page": min(per_page, 15)},
             headers={"Authorization": PEXELS_API_KEY},
         )
@@ -414,6 +861,31 @@ async def _search_pexels(client: httpx.AsyncClient, query: str, per_page: int):
         return []
 
 
+# Results are cached per source and query, fetched at each API's max page size,
+# so "all" and single-source searches (and any per_page) share upstream calls.
+BROLL_SOURCES = {
+    "pixabay": (_search_pixabay, 20),
+    "coverr": (_search_coverr, 25),
+    "pexels": (_search_pexels, 15),
+}
+broll_cache = AsyncCache(
+    maxsize=BROLL_CACHE_SIZE,
+    ttl=BROLL_CACHE_TTL,
+    shared_path=BROLL_CACHE_DB,
+    name="broll",
+)
+
+
+async def _search_source(source: str, query: str):
+    search, page_size = BROLL_SOURCES[source]
+    return await broll_cache.get_or_fetch(
+        f"{source}|{query.lower().strip()}",
+        lambda: search(http_client, query, page_size),
+        # Source helpers return [] on upstream errors, don't pin those for 30 minutes
+        cache_if=bool,
+    )
+
+
 @app.get("/api/broll/search")
 async def broll_search(
     query: str = "",
@@ -426,40 +898,24 @@ async def broll_search(
     if not query.strip():
         return {"videos": [], "total_results": 0}
 
-    # Check cache
-    cache_key = f"{query.lower().strip()}|{per_page}|{page}|{source}"
-    cached = _broll_cache.get(cache_key)
-    if cached and (_time.time() - cached["ts"]) < BROLL_CACHE_TTL:
-        logger.info(f"B-roll cache hit: '{query}' source={source}")
-        return cached["data"]
-
     try:
-        import asyncio
         each = per_page // 2  # Split across sources
 
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            if source == "pixabay":
-                all_results = await _search_pixabay(client, query, per_page)
-            elif source == "coverr":
-                all_results = await _search_coverr(client, query, per_page)
-            elif source == "pexels":
-                all_results = await _search_pexels(client, query, per_page)
-            else:
-                # Parallel fetch from all sources
-                pixabay_task = _search_pixabay(client, query, each)
-                coverr_task = _search_coverr(client, query, each)
-                pexels_task = _search_pexels(client, query, each)
-                pixabay_r, coverr_r, pexels_r = await asyncio.gather(
-                    pixabay_task, coverr_task, pexels_task
-                )
-                # Interleave: prioritize Pixabay and Coverr
-                all_results = []
-                sources = [pixabay_r, coverr_r, pexels_r]
-                max_len = max(len(s) for s in sources) if sources else 0
-                for i in range(max_len):
-                    for src in sources:
-                        if i < len(src):
-                            all_results.append(src[i])
+        if source in BROLL_SOURCES:
+            all_results = (await _search_source(source, query))[:per_page]
+        else:
+            # Parallel fetch from all sources
+            pixabay_r, coverr_r, pexels_r = await asyncio.gather(
+                *(_search_source(name, query) for name in BROLL_SOURCES)
+            )
+            # Interleave: prioritize Pixabay and Coverr
+            all_results = []
+            sources = [pixabay_r[:each], coverr_r[:each], pexels_r[:each]]
+            max_len = max(len(s) for s in sources) if sources else 0
+            for i in range(max_len):
+                for src in sources:
+                    if i < len(src):
+                        all_results.append(src[i])
 
         # Sort by resolution (higher = more cinematic), then duration (longer = better)
         all_results.sort(key=lambda v: (int(float(v.get("width", 0) or 0)) * int(float(v.get("height", 0) or 0)), int(float(v.get("duration", 0) or 0))), reverse=True)
@@ -476,12 +932,6 @@ async def broll_search(
             }
         }
 
-        # Cache result
-        _broll_cache[cache_key] = {"data": result, "ts": _time.time()}
-        if len(_broll_cache) > 200:
-            oldest_key = min(_broll_cache, key=lambda k: _broll_cache[k]["ts"])
-            del _broll_cache[oldest_key]
-
         logger.info(f"B-roll multi-search: '{query}' → {len(result['videos'])} total results")
         return result
 
@@ -673,41 +1123,41 @@ Output ONLY valid JSON. No markdown.
         parsed = None
         start_time = time.time()
         try:
-            async with httpx.AsyncClient(timeout=50.0) as client:
-                logger.info(f"Sending 4-Block request to DeepSeek ({num_segments} queries)...")
-                response = await client.post(
-                    "https://api.deepseek.com/chat/completions",
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-                    },
-                    json={
-                        "model": "deepseek-chat",
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_prompt}
-                        ],
-                        "response_format": {"type": "json_object"},
-                        "temperature": 0.3,
-                        "max_tokens": 1024
-                    }
-                )
-                elapsed = time.time() - start_time
-                logger.info(f"DeepSeek status: {response.status_code} in {elapsed:.1f}s")
-                
-                if response.status_code == 200:
-                    content = response.json()["choices"][0]["message"]["content"]
-                    logger.info(f"DeepSeek content: {len(content)} chars")
-                    try:
-                        parsed = json.loads(content)
-                    except json.JSONDecodeError:
-                        start_idx = content.find('{')
-                        end_idx = content.rfind('}')
-                        if start_idx != -1 and end_idx != -1:
-                            try: parsed = json.loads(content[start_idx:end_idx+1])
-                            except: pass
-                else:
-                    logger.error(f"DeepSeek error {response.status_code}: {response.text[:300]}")
+            logger.info(f"Sending 4-Block request to DeepSeek ({num_segments} queries)...")
+            response = await http_client.post(
+                "https://api.deepseek.com/chat/completions",
+                timeout=50.0,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
+                },
+                json={
+                    "model": "deepseek-chat",
+                    "messages": [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    "response_format": {"type": "json_object"},
+                    "temperature": 0.3,
+                    "max_tokens": 1024
+                }
+            )
+            elapsed = time.time() - start_time
+            logger.info(f"DeepSeek status: {response.status_code} in {elapsed:.1f}s")
+            
+            if response.status_code == 200:
+                content = response.json()["choices"][0]["message"]["content"]
+                logger.info(f"DeepSeek content: {len(content)} chars")
+                try:
+                    parsed = json.loads(content)
+                except json.JSONDecodeError:
+                    start_idx = content.find('{')
+                    end_idx = content.rfind('}')
+                    if start_idx != -1 and end_idx != -1:
+                        try: parsed = json.loads(content[start_idx:end_idx+1])
+                        except: pass
+            else:
+                logger.error(f"DeepSeek error {response.status_code}: {response.text[:300]}")
         except Exception as e:
             logger.error(f"DeepSeek failed/timed out: {e} ({time.time() - start_time:.1f}s)")
 
@@ -818,8 +1268,12 @@ async def sepay_webhook(request: Request):
         if not user_id:
             return {"status": "success", "message": "Manual review needed"}
 
-        supabase.table("sepay_transactions").insert({"id": str(txn_id), "user_id": user_id, "amount": amount}).execute()
-        supabase.rpc("add_credits", {"p_user_id": user_id, "p_amount": 200000}).execute()
+        await run_supabase(
+            lambda: supabase.table("sepay_transactions").insert({"id": str(txn_id), "user_id": user_id, "amount": amount}).execute()
+        )
+        await run_supabase(
+            lambda: supabase.rpc("add_credits", {"p_user_id": user_id, "p_amount": 200000}).execute()
+        )
 
         return {"status": "success"}
     except Exception as e:
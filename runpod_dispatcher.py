@@ -0,0 +1,257 @@
+"""
+Packs small TTS requests for the Hostinger API into multi-request RunPod jobs.
+
+Requests of the same user for the same voice arriving within `window` seconds
+are sent as one job, so worker selection, queueing and reference loading are
+paid once per batch instead of once per request:
+
+    {"input": {"task": "tts_batch", "requests": [<input>, <input>, ...]}}
+
+The worker yields each request's results tagged with its `batch_index`. Every
+caller gets a job id of the form "<runpod job id>:<batch index>", which
+`split_job_id` maps back to the RunPod job and the request's slot in it.
+A batch of one is sent as a plain job and keeps the RunPod job id.
+
+Batches never mix users: the RunPod job id is part of every id handed out, and
+the parent job's output holds every request's result.
+
+RunPod's /stream/{job id} hands out each streamed item once, so the requests of
+a batch job can't poll it each on their own. `StreamFanout` polls it once per
+job and every request's relay reads its own items from the shared buffer.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+BATCH_TASK = "tts_batch"
+TERMINAL_STATUSES = {"COMPLETED", "FAILED", "CANCELLED", "TIMED_OUT"}
+
+
+def batch_job_id(job_id: str, index: int) -> str:
+    return f"{job_id}:{index}"
+
+
+def split_job_id(job_id: str) -> tuple[str, Optional[int]]:
+    """'<job id>:<index>' -> (job id, index), plain RunPod ids -> (job id, None)."""
+    parent, sep, index = job_id.rpartition(":")
+    if sep and index.isdigit():
+        return parent, int(index)
+    return job_id, None
+
+
+def aggregate_output(output: Any) -> Any:
+    """
+    Reduces the aggregated stream of a job (the list of every yielded item) to
+    its result: the last item for a plain job, {"results": [...]} with the last
+    item of every request for a batch job.
+    """
+    if not isinstance(output, list):
+        return output
+
+    results = {}
+    for item in output:
+        if isinstance(item, dict) and "batch_index" in item:
+            results[item["batch_index"]] = item
+    if results:
+        return {"results": [results[i] for i in sorted(results)]}
+    return output[-1] if output else None
+
+
+def is_batch_output(output: Any) -> bool:
+    return isinstance(output, dict) and "results" in output
+
+
+def batch_result(output: Any, index: int) -> Any:
+    """The result of request `index` in an aggregated batch job output."""
+    for item in (output or {}).get("results", []):
+        if item.get("batch_index") == index:
+            return item
+    return None
+
+
+class BatchDispatcher:
+    """
+    `submit` posts one RunPod payload ({"input": ...}) and returns the job
+    (the /run response). Requests longer than `max_chars` are not batched.
+    """
+
+    def __init__(
+        self,
+        submit: Callable[[dict], Awaitable[dict]],
+        window: float = 0.05,
+        max_batch_size: int = 8,
+        max_chars: int = 600,
+    ):
+        self._submit = submit
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.max_chars = max_chars
+        self._pending: dict[tuple, list[tuple[dict, asyncio.Future]]] = {}
+        self._timers: dict[tuple, asyncio.TimerHandle] = {}
+        # Referenced until done, the event loop only keeps weak references to tasks
+        self._sending: set[asyncio.Task] = set()
+
+    async def dispatch(self, job_input: dict) -> dict:
+        if self.window <= 0 or len(job_input.get("text") or "") > self.max_chars:
+            return await self._submit({"input": job_input})
+
+        key = (job_input.get("user_id") or "", job_input.get("reference_id") or "")
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((job_input, future))
+
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(
+                self.window, self._flush, key
+            )
+
+        # Shielded, so one cancelled caller doesn't cancel the batch
+        return await asyncio.shield(future)
+
+    def _flush(self, key: tuple):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+        batch = self._pending.pop(key, [])
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: list[tuple[dict, asyncio.Future]]):
+        try:
+            inputs = [job_input for job_input, _ in batch]
+            if len(inputs) == 1:
+                payload = {"input": inputs[0]}
+            else:
+                payload = {"input": {"task": BATCH_TASK, "requests": inputs}}
+
+            job = await self._submit(payload)
+
+            if len(inputs) > 1:
+                logger.info(
+                    f"Dispatched {len(inputs)} requests as RunPod job {job.get('id')}"
+                )
+
+            for index, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if len(inputs) == 1:
+                    future.set_result(job)
+                else:
+                    future.set_result({**job, "id": batch_job_id(job["id"], index)})
+        except Exception as e:
+            # Callers wait on their futures, none may be left pending
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        except BaseException:
+            for _, future in batch:
+                future.cancel()
+            raise
+
+
+class JobStream:
+    """The items a job streamed so far, shared by the relays of its requests."""
+
+    def __init__(self):
+        self.items: list = []  # The output of every streamed item
+        self.status: Optional[str] = None  # Set once the job ended
+        self.error: Any = None  # The job's error when it failed
+        self.failure: Optional[Exception] = None  # What stopped the polling
+        self.subscribers = 0
+        self.poller: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status is not None or self.failure is not None
+
+    def notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self, seen: int, timeout: float):
+        """
+        Until there are more than `seen` items or the job ended, at most
+        `timeout` seconds.
+        """
+        if len(self.items) > seen or self.finished:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class StreamFanout:
+    """
+    One /stream poller per RunPod job, however many relays read it. `fetch`
+    returns the /stream payload of a job ({"status": ..., "stream": [...]}),
+    an exception it raises ends the job's stream. A job's items are kept
+    `linger` seconds after it ends or loses its last relay, for relays that
+    open late or reconnect.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[dict]],
+        interval: float = 0.5,
+        linger: float = 60.0,
+    ):
+        self._fetch = fetch
+        self.interval = interval
+        self.linger = linger
+        self._streams: dict[str, JobStream] = {}
+
+    def subscribe(self, job_id: str) -> JobStream:
+        stream = self._streams.setdefault(job_id, JobStream())
+        stream.subscribers += 1
+        if not stream.finished and (stream.poller is None or stream.poller.done()):
+            stream.poller = asyncio.ensure_future(self._poll(job_id, stream))
+        return stream
+
+    def unsubscribe(self, job_id: str, stream: JobStream):
+        stream.subscribers -= 1
+        self._forget_later(job_id, stream)
+
+    async def _poll(self, job_id: str, stream: JobStream):
+        try:
+            while stream.subscribers and not stream.finished:
+                payload = await self._fetch(job_id)
+                items = [item.get("output") for item in payload.get("stream", [])]
+                stream.items.extend(items)
+                if payload.get("status") in TERMINAL_STATUSES:
+                    stream.status = payload["status"]
+                    stream.error = payload.get("error")
+                if items or stream.finished:
+                    stream.notify()
+
+                if not stream.finished:
+                    await asyncio.sleep(self.interval)
+        except Exception as e:
+            stream.failure = e
+            stream.notify()
+        finally:
+            self._forget_later(job_id, stream)
+
+    def _forget_later(self, job_id: str, stream: JobStream):
+        if stream.subscribers:
+            return
+        asyncio.get_running_loop().call_later(self.linger, self._forget, job_id, stream)
+
+    def _forget(self, job_id: str, stream: JobStream):
+        # Subscribed again or still polling: rescheduled when that ends
+        polling = stream.poller is not None and not stream.poller.done()
+        if (
+            self._streams.get(job_id) is stream
+            and not stream.subscribers
+            and not polling
+        ):
+            del self._streams[job_id]
@@ -0,0 +1,273 @@
+"""
+Streaming silence removal for the Hostinger API.
+
+The input is decoded once by an ffmpeg pipe into 16-bit PCM blocks. Energies are
+computed per 10 ms frame with numpy on a strided view of each block, and the kept
+regions are written to the output WAV as soon as they are known. Memory stays
+bounded by one block plus the silence currently being measured, whatever
+the duration of the input.
+
+Same contract as pydub's split_on_silence + concatenation: silences of at least
+`min_silence` seconds below `threshold_db` dBFS are removed, except `keep_silence`
+seconds next to the speech on each side.
+"""
+
+import json
+import logging
+import subprocess
+import tempfile
+import wave
+from dataclasses import dataclass
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FRAME_MS = 10
+BLOCK_SECONDS = 10
+# 16-bit PCM
+SAMPLE_WIDTH = 2
+MAX_AMPLITUDE = float(1 << (8 * SAMPLE_WIDTH - 1))
+
+
+@dataclass
+class CutStats:
+    sample_rate: int
+    channels: int
+    input_samples: int = 0
+    output_samples: int = 0
+    removed_silences: int = 0
+    voiced: bool = False
+
+    @property
+    def original_duration(self) -> float:
+        return self.input_samples / self.sample_rate
+
+    @property
+    def new_duration(self) -> float:
+        return self.output_samples / self.sample_rate
+
+
+class SilenceCutter:
+    """
+    Frame-level state machine. Feed interleaved int16 samples with feed(),
+    kept samples are passed to `write` in order, then call finish().
+    """
+
+    def __init__(
+        self,
+        write,
+        sample_rate: int,
+        channels: int,
+        threshold_db: float = -40.0,
+        min_silence: float = 0.3,
+        keep_silence: float = 0.2,
+    ):
+        self.write = write
+        self.channels = channels
+        self.frame_size = max(1, sample_rate * FRAME_MS // 1000) * channels
+        frame_seconds = self.frame_size / channels / sample_rate
+
+        self.min_frames = max(1, round(min_silence / frame_seconds))
+        self.keep_frames = round(keep_silence / frame_seconds)
+        # A silence between two voiced parts is only cut when both kept margins fit in it
+        self.cut_frames = max(self.min_frames, 2 * self.keep_frames)
+        self.keep_samples = self.keep_frames * self.frame_size
+
+        # Compare mean squares, no sqrt / log per frame
+        self.threshold = (10 ** (threshold_db / 20.0) * MAX_AMPLITUDE) ** 2
+
+        self.stats = CutStats(sample_rate=sample_rate, channels=channels)
+        self.carry = np.zeros(0, dtype=np.int16)
+
+        # Current silent run: samples still needed and its length in frames
+        self.run: list[np.ndarray] = []
+        self.run_frames = 0
+        self.long_run = False
+
+    def feed(self, samples: np.ndarray):
+        samples = np.concatenate([self.carry, samples]) if self.carry.size else samples
+        num_frames = samples.size // self.frame_size
+        usable = num_frames * self.frame_size
+        self.carry = samples[usable:]
+        if num_frames > 0:
+            self._frames(samples[:usable], num_frames)
+
+    def finish(self) -> CutStats:
+        # The partial last frame is classified on its own
+        if self.carry.size:
+            self._frames(self.carry, 1)
+            self.carry = np.zeros(0, dtype=np.int16)
+
+        if self.run and self.stats.voiced and not self.long_run:
+            # Trailing silence, only the margin after the speech is kept
+            run = np.concatenate(self.run)
+            self._emit(
+                run if self.run_frames < self.min_frames else run[: self.keep_samples]
+            )
+            if self.run_frames >= self.min_frames:
+                self.stats.removed_silences += 1
+
+        self.run, self.run_frames = [], 0
+        return self.stats
+
+    def _frames(self, samples: np.ndarray, num_frames: int):
+        self.stats.input_samples += samples.size // self.channels
+
+        # [num_frames, frame_size] strided view, energies in one pass
+        frames = samples.reshape(num_frames, -1).astype(np.float32)
+        silent = (
+            np.einsum("ij,ij->i", frames, frames) / frames.shape[1] < self.threshold
+        )
+
+        # Walk runs of equal frames rather than single frames
+        edges = np.flatnonzero(np.diff(silent.view(np.int8))) + 1
+        starts = np.concatenate([[0], edges])
+        ends = np.concatenate([edges, [num_frames]])
+        frame_size = samples.size // num_frames
+
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            chunk = samples[start * frame_size : end * frame_size]
+            if silent[start]:
+                self._silent(chunk, end - start)
+            else:
+                self._voiced(chunk)
+
+    def _silent(self, chunk: np.ndarray, num_frames: int):
+        self.run.append(chunk)
+        self.run_frames += num_frames
+
+        limit = self.cut_frames if self.stats.voiced else self.min_frames
+        if self.run_frames < limit:
+            return
+
+        run = np.concatenate(self.run)
+        if not self.long_run:
+            self.long_run = True
+            self.stats.removed_silences += 1
+            if self.stats.voiced:
+                self._emit(run[: self.keep_samples])
+
+        # Only the margin before the next voiced part is still needed
+        self.run = [run[run.size - self.keep_samples :]]
+
+    def _voiced(self, chunk: np.ndarray):
+        if self.run:
+            run = np.concatenate(self.run)
+            leading_cut = not self.stats.voiced and self.run_frames >= self.min_frames
+            if self.long_run or leading_cut:
+                if leading_cut and not self.long_run:
+                    self.stats.removed_silences += 1
+                run = run[run.size - self.keep_samples :]
+            self._emit(run)
+            self.run, self.run_frames, self.long_run = [], 0, False
+
+        self.stats.voiced = True
+        self._emit(chunk)
+
+    def _emit(self, samples: np.ndarray):
+        if samples.size:
+            self.stats.output_samples += samples.size // self.channels
+            self.write(samples.tobytes())
+
+
+def probe_audio(path: str) -> tuple[int, int]:
+    """(sample_rate, channels) of the first audio stream."""
+    result = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-select_streams",
+            "a:0",
+            "-show_entries",
+            "stream=sample_rate,channels",
+            "-of",
+            "json",
+            path,
+        ],
+        capture_output=True,
+        check=True,
+        timeout=30,
+    )
+    streams = json.loads(result.stdout).get("streams") or []
+    if not streams:
+        raise ValueError("No audio stream found")
+    return int(streams[0]["sample_rate"]), int(streams[0]["channels"])
+
+
+def cut_silence_file(
+    input_path: str,
+    output_path: str,
+    threshold_db: float = -40.0,
+    min_silence: float = 0.3,
+    keep_silence: float = 0.2,
+) -> CutStats:
+    """
+    Decodes `input_path` through one ffmpeg pipe and writes the cut audio as
+    16-bit WAV to `output_path`. Blocking, run it in a worker pool.
+    """
+
+    sample_rate, channels = probe_audio(input_path)
+    block_bytes = sample_rate * channels * SAMPLE_WIDTH * BLOCK_SECONDS
+
+    # Not a pipe: errors filling its buffer would block ffmpeg while we wait on stdout
+    stderr_file = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        [
+            "ffmpeg",
+            "-nostdin",
+            "-v",
+            "error",
+            "-i",
+            input_path,
+            "-f",
+            "s16le",
+            "-acodec",
+            "pcm_s16le",
+            "-ar",
+            str(sample_rate),
+            "-ac",
+            str(channels),
+            "pipe:1",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=stderr_file,
+    )
+
+    try:
+        with wave.open(output_path, "wb") as out:
+            out.setnchannels(channels)
+            out.setsampwidth(SAMPLE_WIDTH)
+            out.setframerate(sample_rate)
+
+            cutter = SilenceCutter(
+                out.writeframesraw,
+                sample_rate,
+                channels,
+                threshold_db,
+                min_silence,
+                keep_silence,
+            )
+            leftover = b""
+            while True:
+                data = process.stdout.read(block_bytes)
+                if not data:
+                    break
+                data = leftover + data
+                usable = len(data) - len(data) % SAMPLE_WIDTH
+                leftover = data[usable:]
+                cutter.feed(np.frombuffer(data[:usable], dtype="<i2"))
+
+            stats = cutter.finish()
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read()
+        stderr_file.close()
+
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+
+    return stats
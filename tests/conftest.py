@@ -0,0 +1,58 @@
+import base64
+import os
+import sys
+
+sys.path.append(os.getcwd())
+import pytest
+import torch
+
+from fish_speech.models.text2semantic.llama import (
+    DualARModelArgs,
+    DualARTransformer,
+    NaiveModelArgs,
+    NaiveTransformer,
+)
+from fish_speech.tokenizer import FishTokenizer
+
+
+@pytest.fixture
+def tokenizer(tmp_path):
+    # Byte-level ranks are enough to exercise the encode paths without a checkpoint
+    model_path = tmp_path / "tokenizer.tiktoken"
+    with open(model_path, "w") as f:
+        for i in range(256):
+            f.write(f"{base64.b64encode(bytes([i])).decode()} {i}\n")
+
+    return FishTokenizer(str(model_path))
+
+
+@pytest.fixture
+def build_model(tokenizer):
+    """
+    Builds a tiny model in eval mode around `tokenizer`, keyword arguments
+    override its config. Weights come from the global torch seed.
+    """
+
+    def build(model_cls=DualARTransformer, setup_caches=False, **kwargs):
+        config = dict(
+            vocab_size=max(tokenizer.all_special_tokens_with_ids.values()) + 1,
+            n_layer=2,
+            n_head=2,
+            dim=32,
+            head_dim=16,
+            max_seq_len=64,
+            codebook_size=16,
+            num_codebooks=2,
+            use_gradient_checkpointing=False,
+        )
+        if model_cls is NaiveTransformer:
+            config = NaiveModelArgs(**{**config, **kwargs})
+        else:
+            config = DualARModelArgs(**{**config, "n_fast_layer": 1, **kwargs})
+
+        model = model_cls(config, tokenizer).eval()
+        if setup_caches:
+            model.setup_caches(max_batch_size=1, max_seq_len=64, dtype=torch.float)
+        return model
+
+    return build
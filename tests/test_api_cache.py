@@ -0,0 +1,68 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+from api_cache import AsyncCache, TTLCache
+
+
+def test_ttl_cache_lru_and_expiry():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    cache.set("short", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+
+
+def test_ttl_cache_bounded_by_bytes():
+    cache = TTLCache(maxsize=10, ttl=60, max_bytes=10, sizeof=len)
+    cache.set("a", "x" * 4)
+    cache.set("b", "x" * 4)
+    cache.set("c", "x" * 4)  # 12 bytes, "a" goes
+
+    assert "a" not in cache and cache.nbytes == 8
+    cache.set("b", "x")  # Replacing an entry releases its old size
+    assert cache.nbytes == 5
+
+    cache.set("huge", "x" * 11)
+    assert "huge" not in cache and len(cache) == 0 and cache.nbytes == 0
+
+
+def test_async_cache_coalesces_and_shares(tmp_path):
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["video"]
+
+    async def run():
+        path = str(tmp_path / "cache.sqlite")
+        first = AsyncCache(maxsize=10, ttl=60, shared_path=path)
+        results = await asyncio.gather(
+            *(first.get_or_fetch("pexels|cat", fetch) for _ in range(10))
+        )
+        assert results == [["video"]] * 10
+        assert len(calls) == 1
+
+        # A second worker process would hit the shared tier instead of upstream
+        second = AsyncCache(maxsize=10, ttl=60, shared_path=path)
+        assert await second.get_or_fetch("pexels|cat", fetch) == ["video"]
+        assert len(calls) == 1
+
+        # Vetoed values are returned but not cached
+        empty = AsyncCache(maxsize=10, ttl=60)
+        await empty.get_or_fetch(
+            "k", lambda: asyncio.sleep(0, result=[]), cache_if=bool
+        )
+        assert "k" not in empty.memory
+
+    asyncio.run(run())
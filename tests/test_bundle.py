@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+import torch
+from safetensors.torch import save_file
+
+from fish_speech.models.text2semantic.llama import (
+    BUNDLE_WEIGHTS_NAME,
+    DualARTransformer,
+)
+from fish_speech.utils.timeline import StartupTimeline
+from tools.export_bundle import clean_llama_weights
+
+
+def test_bundle_loads_same_weights(tmp_path, build_model):
+    torch.manual_seed(0)
+    model = build_model(n_layer=1)
+    checkpoint = tmp_path / "checkpoint"
+    model.save_pretrained(checkpoint)
+
+    # Lightning-style keys are cleaned at export time
+    weights = torch.load(checkpoint / "model.pth", weights_only=True)
+    weights = {f"model.{k}": v for k, v in weights.items()}
+    bundle = clean_llama_weights(weights, torch.bfloat16)
+    save_file(bundle, str(checkpoint / BUNDLE_WEIGHTS_NAME))
+    os.remove(checkpoint / "model.pth")
+
+    loaded = DualARTransformer.from_pretrained(checkpoint, load_weights=True)
+    for name, param in model.state_dict().items():
+        assert loaded.state_dict()[name].dtype == torch.bfloat16
+        assert torch.equal(loaded.state_dict()[name], param.to(torch.bfloat16))
+
+
+def test_timeline_records_overlapping_steps():
+    timeline = StartupTimeline()
+    with timeline.step("llama model"):
+        with timeline.step("decoder model"):
+            pass
+
+    assert set(timeline.as_dict()) == {"llama model", "decoder model"}
+    assert "llama model" in timeline.summary()
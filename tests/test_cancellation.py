@@ -0,0 +1,71 @@
+import os
+import queue
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+import pytest
+import torch
+
+from fish_speech.models.text2semantic.inference import (
+    CANCEL_CHECK_INTERVAL,
+    CancellationToken,
+    GenerateRequest,
+    GenerationCancelled,
+    decode_n_tokens,
+)
+
+
+def fake_model(num_codebooks=2, max_seq_len=256):
+    config = SimpleNamespace(num_codebooks=num_codebooks, max_seq_len=max_seq_len)
+    return SimpleNamespace(config=config, tokenizer=SimpleNamespace(im_end_id=-1))
+
+
+def test_deadline_cancels_token():
+    token = CancellationToken.with_timeout(0.01)
+    assert not token.cancelled
+    time.sleep(0.02)
+    assert token.cancelled
+    assert token.reason == "deadline exceeded"
+
+    with pytest.raises(GenerationCancelled):
+        token.raise_if_cancelled()
+
+    # The first reason is kept
+    token.cancel("consumer closed")
+    assert token.reason == "deadline exceeded"
+
+
+def test_decode_stops_within_check_interval():
+    model = fake_model()
+    token = CancellationToken()
+    steps = []
+
+    def decode_one_token(model, x, input_pos, **kwargs):
+        steps.append(int(input_pos))
+        if len(steps) == 5:
+            token.cancel("client disconnected")
+        return torch.zeros(model.config.num_codebooks + 1, 1, dtype=torch.int)
+
+    with pytest.raises(GenerationCancelled, match="client disconnected"):
+        decode_n_tokens(
+            model,
+            torch.zeros(1, 3, 1, dtype=torch.int),
+            torch.tensor([10]),
+            200,
+            temperature=None,
+            top_p=None,
+            repetition_penalty=None,
+            audio_masks=None,
+            audio_parts=None,
+            decode_one_token=decode_one_token,
+            cancel_token=token,
+        )
+
+    assert len(steps) == CANCEL_CHECK_INTERVAL
+
+
+def test_request_defaults_to_no_token():
+    request = GenerateRequest(request={}, response_queue=queue.Queue())
+    assert request.cancel_token is None
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import random
+import sys
+import threading
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+import ormsgpack
+import torch
+
+from fish_speech.utils.framing import FrameReader, pack_frame
+from fish_speech.utils.schema import (
+    ServeAudioPart,
+    ServeChatRequest,
+    ServeMessage,
+    ServeTextPart,
+)
+from tools.server.agent import streaming_generator
+
+
+def test_frame_reader_any_split():
+    bodies = [os.urandom(random.randint(0, 300)) for _ in range(200)]
+    stream = b"".join(b"".join(pack_frame(body)) for body in bodies)
+
+    rng = random.Random(0)
+    reader, received, pos = FrameReader(), [], 0
+    while pos < len(stream):
+        size = rng.choice([1, 3, 7, 64, 1000])
+        received.extend(bytes(body) for body in reader.feed(stream[pos : pos + size]))
+        pos += size
+
+    assert received == bodies
+    assert reader.pending == 0
+
+
+class FakeWorker:
+    """Answers chat requests with: 2 text tokens, 3 VQ frames, 1 text token, 2 VQ frames, im_end."""
+
+    def __init__(self, tokenizer, num_codebooks):
+        self.tokenizer = tokenizer
+        self.num_codebooks = num_codebooks
+
+    def token(self, main, codes=0):
+        token = torch.full((1, self.num_codebooks + 1, 1), codes, dtype=torch.int)
+        token[0, 0, 0] = main
+        return token
+
+    def put(self, item):
+        text = self.tokenizer.encode("hi")
+        semantic = self.tokenizer.semantic_begin_id
+        tokens = (
+            [self.token(t) for t in text]
+            + [self.token(semantic + i, i) for i in range(3)]
+            + [self.token(self.tokenizer.encode("!")[0])]
+            + [self.token(semantic + i, i) for i in range(2)]
+            + [self.token(self.tokenizer.im_end_id)]
+        )
+
+        def run():
+            for token in tokens:
+                item.response_queue.put(token)
+            item.response_queue.put("stop")
+
+        threading.Thread(target=run).start()
+
+
+def test_chat_stream_interleaves_decoded_audio(tokenizer):
+    config = SimpleNamespace(num_codebooks=2)
+    request = ServeChatRequest(
+        messages=[ServeMessage(role="user", parts=[ServeTextPart(text="hello")])],
+        streaming=True,
+        decode_audio=True,
+    )
+
+    decoded_runs = []
+
+    def decode_vq(runs):
+        decoded_runs.append(len(runs))
+        return ServeAudioPart(audio=b"\x00\x01" * len(runs), sample_rate=44100)
+
+    async def collect():
+        reader, parts = FrameReader(), []
+        async for chunk in streaming_generator(
+            request,
+            FakeWorker(tokenizer, config.num_codebooks),
+            tokenizer,
+            config,
+            "cpu",
+            False,
+            decode_vq,
+        ):
+            for body in reader.feed(chunk):
+                data = ormsgpack.unpackb(body)
+                if data["delta"] and data["delta"]["part"]:
+                    parts.append(data["delta"]["part"])
+                elif data["finish_reason"]:
+                    parts.append({"type": "finish"})
+        return parts
+
+    parts = asyncio.run(collect())
+    kinds = [part["type"] for part in parts]
+
+    assert decoded_runs == [3, 2]
+    assert kinds == ["text"] + ["vq"] * 3 + ["audio", "text"] + ["vq"] * 2 + [
+        "audio",
+        "finish",
+    ]
+    assert parts[0]["text"] == "hi"
+    assert parts[1]["codes"] == [[0], [0]]
+    assert len(parts[4]["audio"]) == 6
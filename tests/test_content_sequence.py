@@ -0,0 +1,56 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+import torch
+
+from fish_speech.content_sequence import AudioPart, ContentSequence, TextPart, VQPart
+
+
+def test_encode_for_inference_blocks(tokenizer):
+    codes = torch.randint(0, 4096, (8, 50))
+
+    full = ContentSequence(modality="interleave")
+    full.append([TextPart(text="ref"), VQPart(codes=codes)], add_end=True, speaker=0)
+    full.append([TextPart(text="hello")], speaker=0)
+    values, _, _ = full.encode_for_inference(tokenizer, num_codebooks=8)
+
+    # The reference block can be encoded once and reused with any new text
+    prefix = ContentSequence(modality="interleave")
+    prefix.append([TextPart(text="ref"), VQPart(codes=codes)], add_end=True, speaker=0)
+    suffix = ContentSequence()
+    suffix.append([TextPart(text="hello")], speaker=0)
+    blocks = torch.cat(
+        [
+            prefix.encode_for_inference(tokenizer, num_codebooks=8)[0],
+            suffix.encode_for_inference(tokenizer, num_codebooks=8)[0],
+        ],
+        dim=1,
+    )
+    assert torch.equal(values, blocks)
+
+    encoded = full.encode(tokenizer, add_shift=False)
+    mask = encoded.vq_mask_tokens
+    expected = [tokenizer.semantic_id_to_token_id[int(i)] for i in codes[0]]
+    assert encoded.tokens[mask].tolist() == expected
+    assert torch.equal(values[0, mask], encoded.tokens[mask])
+    assert torch.equal(values[1:, mask], codes.int())
+
+
+def test_encode_for_inference_audio(tokenizer):
+    features = torch.randn(5, 16)
+    sequence = ContentSequence()
+    sequence.append(
+        [TextPart(text="hi"), AudioPart(features=features), TextPart(text="!")],
+        speaker=0,
+    )
+    values, audio_masks, audio_parts = sequence.encode_for_inference(
+        tokenizer, num_codebooks=8
+    )
+
+    encoded = sequence.encode(tokenizer, add_shift=False)
+    assert torch.equal(values[0], encoded.tokens)
+    assert torch.equal(audio_masks[0], encoded.audio_masks)
+    assert torch.equal(audio_parts, features)
+    assert (values[0, audio_masks[0]] == tokenizer.audio_embed_id).all()
+    assert audio_masks.sum() == len(features)
@@ -0,0 +1,57 @@
+import os
+import random
+import sys
+
+sys.path.append(os.getcwd())
+from fish_speech.models.text2semantic.length_predictor import (
+    LengthPredictor,
+    RepetitionDetector,
+    text_features,
+)
+
+
+def test_ceiling_and_cost():
+    predictor = LengthPredictor()
+    short, long = "Hello.", "Hello, this is a much longer sentence to read out."
+    assert predictor.expected_frames(short) < predictor.expected_frames(long)
+    # CJK characters are whole syllables
+    assert predictor.expected_frames("你好世界") > predictor.expected_frames("abcd")
+
+    ceiling = predictor.ceiling(long)
+    assert ceiling >= 2 * predictor.expected_frames(long)
+    assert predictor.ceiling(long, max_new_tokens=10) == 10
+    assert predictor.estimate_cost(long, max_new_tokens=10) == 10
+
+
+def test_fit_recovers_weights(tmp_path):
+    rng = random.Random(0)
+    words = ["alpha", "be", "cat", "delta", "42", "你好"]
+    samples = []
+    for _ in range(200):
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(1, 20))) + "."
+        f = text_features(text)
+        frames = 10 + 1.2 * f["letters"] + 5 * f["cjk"] + 2 * f["digits"]
+        samples.append((text, frames + 3 * f["pauses"] + 0.5 * f["words"]))
+
+    predictor = LengthPredictor.fit(samples, ceiling_ratio=1.5)
+    assert abs(predictor.weights["letters"] - 1.2) < 1e-6
+    assert abs(predictor.weights["cjk"] - 5) < 1e-6
+
+    predictor.save(tmp_path / "length.json")
+    loaded = LengthPredictor.load(tmp_path / "length.json")
+    assert loaded == predictor
+    assert loaded.ceiling_ratio == 1.5
+
+
+def test_repetition_detector():
+    rng = random.Random(0)
+    speech = [rng.randrange(1000) for _ in range(300)]
+    assert RepetitionDetector().extend(speech) is None
+
+    # A short pause repeats a token without being a loop
+    assert RepetitionDetector().extend(speech[:40] + [7] * 20 + speech) is None
+
+    detector = RepetitionDetector()
+    assert detector.extend(speech[:50]) is None
+    # Loop of period 5 starting at token 50, its first period is kept
+    assert detector.extend([1, 2, 3, 4, 5] * 40) == 55
@@ -0,0 +1,52 @@
+import copy
+import os
+import sys
+
+sys.path.append(os.getcwd())
+import torch
+
+from fish_speech.models.text2semantic.lora import LoraConfig, setup_lora
+from fish_speech.models.text2semantic.lora_registry import LoraRegistry
+
+
+def test_registry_matches_merged_adapter(tmp_path, tokenizer, build_model):
+    torch.manual_seed(0)
+    model = build_model(tie_word_embeddings=False)
+
+    # A trained adapter: base weights + random LoRA weights, merged as a reference
+    lora_model = copy.deepcopy(model)
+    setup_lora(lora_model, LoraConfig(r=4, lora_alpha=8))
+    lora_model.load_state_dict(model.state_dict(), strict=False)
+    adapter = {}
+    for name, param in lora_model.named_parameters():
+        if "lora" in name:
+            param.data.normal_(std=0.1)
+            adapter[name] = param.data.clone()
+    torch.save(adapter, tmp_path / "voice1.pth")
+    lora_model.eval()
+
+    inp = torch.randint(0, 256, (1, 3, 12))
+    inp[0, 0, 6:] = tokenizer.semantic_begin_id + torch.randint(0, 16, (6,))
+    inp[0, 1:] = torch.randint(0, 16, (2, 12))
+
+    def run(m):
+        with torch.no_grad():
+            result = m(inp, labels=inp)
+        return result.token_logits, result.codebook_logits
+
+    base = run(model)
+    merged = run(lora_model)
+
+    registry = LoraRegistry(model, tmp_path, capacity=2, max_rank=8, lora_alpha=8)
+    assert registry.activate("voice1")
+    for actual, expected in zip(run(model), merged):
+        assert torch.allclose(actual, expected, atol=1e-4)
+
+    # Unknown voices and no voice fall back to the shared base weights
+    assert not registry.activate("unknown")
+    for actual, expected in zip(run(model), base):
+        assert torch.allclose(actual, expected, atol=1e-5)
+
+    assert registry.activate("voice1")
+    assert registry.stats()["loads"] == 1
+    assert not registry.activate(None)
@@ -0,0 +1,72 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+import torch
+
+from fish_speech.datasets.semantic import (
+    LengthBucketedIterableDataset,
+    TextDataCollator,
+)
+from fish_speech.models.text2semantic.llama import NaiveTransformer
+
+
+def make_example(length, num_codebooks=2):
+    tokens = torch.randint(0, 256, (num_codebooks + 1, length))
+    tokens[1:] = torch.randint(0, 16, (num_codebooks, length))
+    return {"tokens": tokens, "labels": tokens.clone()}
+
+
+def test_packed_forward_matches_unpacked(tokenizer, build_model):
+    torch.manual_seed(0)
+    model = build_model(NaiveTransformer)
+
+    examples = [make_example(n) for n in (20, 7, 30, 5)]
+    collator = TextDataCollator(tokenizer, max_length=32, packing=True)
+    batch = collator(examples)
+
+    # 4 examples fit in 2 rows of 32 instead of 4 rows of 30
+    assert batch["inputs"].shape[0] == 2
+
+    with torch.no_grad():
+        packed = model(
+            batch["inputs"],
+            document_ids=batch["document_ids"],
+            position_ids=batch["position_ids"],
+        ).token_logits
+
+        found = 0
+        for example in examples:
+            single = model(example["tokens"][None]).token_logits[0]
+            for row in range(packed.shape[0]):
+                for begin in range(packed.shape[1] - single.shape[0] + 1):
+                    window = batch["inputs"][row, :, begin : begin + single.shape[0]]
+                    if torch.equal(window, example["tokens"]):
+                        window_logits = packed[row, begin : begin + single.shape[0]]
+                        assert torch.allclose(window_logits, single, atol=1e-5)
+                        found += 1
+        assert found == len(examples)
+
+
+def test_batchify_pads_and_masks(tokenizer):
+    examples = [make_example(n) for n in (3, 5)]
+    batch = TextDataCollator(tokenizer, max_length=4)(examples)
+
+    assert batch["inputs"].shape == (2, 3, 4)
+    assert batch["attention_masks"].tolist() == [
+        [False, False, False, True],
+        [False, False, False, False],
+    ]
+    assert (batch["labels"][0, :, 3] == -100).all()
+    assert batch["inputs"][0, 0, 3] == tokenizer.eos_token_id
+
+
+def test_length_buckets_flush_finite_source():
+    # 2 full buffers of 8 examples, then 4 left over when the source ends
+    examples = [make_example(n) for n in torch.randint(1, 50, (20,)).tolist()]
+    dataset = LengthBucketedIterableDataset(examples, batch_size=4, num_batches=2)
+    result = list(dataset)
+
+    assert len(result) == len(examples)
+    tail = [x["tokens"].size(1) for x in result[16:]]
+    assert tail == sorted(x["tokens"].size(1) for x in examples[16:])
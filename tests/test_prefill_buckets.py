@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+import torch
+
+from fish_speech.models.text2semantic.inference import prefill_bucket, prefill_buckets
+
+
+def test_buckets_cover_max_seq_len():
+    assert prefill_buckets(1024) == [128, 256, 384, 512, 768, 1024]
+    assert prefill_bucket(1, 1024) == 128
+    assert prefill_bucket(129, 1024) == 256
+    assert prefill_bucket(1000, 1000) == 1000
+
+
+@torch.no_grad()
+def test_padded_prefill_matches_unpadded(build_model):
+    torch.manual_seed(0)
+    model = build_model(setup_caches=True)
+    T, bucket = 11, 32
+    prompt = torch.randint(0, 16, (1, 3, T))
+    prompt[:, 0] = torch.randint(0, 200, (1, T))
+
+    expected = model.forward_generate(prompt, torch.arange(T))
+
+    padded = torch.zeros((1, 3, bucket), dtype=prompt.dtype)
+    padded[:, :, :T] = prompt
+    result = model.forward_generate(
+        padded, torch.arange(bucket), last_pos=torch.tensor([T - 1])
+    )
+
+    assert torch.allclose(result.logits, expected.logits, atol=1e-5)
+    assert torch.allclose(result.hidden_states, expected.hidden_states, atol=1e-5)
+
+    # Decoding from T overwrites the padding's cache entries before using them
+    token = torch.tensor([[[65], [0], [0]]])
+    after_padded = model.forward_generate(token, torch.tensor([T]))
+    model.forward_generate(prompt, torch.arange(T))
+    after_prompt = model.forward_generate(token, torch.tensor([T]))
+
+    assert torch.allclose(after_padded.logits, after_prompt.logits, atol=1e-5)
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.getcwd())
+from runpod_dispatcher import (
+    BATCH_TASK,
+    BatchDispatcher,
+    StreamFanout,
+    aggregate_output,
+    batch_result,
+    is_batch_output,
+    split_job_id,
+)
+
+
+class FakeRunPod:
+    """Stands in for POST /run, records every payload."""
+
+    def __init__(self, fail=False):
+        self.payloads = []
+        self.fail = fail
+
+    async def submit(self, payload):
+        self.payloads.append(payload)
+        if self.fail:
+            raise RuntimeError("RunPod unavailable")
+        return {"id": f"job-{len(self.payloads) - 1}", "status": "IN_QUEUE"}
+
+
+def request(text, voice, user=None):
+    job_input = {"text": text, "reference_id": voice}
+    if user is not None:
+        job_input["user_id"] = user
+    return job_input
+
+
+def test_groups_requests_by_voice():
+    runpod = FakeRunPod()
+    dispatcher = BatchDispatcher(runpod.submit, window=0.02)
+
+    async def main():
+        return await asyncio.gather(
+            dispatcher.dispatch(request("one", "alice")),
+            dispatcher.dispatch(request("two", "bob")),
+            dispatcher.dispatch(request("three", "alice")),
+            dispatcher.dispatch(request("x" * 1000, "alice")),  # Too long to batch
+        )
+
+    jobs = asyncio.run(main())
+
+    assert len(runpod.payloads) == 3
+    long_job, alice_job, bob_job = runpod.payloads
+    assert long_job == {"input": request("x" * 1000, "alice")}
+    assert alice_job["input"]["task"] == BATCH_TASK
+    assert [r["text"] for r in alice_job["input"]["requests"]] == ["one", "three"]
+    assert bob_job == {"input": request("two", "bob")}
+
+    assert [job["id"] for job in jobs] == ["job-1:0", "job-2", "job-1:1", "job-0"]
+    assert split_job_id(jobs[2]["id"]) == ("job-1", 1)
+    assert split_job_id("abc-123-u1") == ("abc-123-u1", None)
+
+
+def test_full_batch_is_sent_before_the_window():
+    runpod = FakeRunPod()
+    dispatcher = BatchDispatcher(runpod.submit, window=60, max_batch_size=2)
+
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.gather(
+                dispatcher.dispatch(request("one", "alice")),
+                dispatcher.dispatch(request("two", "alice")),
+            ),
+            timeout=5,
+        )
+
+    jobs = asyncio.run(main())
+    assert len(runpod.payloads) == 1
+    assert [job["id"] for job in jobs] == ["job-0:0", "job-0:1"]
+
+
+def test_users_never_share_a_batch():
+    runpod = FakeRunPod()
+    dispatcher = BatchDispatcher(runpod.submit, window=0.02)
+
+    async def main():
+        return await asyncio.gather(
+            dispatcher.dispatch(request("one", "alice", user="u1")),
+            dispatcher.dispatch(request("two", "alice", user="u2")),
+            dispatcher.dispatch(request("three", "alice", user="u1")),
+        )
+
+    jobs = asyncio.run(main())
+    assert len(runpod.payloads) == 2
+    users = [
+        {r["user_id"] for r in p["input"].get("requests", [p["input"]])}
+        for p in runpod.payloads
+    ]
+    assert users == [{"u1"}, {"u2"}]
+    assert [job["id"] for job in jobs] == ["job-0:0", "job-1", "job-0:1"]
+
+
+def test_malformed_submit_response_fails_every_caller():
+    async def submit(payload):
+        return {"status": "IN_QUEUE"}  # No id
+
+    dispatcher = BatchDispatcher(submit, window=0.01)
+
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.gather(
+                dispatcher.dispatch(request("one", "alice")),
+                dispatcher.dispatch(request("two", "alice")),
+                return_exceptions=True,
+            ),
+            timeout=5,
+        )
+
+    assert all(isinstance(r, KeyError) for r in asyncio.run(main()))
+
+
+def test_submit_errors_reach_every_caller():
+    dispatcher = BatchDispatcher(FakeRunPod(fail=True).submit, window=0.01)
+
+    async def main():
+        return await asyncio.gather(
+            dispatcher.dispatch(request("one", "alice")),
+            dispatcher.dispatch(request("two", "alice")),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(main()))
+
+
+class FakeStream:
+    """Stands in for GET /stream/{job_id}, each item is handed out once."""
+
+    def __init__(self, outputs, polls_to_finish=3):
+        self.outputs = list(outputs)
+        self.polls = 0
+        self.polls_to_finish = polls_to_finish
+
+    async def fetch(self, job_id):
+        self.polls += 1
+        items = [{"output": self.outputs.pop(0)}] if self.outputs else []
+        finished = not self.outputs and self.polls >= self.polls_to_finish
+        return {"status": "COMPLETED" if finished else "IN_PROGRESS", "stream": items}
+
+
+def test_stream_fanout_shares_one_poller():
+    outputs = [{"batch_index": i % 2, "chunk": i} for i in range(6)]
+    runpod = FakeStream(outputs)
+    fanout = StreamFanout(runpod.fetch, interval=0.01, linger=60)
+
+    async def relay(index):
+        stream = fanout.subscribe("job-0")
+        try:
+            while not stream.finished:
+                await stream.wait(len(stream.items), 1)
+            return [o["chunk"] for o in stream.items if o["batch_index"] == index]
+        finally:
+            fanout.unsubscribe("job-0", stream)
+
+    async def main():
+        both = await asyncio.gather(relay(0), relay(1))
+        # Opened after the job ended, still gets the items already polled
+        return [*both, await relay(1)]
+
+    assert asyncio.run(main()) == [[0, 2, 4], [1, 3, 5], [1, 3, 5]]
+    assert runpod.polls == 6
+
+
+def test_stream_fanout_reports_fetch_errors():
+    async def fetch(job_id):
+        raise RuntimeError("RunPod unavailable")
+
+    fanout = StreamFanout(fetch, interval=0.01)
+
+    async def main():
+        stream = fanout.subscribe("job-0")
+        while not stream.finished:
+            await stream.wait(len(stream.items), 1)
+        fanout.unsubscribe("job-0", stream)
+        return stream
+
+    stream = asyncio.run(main())
+    assert stream.finished and isinstance(stream.failure, RuntimeError)
+
+
+def test_aggregate_output_keeps_final_results():
+    # Plain job: the last streamed item is the result
+    assert aggregate_output([{"progress": 50.0}, {"status": "COMPLETED"}]) == {
+        "status": "COMPLETED"
+    }
+
+    output = aggregate_output(
+        [
+            {"batch_index": 0, "status": "IN_PROGRESS"},
+            {"batch_index": 1, "status": "COMPLETED", "audio_base64": "b"},
+            {"batch_index": 0, "status": "COMPLETED", "audio_base64": "a"},
+        ]
+    )
+    assert is_batch_output(output)
+    assert [r["audio_base64"] for r in output["results"]] == ["a", "b"]
+    assert batch_result(output, 1)["audio_base64"] == "b"
+    assert batch_result(None, 0) is None
@@ -0,0 +1,108 @@
+import os
+import queue
+import sys
+
+sys.path.append(os.getcwd())
+import pytest
+
+from fish_speech.models.text2semantic.inference import GenerateRequest
+from fish_speech.models.text2semantic.scheduler import (
+    RequestScheduler,
+    TenantLimitExceeded,
+)
+
+
+def make_request(name, cost, priority="interactive", tenant=None):
+    return GenerateRequest(
+        request={"name": name},
+        response_queue=queue.Queue(),
+        priority=priority,
+        tenant=tenant,
+        cost=cost,
+    )
+
+
+def drain(scheduler):
+    names = []
+    while scheduler.qsize():
+        item = scheduler.get()
+        names.append(item.request["name"])
+        scheduler.done(item)
+    return names
+
+
+def test_shortest_interactive_first():
+    scheduler = RequestScheduler(aging_rate=0.0)
+    scheduler.put(make_request("audiobook", 20000, priority="batch"))
+    scheduler.put(make_request("long", 3000))
+    scheduler.put(make_request("preview", 40))
+    scheduler.put(make_request("short_batch", 40, priority="batch"))
+
+    assert drain(scheduler) == ["preview", "short_batch", "long", "audiobook"]
+
+
+def test_aging_prevents_starvation(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(
+        "fish_speech.models.text2semantic.scheduler.time.monotonic", lambda: clock[0]
+    )
+    scheduler = RequestScheduler(aging_rate=100.0, batch_penalty=0.0)
+
+    scheduler.put(make_request("old_long", 1000))
+    clock[0] = 20.0
+    scheduler.put(make_request("new_short", 10))
+
+    # 20 s of waiting forgive 2000 tokens
+    assert drain(scheduler) == ["old_long", "new_short"]
+
+
+def test_tenant_caps():
+    scheduler = RequestScheduler(max_running_per_tenant=1, max_pending_per_tenant=2)
+    scheduler.put(make_request("a1", 10, tenant="a"))
+    scheduler.put(make_request("a2", 20, tenant="a"))
+    with pytest.raises(TenantLimitExceeded):
+        scheduler.put(make_request("a3", 30, tenant="a"))
+    scheduler.put(make_request("b1", 500, tenant="b"))
+
+    first = scheduler.get()
+    assert first.request["name"] == "a1"
+    # a2 is cheaper but tenant a is at its running cap
+    assert scheduler.get().request["name"] == "b1"
+    with pytest.raises(queue.Empty):
+        scheduler.get(block=False)
+
+    scheduler.done(first)
+    assert scheduler.get().request["name"] == "a2"
+
+    stats = scheduler.stats()
+    assert stats["rejected"] == 1
+    assert stats["dispatched"] == 3
+    assert stats["wait_seconds"]["interactive"]["count"] == 3
+
+
+def test_close_and_estimate():
+    scheduler = RequestScheduler()
+    scheduler.put(None)
+    assert scheduler.get() is None
+
+    short, long = scheduler.estimate_cost("Hi."), scheduler.estimate_cost("x " * 100)
+    assert 0 < short < long
+    assert scheduler.estimate_cost("x " * 100, max_new_tokens=64) == 64
+
+
+def test_position_follows_schedule():
+    scheduler = RequestScheduler(aging_rate=0.0)
+    items = [
+        make_request("long", 3000),
+        make_request("preview", 40),
+        make_request("audiobook", 20000, priority="batch"),
+    ]
+    for item in items:
+        item.cancel_token = object()
+        scheduler.put(item)
+
+    assert [scheduler.position(item.cancel_token) for item in items] == [1, 0, 2]
+
+    scheduler.done(scheduler.get())
+    assert scheduler.position(items[1].cancel_token) is None
+    assert scheduler.position(items[2].cancel_token) == 1
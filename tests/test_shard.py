@@ -0,0 +1,36 @@
+import os
+import pickle
+import sys
+
+sys.path.append(os.getcwd())
+import numpy as np
+
+from fish_speech.datasets.shard import SemanticShard, ShardGroup, ShardWriter
+
+
+def test_shard_roundtrip(tmp_path):
+    rng = np.random.default_rng(0)
+    groups = {
+        "spk0": [(["xin chào"], rng.integers(0, 4096, (10, 7)))],
+        "spk1": [
+            (["hello", "hi"], rng.integers(0, 4096, (10, 3))),
+            ([], rng.integers(0, 4096, (10, 12))),
+        ],
+    }
+
+    writer = ShardWriter(tmp_path / "00000000.shard")
+    for name, sentences in groups.items():
+        writer.add_group(name, "folder", sentences)
+    writer.close()
+
+    shard = pickle.loads(pickle.dumps(SemanticShard(tmp_path / "00000000.shard")))
+    assert shard.num_sentences == 3
+    assert shard.group_sizes().tolist() == [1, 2]
+
+    for idx, (name, sentences) in enumerate(groups.items()):
+        group = ShardGroup(shard, idx)
+        assert group.name == name and group.source == "folder"
+        assert len(group.sentences) == len(sentences)
+        for sentence, (texts, codes) in zip(group.sentences[:], sentences):
+            assert sentence.texts == texts
+            assert np.array_equal(sentence.semantics, codes)
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+import numpy as np
+import soundfile as sf
+
+from fish_speech.utils.silence import (
+    scan_voiced_range,
+    trim_silence,
+    voiced_range,
+    write_range,
+)
+
+
+def test_streaming_scan_matches_in_memory(tmp_path):
+    rng = np.random.default_rng(0)
+    samples = np.zeros(44100 * 3 + 17, dtype=np.float32)
+    samples[40000:90000] = rng.standard_normal(50000) * 0.1
+
+    path = tmp_path / "a.wav"
+    sf.write(path, np.stack([samples, samples], axis=1), 44100, subtype="FLOAT")
+
+    bounds = voiced_range(samples)
+    assert bounds[0] <= 40000 < 90000 <= bounds[1]
+    assert scan_voiced_range(path, block_size=3000) == (bounds, 44100, len(samples))
+
+    trimmed = trim_silence(samples, 44100, keep_start=0, keep_end=0)
+    assert len(trimmed) == bounds[1] - bounds[0]
+    assert trim_silence(np.zeros(100), 44100).shape == (100,)
+
+    write_range(path, path, bounds[0], bounds[1], pad_end=100)
+    data, _ = sf.read(path, always_2d=True)
+    assert data.shape == (bounds[1] - bounds[0] + 100, 2)
+    assert not any(p.name.endswith(".tmp") for p in tmp_path.iterdir())
@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.append(os.getcwd())
+import numpy as np
+
+from silence_cutter import SilenceCutter
+
+
+def test_cutter_keeps_margins_and_short_pauses():
+    sample_rate = 1000
+    rng = np.random.default_rng(0)
+
+    def voice(seconds):
+        return (rng.standard_normal(int(seconds * sample_rate)) * 3000).astype(np.int16)
+
+    def silence(seconds):
+        return np.zeros(int(seconds * sample_rate), dtype=np.int16)
+
+    samples = np.concatenate(
+        [
+            silence(1.0),
+            voice(0.5),
+            silence(0.25),
+            voice(0.5),
+            silence(2.0),
+            voice(0.5),
+            silence(1.0),
+        ]
+    )
+
+    out = []
+    cutter = SilenceCutter(
+        out.append, sample_rate, 1, -40, min_silence=0.3, keep_silence=0.2
+    )
+    # Odd block sizes, so frames and runs span feed() calls
+    for begin in range(0, len(samples), 333):
+        cutter.feed(samples[begin : begin + 333])
+    stats = cutter.finish()
+
+    # Leading / trailing silences keep 0.2s, the 2s pause keeps 0.2s per side,
+    # the 0.25s pause is shorter than min_silence and kept whole
+    expected = 0.2 + 0.5 + 0.25 + 0.5 + 0.4 + 0.5 + 0.2
+    result = np.frombuffer(b"".join(out), dtype=np.int16)
+    assert stats.removed_silences == 3
+    assert stats.input_samples == len(samples)
+    assert len(result) == stats.output_samples
+    assert abs(stats.new_duration - expected) < 0.011
+    assert np.count_nonzero(result) == np.count_nonzero(samples)
@@ -0,0 +1,74 @@
+import copy
+import os
+import sys
+
+sys.path.append(os.getcwd())
+import torch
+
+from fish_speech.models.text2semantic.inference import generate
+from fish_speech.models.text2semantic.speculative import speculative_stats
+
+
+def build_target(build_model, seed):
+    torch.manual_seed(seed)
+    # Codebook 0 is the semantic token, so it needs every semantic id
+    return build_model(setup_caches=True, codebook_size=4096, num_codebooks=3)
+
+
+def run(model, prompt, **kwargs):
+    return generate(
+        model=model,
+        prompt=prompt,
+        max_new_tokens=24,
+        audio_masks=None,
+        audio_parts=None,
+        top_p=0.9,
+        repetition_penalty=1.2,
+        **kwargs,
+    )
+
+
+def make_prompt():
+    torch.manual_seed(1)
+    prompt = torch.randint(0, 16, (4, 10), dtype=torch.int)
+    prompt[0] = torch.randint(0, 200, (10,))
+    return prompt
+
+
+def test_identical_draft_is_always_accepted(build_model):
+    model = build_target(build_model, seed=0)
+    draft = copy.deepcopy(model)
+    before = copy.deepcopy(speculative_stats)
+
+    run(model, make_prompt(), temperature=0.7, draft_model=draft, num_draft_tokens=3)
+
+    drafted = speculative_stats.drafted - before.drafted
+    accepted = speculative_stats.accepted - before.accepted
+    assert drafted > 0
+    assert accepted == drafted
+
+
+def test_greedy_output_matches_plain_decoding(build_model):
+    # With near zero temperature, speculative decoding must reproduce the target
+    # exactly, whatever the draft proposes and however often its frames are rejected
+    model = build_target(build_model, seed=0)
+    draft = build_target(build_model, seed=2)
+    prompt = make_prompt()
+
+    expected = run(model, prompt, temperature=1e-5)
+    result = run(model, prompt, temperature=1e-5, draft_model=draft, num_draft_tokens=4)
+
+    assert torch.equal(result, expected)
+
+
+def test_seed_reproduces_output_whatever_ran_before(build_model):
+    model = build_target(build_model, seed=0)
+    draft = build_target(build_model, seed=2)
+    prompt = make_prompt()
+
+    for kwargs in ({}, {"draft_model": draft}):
+        first = run(model, prompt, temperature=0.9, seed=7, **kwargs)
+        # Other requests draw from the global generator in between
+        run(model, prompt, temperature=0.9)
+        torch.rand(100)
+        assert torch.equal(run(model, prompt, temperature=0.9, seed=7, **kwargs), first)
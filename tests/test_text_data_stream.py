@@ -0,0 +1,42 @@
+import io
+import os
+import sys
+
+sys.path.append(os.getcwd())
+import numpy as np
+
+from fish_speech.datasets.protos.text_data_pb2 import Semantics, Sentence, TextData
+from fish_speech.datasets.protos.text_data_stream import (
+    pack_pb_stream,
+    pack_text_data,
+    read_pb_record,
+)
+
+
+def test_pack_text_data_matches_protobuf():
+    rng = np.random.default_rng(0)
+    edge = np.array([[0, 127, 128, 16383, 16384, 2**21, 2**28 - 1, 2**28, 2**32 - 1]])
+    sentences = [
+        (["xin chào", "hi"], rng.integers(0, 4096, (10, 30))),
+        ([], np.zeros((2, 0), dtype=np.int64)),
+        (["edge"], edge),
+    ]
+
+    expected = pack_pb_stream(
+        TextData(
+            source="folder",
+            name="spk0",
+            sentences=[
+                Sentence(
+                    texts=texts,
+                    semantics=[Semantics(values=row) for row in codes.tolist()],
+                )
+                for texts, codes in sentences
+            ],
+        )
+    )
+    packed = pack_text_data("folder", "spk0", sentences)
+    assert packed == expected
+
+    text_data = read_pb_record(io.BytesIO(b"\0" * 7 + packed), 7)
+    assert list(text_data.sentences[2].semantics[0].values) == edge[0].tolist()
@@ -0,0 +1,33 @@
+import os
+import pickle
+import sys
+
+sys.path.append(os.getcwd())
+import numpy as np
+
+from fish_speech.tokenizer import IM_END_TOKEN
+
+
+def test_encode_batch_matches_encode(tokenizer):
+    texts = ["Hello world.", "", "Xin chào <|im_end|>", "a" * 5000]
+
+    tokens, offsets = tokenizer.encode_batch(texts)
+
+    assert tokens.dtype == np.int32
+    assert len(offsets) == len(texts) + 1
+    for i, text in enumerate(texts):
+        assert tokens[offsets[i] : offsets[i + 1]].tolist() == tokenizer.encode(text)
+
+
+def test_encode_cache_and_special_ids(tokenizer):
+
+    first = tokenizer.encode("<|im_end|>")
+    first.append(-1)  # Mutating the result must not leak into the cache
+    assert tokenizer.encode("<|im_end|>") == [tokenizer.im_end_id]
+    assert tokenizer.im_end_id == tokenizer.get_token_id(IM_END_TOKEN)
+    assert tokenizer.encode("<|im_end|>", allowed_special=False) != [
+        tokenizer.im_end_id
+    ]
+
+    restored = pickle.loads(pickle.dumps(tokenizer))
+    assert restored.encode("Hello") == tokenizer.encode("Hello")
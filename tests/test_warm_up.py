@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+from tools.server.warm_up import WarmUpStep, load_warm_up_plan, run_warm_up_plan
+
+
+class FakeEngine:
+    def __init__(self):
+        self.requests = []
+
+    def inference(self, req, cancel_token=None):
+        self.requests.append(req)
+        yield SimpleNamespace(code="final", audio=(44100, b""), error=None)
+
+
+def test_plan_runs_steps_and_skips_missing_references(tmp_path):
+    reference = tmp_path / "alice.wav"
+    reference.write_bytes(b"RIFF")
+    plan = tmp_path / "plan.json"
+    plan.write_text(
+        json.dumps(
+            [
+                {"text": "Hello world."},
+                {"text_length": 300, "repeat": 2},
+                {"text_length": 50, "reference_audio": str(reference)},
+                {"text_length": 50, "reference_id": "does-not-exist"},
+            ]
+        )
+    )
+
+    engine = FakeEngine()
+    run_warm_up_plan(load_warm_up_plan(plan), engine)
+
+    assert [len(req.text) for req in engine.requests] == [12, 300, 300, 50]
+    assert engine.requests[3].references[0].audio == b"RIFF"
+
+
+def test_text_length_is_exact():
+    assert len(WarmUpStep(text_length=1000).get_text()) == 1000
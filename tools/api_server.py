@@ -88,8 +88,33 @@ class API(ExceptionHandler):
             llama_checkpoint_path=self.args.llama_checkpoint_path,
             decoder_checkpoint_path=self.args.decoder_checkpoint_path,
             decoder_config_name=self.args.decoder_config_name,
+            lora_dir=self.args.lora_dir,
+            lora_cache_size=self.args.lora_cache_size,
+            max_running_per_tenant=self.args.tenant_max_running,
+            max_pending_per_tenant=self.args.tenant_max_pending,
+            decoder_backend=self.args.decoder_backend,
+            warm_up_plan=self.args.warm_up_plan,
+            draft_checkpoint_path=self.args.draft_checkpoint_path,
+            num_draft_tokens=self.args.num_draft_tokens,
+            length_predictor_path=self.args.length_predictor_path,
         )
 
+        if self.args.webui_port:
+            # Imported here so the API server doesn't need gradio otherwise
+            from tools.webui import build_app
+            from tools.webui.inference import get_inference_wrapper
+
+            # Same engine and scheduler as the API, requests share one queue
+            webui = build_app(
+                get_inference_wrapper(app.state.model_manager.tts_inference_engine)
+            )
+            webui.launch(
+                server_name=self.args.listen.rsplit(":", 1)[0].strip("[]"),
+                server_port=self.args.webui_port,
+                prevent_thread_lock=True,
+            )
+            logger.info(f"WebUI listening on port {self.args.webui_port}")
+
         logger.info(f"Startup done, listening server at http://{self.args.listen}")
 
 
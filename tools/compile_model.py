@@ -7,22 +7,33 @@ from loguru import logger
 # Add project root to path
 sys.path.append(os.getcwd())
 
+from fish_speech.models.text2semantic.inference import compile_stats
+from fish_speech.utils.schema import ServeTTSRequest
+from tools.server.inference import inference_wrapper as inference
 from tools.server.model_manager import ModelManager
 
+# Prompts of very different lengths, they must all hit precompiled graphs
+VERIFY_TEXTS = [
+    "Hi.",
+    "Hello world, this is a compilation check. " * 4,
+    "The quick brown fox jumps over the lazy dog. " * 24,
+]
+
+
 def main():
     # 1. Setup AOT Cache Directory
     # We use a local directory that can be zipped/copied later
     CACHE_DIR = os.path.join(os.getcwd(), "aot_cache")
     os.makedirs(CACHE_DIR, exist_ok=True)
-    
+
     # Set PyTorch Inductor Cache
     os.environ["TORCHINDUCTOR_CACHE_DIR"] = CACHE_DIR
     # Set Triton Cache (often separate)
     os.environ["TRITON_CACHE_DIR"] = os.path.join(CACHE_DIR, "triton")
-    
+
     # Enable FX Graph Cache (Persistence)
     os.environ["TORCHINDUCTOR_FX_GRAPH_CACHE"] = "1"
-    
+
     logger.info(f"--- AOT Compilation Script ---")
     logger.info(f"Cache Directory: {CACHE_DIR}")
     logger.info(f"Device: {torch.cuda.get_device_name() if torch.cuda.is_available() else 'CPU'}")
@@ -33,42 +44,56 @@ def main():
     # 2. Configuration (Matches handler.py)
     DEVICE = "cuda"
     CHECKPOINT_DIR = "checkpoints/fish-speech-1.5"
-    
+
     # Verify Checkpoints
     if not os.path.exists(CHECKPOINT_DIR):
         logger.error(f"Checkpoint directory {CHECKPOINT_DIR} not found.")
         logger.error("Please run: python tools/download_models.py")
         return
 
+    # Same decoder discovery as handler.py
+    decoder_file = "codec.pth"
+    for p in ["codec.pth", "firefly-gan-vq-fsq-8x1024-21hz-generator.pth"]:
+        if os.path.exists(os.path.join(CHECKPOINT_DIR, p)):
+            decoder_file = p
+            break
+
     # 3. Initialize ModelManager
-    # This loads the model and prepares the graph
-    logger.info("Initializing ModelManager...")
+    # The LLAMA worker compiles every prefill bucket and the decode step,
+    # then the manager warms up the whole TTS pipeline
+    logger.info("Initializing ModelManager (Triggering Compilation)...")
+    start_time = time.time()
     try:
         manager = ModelManager(
             mode="tts",
             device=DEVICE,
             half=True,       # Consistent with handler.py
             compile=True,    # FORCE Compilation
-            asr_enabled=False,
             llama_checkpoint_path=CHECKPOINT_DIR,
-            decoder_config_name="firefly_gan_vq",
-            decoder_checkpoint_path=os.path.join(CHECKPOINT_DIR, "firefly-gan-vq-fsq-8x1024-21hz-generator.pth")
+            decoder_checkpoint_path=os.path.join(CHECKPOINT_DIR, decoder_file),
+            decoder_config_name="modded_dac_vq",
         )
     except Exception as e:
         logger.error(f"Initialization Failed: {e}")
         raise e
 
-    # 4. Trigger Compilation (Warmup)
-    logger.info("Starting Warmup (Triggering Compilation)...")
-    start_time = time.time()
-    
-    # The warm_up method runs a dummy generation
-    manager.warm_up(manager.tts_inference_engine)
-    
     duration = time.time() - start_time
     logger.success(f"Compilation Complete! Took {duration:.2f}s")
+    logger.info(f"Compiled graphs: {compile_stats()['graphs']}")
+
+    # 4. Verify that serving doesn't compile anything anymore
+    logger.info("Verifying that serving triggers no recompiles...")
+    for text in VERIFY_TEXTS:
+        request = ServeTTSRequest(text=text, references=[], max_new_tokens=64)
+        list(inference(request, manager.tts_inference_engine))
+
+    recompiles = compile_stats()["recompiles"]
+    if recompiles:
+        logger.error(f"{recompiles} graph(s) were compiled while serving!")
+        sys.exit(1)
+    logger.success("No recompiles while serving.")
     logger.info(f"Kernels should be cached in {CACHE_DIR}")
-    
+
     # 5. Verify Cache Content
     if os.path.exists(CACHE_DIR):
         files = sum([len(files) for r, d, files in os.walk(CACHE_DIR)])
@@ -0,0 +1,111 @@
+"""
+Converts a LLAMA checkpoint and its codec into a cold-start bundle:
+
+    <output>/model.safetensors    LLAMA weights, cleaned keys, in the serving dtype
+    <output>/config.json, tokenizer files
+    <output>/codec.safetensors    codec weights
+    <output>/codec.json           fully resolved codec config
+
+Loading a bundle mmaps the weights without any conversion pass and
+instantiates the codec without composing its Hydra config.
+"""
+
+import json
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+
+import click
+import torch
+from loguru import logger
+from omegaconf import OmegaConf
+from safetensors.torch import save_file
+
+from fish_speech.models.dac.inference import load_config
+from fish_speech.models.text2semantic.llama import BUNDLE_WEIGHTS_NAME
+
+CODEC_NAME = "codec.safetensors"
+
+
+def clean_llama_weights(weights: dict, dtype: torch.dtype) -> OrderedDict:
+    # Same cleanup as BaseTransformer.from_pretrained, done once here
+    if "state_dict" in weights:
+        weights = weights["state_dict"]
+
+    cleaned = OrderedDict()
+    for k, v in weights.items():
+        if k.startswith("model."):
+            k = k[len("model.") :]
+        if "audio_" in k:
+            continue
+        # Tied weights share storage, which safetensors refuses
+        cleaned[k] = v.to(dtype=dtype).contiguous().clone()
+
+    return cleaned
+
+
+def clean_codec_weights(state_dict: dict) -> OrderedDict:
+    if "state_dict" in state_dict:
+        state_dict = state_dict["state_dict"]
+
+    if any("generator" in k for k in state_dict):
+        state_dict = {
+            k.replace("generator.", ""): v
+            for k, v in state_dict.items()
+            if "generator." in k
+        }
+
+    return OrderedDict((k, v.contiguous().clone()) for k, v in state_dict.items())
+
+
+@click.command()
+@click.option(
+    "--llama-checkpoint-path",
+    type=click.Path(path_type=Path, exists=True),
+    default="checkpoints/openaudio-s1-mini",
+)
+@click.option(
+    "--decoder-checkpoint-path",
+    type=click.Path(path_type=Path, exists=True),
+    default="checkpoints/openaudio-s1-mini/codec.pth",
+)
+@click.option("--decoder-config-name", type=str, default="modded_dac_vq")
+@click.option("--output", type=click.Path(path_type=Path), required=True)
+@click.option(
+    "--half/--no-half",
+    default=True,
+    help="Must match the --half of the server, float16 if set else bfloat16",
+)
+def main(
+    llama_checkpoint_path, decoder_checkpoint_path, decoder_config_name, output, half
+):
+    dtype = torch.half if half else torch.bfloat16
+    output.mkdir(parents=True, exist_ok=True)
+
+    # Config, tokenizer and anything else next to the weights
+    for file in llama_checkpoint_path.iterdir():
+        if file.is_file() and file.suffix not in (".pth", ".safetensors"):
+            shutil.copy2(file, output / file.name)
+
+    weights = torch.load(
+        llama_checkpoint_path / "model.pth",
+        map_location="cpu",
+        mmap=True,
+        weights_only=True,
+    )
+    save_file(clean_llama_weights(weights, dtype), str(output / BUNDLE_WEIGHTS_NAME))
+    logger.info(f"Saved LLAMA weights as {dtype} to {output / BUNDLE_WEIGHTS_NAME}")
+
+    cfg = load_config(decoder_config_name)
+    with open(output / Path(CODEC_NAME).with_suffix(".json"), "w") as f:
+        json.dump(OmegaConf.to_container(cfg, resolve=True), f, indent=2)
+
+    state_dict = torch.load(
+        decoder_checkpoint_path, map_location="cpu", mmap=True, weights_only=True
+    )
+    save_file(clean_codec_weights(state_dict), str(output / CODEC_NAME))
+    logger.info(f"Saved codec to {output / CODEC_NAME}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,150 +1,236 @@
-import onnxruntime
+"""
+Exports the modded DAC codec (encode and decode) to ONNX for the onnxruntime
+CPU backend, see fish_speech/models/dac/onnx_codec.py. Optionally adds int8
+dynamic quantized copies, then checks parity with the torch model and
+benchmarks both on CPU.
+
+    python tools/export_onnx.py --checkpoint-path checkpoints/openaudio-s1-mini/codec.pth \\
+        --output checkpoints/openaudio-s1-mini/onnx --int8
+"""
+
+import json
+import math
+import time
+from pathlib import Path
+
+import click
 import torch
-import torch.nn.functional as F
+from loguru import logger
+from torch.nn.utils import parametrize
 
-from fish_speech.conversation import CODEBOOK_PAD_TOKEN_ID
-from tools.vqgan.extract_vq import get_model
-
-PAD_TOKEN_ID = torch.LongTensor([CODEBOOK_PAD_TOKEN_ID])
+from fish_speech.models.dac.inference import load_model
+from fish_speech.models.dac.onnx_codec import (
+    CONFIG_NAME,
+    DECODER_NAME,
+    ENCODER_NAME,
+    OnnxCodec,
+    onnx_path,
+)
 
 
 class Encoder(torch.nn.Module):
+    """Audio [B, 1, frames * frame_length] -> codes [B, n_codebooks, frames]"""
+
     def __init__(self, model):
         super().__init__()
         self.model = model
-        self.model.spec_transform.spectrogram.return_complex = False
 
-    def forward(self, audios):
-        mels = self.model.spec_transform(audios)
-        encoded_features = self.model.backbone(mels)
-
-        z = self.model.quantizer.downsample(encoded_features)
-        _, indices = self.model.quantizer.residual_fsq(z.transpose(-2, -1))
-        _, b, l, _ = indices.shape
-        return indices.permute(1, 0, 3, 2).long().view(b, -1, l)
+    def forward(self, audio):
+        # DAC.encode without the padding and the training outputs of the quantizer
+        quantizer = self.model.quantizer
+        z = self.model.encoder(audio)
+        z = quantizer.pre_module(quantizer.downsample(z))
+        semantic_z, semantic_codes, *_ = quantizer.semantic_quantizer(z)
+        _, codes, *_ = quantizer.quantizer(z - semantic_z)
+        return torch.cat([semantic_codes, codes], dim=1)
 
 
 class Decoder(torch.nn.Module):
+    """Codes [B, n_codebooks, frames] -> audio [B, 1, frames * frame_length]"""
+
     def __init__(self, model):
         super().__init__()
         self.model = model
-        self.model.head.training = False
-        self.model.head.checkpointing = False
-
-    def get_codes_from_indices(self, cur_index, indices):
-
-        _, quantize_dim, _ = indices.shape
-        d_dim = self.model.quantizer.residual_fsq.rvqs[cur_index].codebooks.shape[2]
-
-        if (
-            quantize_dim
-            < self.model.quantizer.residual_fsq.rvqs[cur_index].num_quantizers
-        ):
-            assert (
-                self.model.quantizer.residual_fsq.rvqs[cur_index].quantize_dropout > 0.0
-            ), "quantize dropout must be greater than 0 if you wish to reconstruct from a signal with less fine quantizations"
-            indices = F.pad(
-                indices,
-                (
-                    0,
-                    self.model.quantizer.residual_fsq.rvqs[cur_index].num_quantizers
-                    - quantize_dim,
-                ),
-                value=-1,
-            )
 
-        mask = indices == -1
-        indices = indices.masked_fill(mask, 0)
+    def forward(self, indices):
+        return self.model.decoder(self.model.quantizer.decode(indices))
 
-        all_codes = torch.gather(
-            self.model.quantizer.residual_fsq.rvqs[cur_index].codebooks.unsqueeze(1),
-            dim=2,
-            index=indices.permute(2, 0, 1).unsqueeze(-1).repeat(1, 1, 1, d_dim),
-        )
 
-        all_codes = all_codes.masked_fill(mask.permute(2, 0, 1).unsqueeze(-1), 0.0)
+def remove_weight_norm(model: torch.nn.Module):
+    # Folds both weight norm flavours (parametrizations here, hooks in dac.nn)
+    for module in list(model.modules()):
+        if parametrize.is_parametrized(module, "weight"):
+            parametrize.remove_parametrizations(module, "weight")
+        elif hasattr(module, "weight_g"):
+            torch.nn.utils.remove_weight_norm(module)
 
-        scales = (
-            self.model.quantizer.residual_fsq.rvqs[cur_index]
-            .scales.unsqueeze(1)
-            .unsqueeze(1)
-        )
-        all_codes = all_codes * scales
 
-        return all_codes
+def export_codec(model, output: Path, max_seconds: float = 120.0):
+    """Exports encoder and decoder with dynamic batch and length, plus codec.json."""
 
-    def get_output_from_indices(self, cur_index, indices):
-        codes = self.get_codes_from_indices(cur_index, indices)
-        codes_summed = codes.sum(dim=0)
-        return self.model.quantizer.residual_fsq.rvqs[cur_index].project_out(
-            codes_summed
-        )
-
-    def forward(self, indices) -> torch.Tensor:
-        batch_size, _, length = indices.shape
-        dims = self.model.quantizer.residual_fsq.dim
-        groups = self.model.quantizer.residual_fsq.groups
-        dim_per_group = dims // groups
-
-        # indices = rearrange(indices, "b (g r) l -> g b l r", g=groups)
-        indices = indices.view(batch_size, groups, -1, length).permute(1, 0, 3, 2)
+    output.mkdir(parents=True, exist_ok=True)
+    frame_length = int(model.frame_length)
+    max_frames = math.ceil(max_seconds * model.sample_rate / frame_length)
 
-        # z_q = self.model.quantizer.residual_fsq.get_output_from_indices(indices)
-        z_q = torch.empty((batch_size, length, dims))
-        for i in range(groups):
-            z_q[:, :, i * dim_per_group : (i + 1) * dim_per_group] = (
-                self.get_output_from_indices(i, indices[i])
-            )
-
-        z = self.model.quantizer.upsample(z_q.transpose(1, 2))
-        x = self.model.head(z)
-        return x
+    batch = torch.export.Dim("batch", min=1, max=64)
+    frames = torch.export.Dim("frames", min=2, max=max_frames)
 
+    # Batch and frames > 1 so the exporter doesn't specialize them
+    audio = torch.randn(2, 1, frame_length * 16) * 0.1
+    encoder, decoder = Encoder(model).eval(), Decoder(model).eval()
+    with torch.inference_mode():
+        indices = encoder(audio)
 
-def main(firefly_gan_vq_path, llama_path, export_prefix):
-    GanModel = get_model("firefly_gan_vq", firefly_gan_vq_path, device="cpu")
-    enc = Encoder(GanModel)
-    dec = Decoder(GanModel)
-    audio_example = torch.randn(1, 1, 96000)
-    indices = enc(audio_example)
     torch.onnx.export(
-        enc,
-        audio_example,
-        f"{export_prefix}encoder.onnx",
-        dynamic_axes={
-            "audio": {0: "batch_size", 2: "audio_length"},
-        },
-        do_constant_folding=False,
-        opset_version=18,
-        verbose=False,
+        encoder,
+        (audio,),
+        str(onnx_path(output, ENCODER_NAME)),
+        dynamo=True,
         input_names=["audio"],
-        output_names=["prompt"],
+        output_names=["indices"],
+        dynamic_shapes={"audio": {0: batch, 2: frames * frame_length}},
+        opset_version=18,
     )
-
     torch.onnx.export(
-        dec,
-        indices,
-        f"{export_prefix}decoder.onnx",
-        dynamic_axes={
-            "prompt": {0: "batch_size", 2: "frame_count"},
-        },
-        do_constant_folding=False,
-        opset_version=18,
-        verbose=False,
-        input_names=["prompt"],
+        decoder,
+        (indices,),
+        str(onnx_path(output, DECODER_NAME)),
+        dynamo=True,
+        input_names=["indices"],
         output_names=["audio"],
+        dynamic_shapes={"indices": {0: batch, 2: frames}},
+        opset_version=18,
     )
 
-    test_example = torch.randn(1, 1, 96000 * 5)
-    encoder_session = onnxruntime.InferenceSession(f"{export_prefix}encoder.onnx")
-    decoder_session = onnxruntime.InferenceSession(f"{export_prefix}decoder.onnx")
+    with open(output / CONFIG_NAME, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "sample_rate": int(model.sample_rate),
+                "hop_length": int(model.hop_length),
+                "frame_length": frame_length,
+                "n_codebooks": int(indices.shape[1]),
+            },
+            f,
+            indent=2,
+        )
+
+    logger.info(f"Exported codec to {output}")
+
 
-    # check graph has no error
-    onnx_enc_out = encoder_session.run(["prompt"], {"audio": test_example.numpy()})[0]
-    torch_enc_out = enc(test_example)
-    onnx_dec_out = decoder_session.run(["audio"], {"prompt": onnx_enc_out})[0]
-    torch_dec_out = dec(torch_enc_out)
+def quantize_int8(output: Path):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    # Convolutions stay in float, ConvInteger is slower than float Conv on CPU
+    for name in (ENCODER_NAME, DECODER_NAME):
+        quantize_dynamic(
+            str(onnx_path(output, name)),
+            str(onnx_path(output, name, int8=True)),
+            weight_type=QuantType.QInt8,
+            op_types_to_quantize=["MatMul", "Gemm"],
+        )
+
+    logger.info(f"Quantized codec to int8 in {output}")
+
+
+@torch.inference_mode()
+def check_parity(model, codec: OnnxCodec, seconds: float = 5.0) -> dict:
+    """
+    Share of identical codes, and the SNR of the decoded audio in dB, between
+    the torch model and `codec`. Both decode the torch codes.
+    """
+
+    audio = torch.randn(1, 1, int(seconds * model.sample_rate)) * 0.1
+    lengths = torch.LongTensor([audio.shape[-1]])
+
+    indices, indices_lens = model.encode(audio, lengths)
+    onnx_indices, _ = codec.encode(audio, lengths)
+
+    expected, _ = model.decode(indices, indices_lens)
+    decoded, _ = codec.decode(indices, indices_lens)
+    noise = (decoded - expected).pow(2).mean()
+    snr = 10 * torch.log10(expected.pow(2).mean() / noise.clamp(min=1e-12))
+
+    return {
+        "code_match": (onnx_indices == indices).float().mean().item(),
+        "snr_db": snr.item(),
+    }
+
+
+@torch.inference_mode()
+def benchmark(model, codecs: dict, seconds: float = 10.0, repeats: int = 3) -> dict:
+    """Real-time factor (processing time / audio duration) of encode and decode."""
+
+    audio = torch.randn(1, 1, int(seconds * model.sample_rate)) * 0.1
+    lengths = torch.LongTensor([audio.shape[-1]])
+    indices, indices_lens = model.encode(audio, lengths)
+
+    def rtf(fn):
+        fn()  # Warm up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        return (time.perf_counter() - start) / repeats / seconds
+
+    results = {}
+    for name, codec in {"torch": model, **codecs}.items():
+        results[name] = {
+            "encode_rtf": rtf(lambda: codec.encode(audio, lengths)),
+            "decode_rtf": rtf(lambda: codec.decode(indices, indices_lens)),
+        }
+    return results
+
+
+@click.command()
+@click.option(
+    "--checkpoint-path",
+    type=click.Path(path_type=Path, exists=True),
+    default="checkpoints/openaudio-s1-mini/codec.pth",
+)
+@click.option("--config-name", type=str, default="modded_dac_vq")
+@click.option("--output", type=click.Path(path_type=Path), required=True)
+@click.option("--int8/--no-int8", default=False, help="Also write int8 graphs")
+@click.option("--max-seconds", type=float, default=120.0)
+@click.option("--num-threads", type=int, default=0, help="0 for the default")
+@click.option("--parity-seconds", type=float, default=5.0)
+@click.option("--benchmark-seconds", type=float, default=10.0)
+def main(
+    checkpoint_path,
+    config_name,
+    output,
+    int8,
+    max_seconds,
+    num_threads,
+    parity_seconds,
+    benchmark_seconds,
+):
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+
+    model = load_model(config_name, checkpoint_path, device="cpu").float()
+    remove_weight_norm(model)
+
+    export_codec(model, output, max_seconds)
+    if int8:
+        quantize_int8(output)
+
+    codecs = {"onnx": OnnxCodec(output, num_threads=num_threads)}
+    if int8:
+        codecs["onnx-int8"] = OnnxCodec(output, int8=True, num_threads=num_threads)
+
+    for name, codec in codecs.items():
+        parity = check_parity(model, codec, parity_seconds)
+        logger.info(
+            f"[{name}] code match {parity['code_match']:.2%}, "
+            f"decode SNR {parity['snr_db']:.1f} dB"
+        )
+
+    if benchmark_seconds > 0:
+        for name, result in benchmark(model, codecs, benchmark_seconds).items():
+            logger.info(
+                f"[{name}] encode RTF {result['encode_rtf']:.3f}, "
+                f"decode RTF {result['decode_rtf']:.3f}"
+            )
 
 
 if __name__ == "__main__":
-    main("checkpoints/pre/firefly-gan-vq-fsq-8x1024-21hz-generator.pth", None, "test_")
+    main()
@@ -3,7 +3,6 @@ import ctypes
 import io
 import json
 import os
-import struct
 from dataclasses import dataclass
 from enum import Enum
 from typing import AsyncGenerator, Union
@@ -13,11 +12,11 @@ import numpy as np
 import ormsgpack
 import soundfile as sf
 
+from fish_speech.utils.framing import FrameReader
 from fish_speech.utils.schema import (
     ServeChatRequest,
     ServeMessage,
     ServeTextPart,
-    ServeVQGANDecodeRequest,
     ServeVQGANEncodeRequest,
     ServeVQPart,
 )
@@ -177,48 +176,12 @@ class FishE2EAgent:
             ),
             streaming=True,
             num_samples=1,
+            decode_audio=True,
         )
 
-        # Step 3: Stream LLM response and decode audio
-        buffer = b""
+        # Step 3: Stream LLM response, the server decodes every VQ run to PCM
+        reader = FrameReader()
         vq_codes = []
-        current_vq = False
-
-        async def decode_send():
-            nonlocal current_vq
-            nonlocal vq_codes
-
-            data = np.concatenate(vq_codes, axis=1).tolist()
-            # Decode VQ codes to audio
-            decode_request = ServeVQGANDecodeRequest(tokens=[data])
-            decode_response = await self.client.post(
-                f"{self.vqgan_url}/v1/vqgan/decode",
-                data=ormsgpack.packb(
-                    decode_request,
-                    option=ormsgpack.OPT_SERIALIZE_PYDANTIC,
-                ),
-                headers={"Content-Type": "application/msgpack"},
-            )
-            decode_data = ormsgpack.unpackb(decode_response.content)
-
-            # Convert float16 audio data to int16
-            audio_data = np.frombuffer(decode_data["audios"][0], dtype=np.float16)
-            audio_data = (audio_data * 32768).astype(np.int16).tobytes()
-
-            audio_frame = CustomAudioFrame(
-                data=audio_data,
-                samples_per_channel=len(audio_data) // 2,
-                sample_rate=44100,
-                num_channels=1,
-            )
-            yield FishE2EEvent(
-                type=FishE2EEventType.SPEECH_SEGMENT,
-                frame=audio_frame,
-                vq_codes=data,
-            )
-
-            current_vq = False
-            vq_codes = []
 
         async with self.client.stream(
             "POST",
@@ -228,33 +191,33 @@ class FishE2EAgent:
         ) as response:
 
             async for chunk in response.aiter_bytes():
-                buffer += chunk
-
-                while len(buffer) >= 4:
-                    read_length = struct.unpack("I", buffer[:4])[0]
-                    if len(buffer) < 4 + read_length:
-                        break
-
-                    body = buffer[4 : 4 + read_length]
-                    buffer = buffer[4 + read_length :]
+                for body in reader.feed(chunk):
                     data = ormsgpack.unpackb(body)
-
-                    if data["delta"] and data["delta"]["part"]:
-                        if current_vq and data["delta"]["part"]["type"] == "text":
-                            async for event in decode_send():
-                                yield event
-                        if data["delta"]["part"]["type"] == "text":
-                            yield FishE2EEvent(
-                                type=FishE2EEventType.TEXT_SEGMENT,
-                                text=data["delta"]["part"]["text"],
-                            )
-                        elif data["delta"]["part"]["type"] == "vq":
-                            vq_codes.append(np.array(data["delta"]["part"]["codes"]))
-                            current_vq = True
-
-        if current_vq and vq_codes:
-            async for event in decode_send():
-                yield event
+                    part = data["delta"] and data["delta"]["part"]
+                    if not part:
+                        continue
+
+                    if part["type"] == "text":
+                        yield FishE2EEvent(
+                            type=FishE2EEventType.TEXT_SEGMENT,
+                            text=part["text"],
+                        )
+                    elif part["type"] == "vq":
+                        vq_codes.append(np.array(part["codes"]))
+                    elif part["type"] == "audio":
+                        # Sent right after the VQ run it decodes
+                        audio_frame = CustomAudioFrame(
+                            data=part["audio"],
+                            samples_per_channel=len(part["audio"]) // 2,
+                            sample_rate=part["sample_rate"],
+                            num_channels=1,
+                        )
+                        yield FishE2EEvent(
+                            type=FishE2EEventType.SPEECH_SEGMENT,
+                            frame=audio_frame,
+                            vq_codes=np.concatenate(vq_codes, axis=1).tolist(),
+                        )
+                        vq_codes = []
 
         yield FishE2EEvent(type=FishE2EEventType.END_OF_TEXT)
         yield FishE2EEvent(type=FishE2EEventType.END_OF_SPEECH)
@@ -0,0 +1,83 @@
+import time
+
+import click
+import pyrootutils
+
+pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+
+from fish_speech.tokenizer import TIKTOKEN_MAX_ENCODE_CHARS, FishTokenizer
+
+SAMPLE_TEXT = (
+    "Xin chào, đây là một đoạn văn bản dùng để đo tốc độ tokenizer. "
+    "The quick brown fox jumps over the lazy dog, again and again! "
+    "<|speaker:0|>人工智能语音合成。 "
+)
+
+
+def legacy_encode(tokenizer: FishTokenizer, s: str) -> list[int]:
+    # The previous implementation, kept here as the baseline
+    subs = [
+        s[i : i + TIKTOKEN_MAX_ENCODE_CHARS]
+        for i in range(0, len(s), TIKTOKEN_MAX_ENCODE_CHARS)
+    ]
+    return sum(
+        tokenizer.tkt_model.encode_batch(
+            subs,
+            allowed_special=tokenizer.tkt_model.special_tokens_set,
+            disallowed_special=set(),
+        ),
+        start=[],
+    )
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@click.command()
+@click.option(
+    "--tokenizer-path",
+    type=click.Path(exists=True),
+    default="checkpoints/openaudio-s1-mini",
+)
+@click.option("--num-chars", type=int, default=20_000_000)
+@click.option("--num-short", type=int, default=10_000)
+@click.option("--repeat", type=int, default=3)
+def main(tokenizer_path: str, num_chars: int, num_short: int, repeat: int):
+    tokenizer = FishTokenizer.from_pretrained(tokenizer_path)
+    long_text = (SAMPLE_TEXT * (num_chars // len(SAMPLE_TEXT) + 1))[:num_chars]
+    num_chunks = -(-len(long_text) // TIKTOKEN_MAX_ENCODE_CHARS)
+
+    assert legacy_encode(tokenizer, long_text) == tokenizer.encode(long_text)
+    click.echo(f"Long input: {len(long_text)} chars, {num_chunks} chunks")
+    click.echo(
+        f"  legacy encode: {timeit(lambda: legacy_encode(tokenizer, long_text), repeat):.3f}s"
+    )
+    click.echo(
+        f"  encode:        {timeit(lambda: tokenizer.encode(long_text), repeat):.3f}s"
+    )
+    click.echo(
+        f"  encode_batch:  {timeit(lambda: tokenizer.encode_batch([long_text]), repeat):.3f}s"
+    )
+
+    # Reference transcripts / prompts are short and repeat on every request
+    short_texts = [SAMPLE_TEXT[: 32 + i % 64] for i in range(num_short)]
+    click.echo(f"Short inputs: {num_short} strings")
+    click.echo(
+        f"  legacy encode: {timeit(lambda: [legacy_encode(tokenizer, t) for t in short_texts], repeat):.3f}s"
+    )
+    click.echo(
+        f"  encode:        {timeit(lambda: [tokenizer.encode(t) for t in short_texts], repeat):.3f}s"
+    )
+    click.echo(
+        f"  encode_batch:  {timeit(lambda: tokenizer.encode_batch(short_texts), repeat):.3f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import itertools
+import json
 import os
 import re
-from collections import defaultdict
+from collections import defaultdict, deque
 from functools import partial
 from multiprocessing import Pool
 from pathlib import Path
@@ -11,45 +12,47 @@ import numpy as np
 from loguru import logger
 from tqdm import tqdm
 
-from fish_speech.datasets.protos.text_data_pb2 import Semantics, Sentence, TextData
-from fish_speech.datasets.protos.text_data_stream import pack_pb_stream
+from fish_speech.datasets.protos.text_data_stream import pack_text_data
+from fish_speech.datasets.shard import SHARD_SUFFIX, ShardWriter
 from fish_speech.utils.file import load_filelist
 
 # To avoid CPU overload
 os.environ["MKL_NUM_THREADS"] = "1"
 os.environ["OMP_NUM_THREADS"] = "1"
 
+MANIFEST_NAME = "manifest.json"
+PROTOS_SUFFIX = ".protos"
+INDEX_SUFFIX = ".index.npy"
 
-def task_generator_folder(root: Path, text_extension: str):
-    files = list(tqdm(Path(root).rglob("*.npy"), desc=f"Loading {root}"))
-    files = sorted(files)
 
-    grouped_files = defaultdict(list)
-    for file in tqdm(files, desc=f"Grouping {root}"):
-        p = str(file.parent)
-        speaker = file.parent.name
+def task_generator_folder(root: Path, text_extension):
+    """
+    Walks the tree lazily, one group per directory that contains .npy files.
+    Texts are read by the workers, so the first group is dispatched right away.
+    """
 
+    stack = [Path(root)]
+    while stack:
+        directory = stack.pop()
         try:
-            if isinstance(text_extension, str):
-                texts = [file.with_suffix(text_extension).read_text(encoding="utf-8")]
-            else:
-                texts = [
-                    file.with_suffix(ext).read_text(encoding="utf-8")
-                    for ext in text_extension
-                ]
-        except Exception as e:
-            logger.error(f"Failed to read text {file}: {e}")
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            logger.error(f"Failed to list {directory}: {e}")
             continue
 
-        grouped_files[p].append((speaker, file, texts))
-
-    logger.info(
-        f"Found {len(grouped_files)} groups in {root}, {list(grouped_files.keys())[:5]}..."
-    )
-
-    for i in grouped_files.values():
-        subset = [(f, t) for _, f, t in i]
-        yield i[0][0], subset, "folder"
+        files = [
+            Path(e.path)
+            for e in entries
+            if e.name.endswith(".npy") and e.is_file(follow_symlinks=True)
+        ]
+        if files:
+            yield str(directory), directory.name, [(f, None) for f in files], "folder"
+
+        # Reversed, so directories are visited in sorted order
+        stack.extend(
+            Path(e.path) for e in reversed(entries) if e.is_dir(follow_symlinks=True)
+        )
 
 
 def task_generator_filelist(filelist):
@@ -59,11 +62,18 @@ def task_generator_filelist(filelist):
 
     logger.info(f"Found {len(grouped_files)} groups in {filelist}")
     for speaker, values in grouped_files.items():
-        yield speaker, values, "filelist"
+        yield f"{filelist}:{speaker}", speaker, values, "filelist"
 
 
-def run_task(task):
-    name, subset, source = task
+def read_texts(file: Path, text_extension) -> list[str]:
+    if isinstance(text_extension, str):
+        text_extension = [text_extension]
+
+    return [file.with_suffix(ext).read_text(encoding="utf-8") for ext in text_extension]
+
+
+def run_task(task, text_extension=(".txt",), output_format: str = "protos"):
+    key, name, subset, source = task
 
     # Parse the files
     sentences = []
@@ -73,6 +83,13 @@ def run_task(task):
             logger.warning(f"Can't find {np_file}")
             continue
 
+        if texts is None:
+            try:
+                texts = read_texts(file, text_extension)
+            except Exception as e:
+                logger.error(f"Failed to read text {file}: {e}")
+                continue
+
         new_texts = []
 
         for text in texts:
@@ -88,24 +105,164 @@ def run_task(task):
             logger.error(f"Failed to parse {file}: {e}")
             continue
 
-        if isinstance(semantics, np.ndarray):
-            semantics = semantics.tolist()
+        sentences.append((new_texts, np.asarray(semantics)))
+
+    if output_format == "shard":
+        # Arrays are written column-wise by the parent
+        return key, name, source, sentences, len(sentences)
+
+    # Pack the sentences, codes are varint-encoded in bulk
+    return key, name, source, pack_text_data(source, name, sentences), len(sentences)
+
+
+def ordered_imap(pool: Pool, fn, tasks, max_inflight: int):
+    """
+    Like Pool.imap, but only keeps `max_inflight` tasks queued,
+    so a lazy task generator is never drained ahead of the writer.
+    """
+
+    inflight = deque()
+    for task in tasks:
+        inflight.append(pool.apply_async(fn, (task,)))
+        if len(inflight) >= max_inflight:
+            yield inflight.popleft().get()
+
+    while inflight:
+        yield inflight.popleft().get()
+
+
+class ProtosWriter:
+    """
+    Appends length-prefixed TextData records to one .protos shard and keeps
+    the offset of every record, saved next to it as an int64 index
+    (num_records + 1 entries, the last one being the file size).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.index_path = self.path.with_suffix(INDEX_SUFFIX)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.fp = open(self.tmp_path, "wb")
+        self.offsets = []
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def add_group(self, name: str, source: str, record: bytes):
+        self.offsets.append(self.nbytes)
+        self.fp.write(record)
+        self.nbytes += len(record)
+
+    def close(self):
+        self.fp.close()
+
+        index_tmp = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(index_tmp, "wb") as f:
+            np.save(f, np.asarray(self.offsets + [self.nbytes], dtype=np.int64))
 
-        sentences.append(
-            Sentence(
-                texts=new_texts,
-                semantics=[Semantics(values=s) for s in semantics],
+        os.replace(index_tmp, self.index_path)
+        os.replace(self.tmp_path, self.path)
+
+
+def load_manifest(output: Path, output_format: str) -> dict:
+    manifest_path = output / MANIFEST_NAME
+    if not manifest_path.exists():
+        suffix = SHARD_SUFFIX if output_format == "shard" else PROTOS_SUFFIX
+        if any(output.glob(f"*{suffix}")):
+            logger.warning(
+                f"{output} has shards but no {MANIFEST_NAME}, they will be overwritten"
             )
+        return {"format": output_format, "shards": []}
+
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest["format"] != output_format:
+        raise click.UsageError(
+            f"{output} was built with --format {manifest['format']}, "
+            f"can't append {output_format}"
         )
 
-    # Pack the sentences
-    return pack_pb_stream(
-        TextData(
-            source=source,
-            name=name,
-            sentences=sentences,
+    return manifest
+
+
+def save_manifest(output: Path, manifest: dict):
+    tmp_path = output / (MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output / MANIFEST_NAME)
+
+
+def write_dataset(
+    output: Path,
+    num_workers: int,
+    tasks,
+    shard_size: int,
+    output_format: str,
+    text_extension,
+):
+    """
+    Writes groups into size-capped shards and records every closed shard in
+    manifest.json. Groups already listed in the manifest are skipped, so an
+    interrupted build resumes where it stopped and new data is appended as new shards.
+    """
+
+    manifest = load_manifest(output, output_format)
+    done = {key for shard in manifest["shards"] for key in shard["groups"]}
+    if done:
+        logger.info(
+            f"Resuming: {len(done)} groups in {len(manifest['shards'])} shards already built"
         )
-    )
+
+    tasks = (task for task in tasks if task[0] not in done)
+    suffix = SHARD_SUFFIX if output_format == "shard" else PROTOS_SUFFIX
+    writer_cls = ShardWriter if output_format == "shard" else ProtosWriter
+
+    writer, keys, num_sentences = None, [], 0
+
+    def close_writer():
+        writer.close()
+        manifest["shards"].append(
+            {
+                "file": writer.path.name,
+                "index": (
+                    writer.index_path.name if output_format == "protos" else None
+                ),
+                "groups": keys,
+                "num_groups": len(keys),
+                "num_sentences": num_sentences,
+                "bytes": writer.path.stat().st_size,
+            }
+        )
+        save_manifest(output, manifest)
+        logger.info(f"Finished writing {len(manifest['shards'])} shards to {output}")
+
+    fn = partial(run_task, text_extension=text_extension, output_format=output_format)
+    with Pool(num_workers) as p:
+        for key, name, source, payload, count in tqdm(
+            ordered_imap(p, fn, tasks, max_inflight=num_workers * 4)
+        ):
+            if count == 0:
+                continue
+
+            if writer is None:
+                shard_idx = len(manifest["shards"])
+                writer = writer_cls(output / f"{shard_idx:08d}{suffix}")
+                keys, num_sentences = [], 0
+
+            writer.add_group(name, source, payload)
+            keys.append(key)
+            num_sentences += count
+
+            if writer.nbytes > shard_size * 1024 * 1024:
+                close_writer()
+                writer = None
+
+    if writer is not None and len(writer) > 0:
+        close_writer()
+
+    logger.info(f"Dataset in {output} has {len(manifest['shards'])} shards")
 
 
 @click.command()
@@ -124,7 +281,14 @@ def run_task(task):
 @click.option(
     "--shard-size", type=int, default=10, help="The maximum size of each shard in mb"
 )
-def main(input, output, num_workers, text_extension, shard_size):
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["protos", "shard"]),
+    default="protos",
+    help="protos: length-prefixed TextData stream, shard: memory-mappable columnar shards",
+)
+def main(input, output, num_workers, text_extension, shard_size, output_format):
     generator_fns = []
 
     for f in input:
@@ -140,29 +304,9 @@ def main(input, output, num_workers, text_extension, shard_size):
     generator_fn = itertools.chain(*generator_fns)
     output.mkdir(parents=True, exist_ok=True)
 
-    dataset_fp = None
-    tar_idx = 0
-    written_size = 0
-
-    with Pool(num_workers) as p:
-        for result in tqdm(p.imap_unordered(run_task, generator_fn)):
-            if dataset_fp is None:
-                dataset_fp = open(Path(output) / f"{tar_idx:08d}.protos", "wb")
-
-            dataset_fp.write(result)
-            written_size += len(result)
-
-            if written_size > shard_size * 1024 * 1024:
-                logger.info(f"Finished writing {tar_idx} shards to {output}")
-                dataset_fp.close()
-                dataset_fp = None
-                written_size = 0
-                tar_idx += 1
-
-    if dataset_fp is not None:
-        dataset_fp.close()
-
-    logger.info(f"Finished writing {tar_idx + 1} shards to {output}")
+    write_dataset(
+        output, num_workers, generator_fn, shard_size, output_format, text_extension
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import click
+import numpy as np
+import pyrootutils
+
+pyrootutils.setup_root(__file__, indicator=".project-root", pythonpath=True)
+
+from fish_speech.models.text2semantic.length_predictor import LengthPredictor
+
+
+def load_samples(root: Path, text_extension: str) -> list[tuple[str, int]]:
+    """(text, frames) for every .npy of extract_vq.py with a transcript next to it."""
+
+    samples = []
+    for npy_file in sorted(root.rglob("*.npy")):
+        text_file = npy_file.with_suffix(text_extension)
+        if not text_file.exists():
+            continue
+        frames = np.load(npy_file, mmap_mode="r").shape[-1]
+        samples.append((text_file.read_text(encoding="utf-8").strip(), frames))
+    return samples
+
+
+def report(name: str, predictor: LengthPredictor, samples: list[tuple[str, int]]):
+    expected = np.array([predictor.expected_frames(text) for text, _ in samples])
+    ceilings = np.array([predictor.ceiling(text) for text, _ in samples])
+    frames = np.array([frames for _, frames in samples])
+    error = np.abs(expected - frames) / np.maximum(frames, 1)
+    click.echo(
+        f"{name}: mean error {error.mean():.1%}, p90 {np.percentile(error, 90):.1%}, "
+        f"{(frames > ceilings).mean():.2%} of samples above the ceiling"
+    )
+
+
+@click.command()
+@click.option(
+    "--input",
+    type=click.Path(path_type=Path, exists=True, file_okay=False),
+    required=True,
+    multiple=True,
+    help="Folders of .npy codes (tools/vqgan/extract_vq.py) with their transcripts",
+)
+@click.option("--text-extension", type=str, default=".lab")
+@click.option("--output", type=click.Path(path_type=Path), default="length.json")
+@click.option("--ceiling-ratio", type=float, default=2.0)
+@click.option("--ceiling-margin", type=int, default=64)
+def main(input, text_extension, output, ceiling_ratio, ceiling_margin):
+    samples = [s for root in input for s in load_samples(root, text_extension)]
+    if not samples:
+        raise click.ClickException("No .npy files with a transcript found")
+    click.echo(f"Fitting on {len(samples)} samples")
+
+    predictor = LengthPredictor.fit(
+        samples, ceiling_ratio=ceiling_ratio, ceiling_margin=ceiling_margin
+    )
+    report("defaults", LengthPredictor(), samples)
+    report("fitted", predictor, samples)
+    click.echo(f"Weights: {predictor.weights}")
+
+    predictor.save(output)
+    click.echo(f"Saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,27 @@
-import struct
+import asyncio
+from collections import defaultdict
 from functools import partial
 
+import numpy as np
 import ormsgpack
+import torch
 
+from fish_speech.models.text2semantic.inference import (
+    CancellationToken,
+    GenerateResponse,
+)
+from fish_speech.utils.framing import pack_frame
+from fish_speech.utils.schema import (
+    ServeAudioPart,
+    ServeStreamDelta,
+    ServeStreamResponse,
+    ServeVQPart,
+)
 from tools.server.agent.generate import generate_responses
 from tools.server.agent.pre_generation_utils import prepare_messages
 
 
-def execute_request(input_queue, tokenizer, config, request, device):
+def execute_request(input_queue, tokenizer, config, request, device, cancel_token=None):
     """
     This function prepares the conversation, encodes the request,
     sends the generation request, and handles decoding/streaming.
@@ -15,10 +29,31 @@ def execute_request(input_queue, tokenizer, config, request, device):
     """
     prompt, im_end_id = prepare_messages(request, tokenizer, config)
     yield from generate_responses(
-        input_queue, tokenizer, config, request, prompt, im_end_id, device
+        input_queue, tokenizer, config, request, prompt, im_end_id, device, cancel_token
     )
 
 
+def pcm_decoder(engine):
+    """
+    Decodes runs of streamed VQ codes ([num_codebooks, 1] lists) with the
+    server codec into a 16-bit mono PCM audio part.
+    """
+    sample_rate = engine.decoder_model.sample_rate
+
+    @torch.inference_mode()
+    def decode(runs: list[list[list[int]]]) -> ServeAudioPart:
+        codes = torch.from_numpy(np.concatenate(runs, axis=1).astype(np.int64))
+        segment = engine.get_audio_segment(
+            GenerateResponse(
+                action="sample", codes=codes.to(engine.decoder_model.device)
+            )
+        )
+        pcm = (np.clip(segment, -1.0, 1.0) * 32767).astype(np.int16)
+        return ServeAudioPart(audio=pcm.tobytes(), sample_rate=sample_rate)
+
+    return decode
+
+
 def response_generator(req, llama_queue, tokenizer, config, device):
     """
     Non-streaming response wrapper for the chat endpoint.
@@ -28,23 +63,72 @@ def response_generator(req, llama_queue, tokenizer, config, device):
     return next(generator)
 
 
-async def streaming_generator(req, llama_queue, tokenizer, config, device, json_mode):
+def encode_stream_response(response, json_mode):
+    if json_mode:
+        yield b"data: " + response.model_dump_json().encode("utf-8") + b"\n\n"
+    else:
+        # Header and body are sent as they are, see fish_speech.utils.framing
+        yield from pack_frame(
+            ormsgpack.packb(response, option=ormsgpack.OPT_SERIALIZE_PYDANTIC)
+        )
+
+
+async def streaming_generator(
+    req, llama_queue, tokenizer, config, device, json_mode, decode_vq=None
+):
     """
     Streaming response wrapper for the chat endpoint.
     Returns the response in chunks.
+
+    The blocking generator is stepped in a thread. With `decode_vq`, every run
+    of VQ codes is decoded when it ends (next text part or finish) and its
+    audio part is sent before whatever ended it. The generation is cancelled
+    when the client goes away.
     """
-    generator = execute_request(llama_queue, tokenizer, config, req, device)
-    for i in generator:
-        if json_mode:
-            body = i.model_dump_json().encode("utf-8")
-            yield b"data: " + body + b"\n\n"
-        else:
-            body = ormsgpack.packb(i, option=ormsgpack.OPT_SERIALIZE_PYDANTIC)
-            yield struct.pack("I", len(body)) + body
+    cancel_token = CancellationToken()
+    generator = execute_request(
+        llama_queue, tokenizer, config, req, device, cancel_token
+    )
+    runs = defaultdict(list)
+
+    async def flush_run(sample_id):
+        audio = await asyncio.to_thread(decode_vq, runs.pop(sample_id))
+        return ServeStreamResponse(
+            sample_id=sample_id, delta=ServeStreamDelta(part=audio)
+        )
+
+    try:
+        while True:
+            response = await asyncio.to_thread(next, generator, None)
+            if response is None:
+                break
+
+            outputs = [response]
+            if decode_vq is not None:
+                part = response.delta.part if response.delta else None
+                if isinstance(part, ServeVQPart):
+                    runs[response.sample_id].append(part.codes)
+                elif response.sample_id in runs:
+                    outputs.insert(0, await flush_run(response.sample_id))
+
+            for output in outputs:
+                for chunk in encode_stream_response(output, json_mode):
+                    yield chunk
+
+        for sample_id in list(runs):
+            for chunk in encode_stream_response(await flush_run(sample_id), json_mode):
+                yield chunk
+    finally:
+        cancel_token.cancel("client disconnected")
+        try:
+            generator.close()
+        except ValueError:
+            # Still running in the thread, it stops on the cancelled token
+            pass
 
 
 def get_response_generator(
-    llama_queue, tokenizer, config, req, device, json_mode
+    llama_queue, tokenizer, config, req, device, json_mode, decode_vq=None
 ) -> partial:
     """
     Get the correct response generator based on the request.
@@ -53,5 +137,12 @@ def get_response_generator(
         return partial(response_generator, req, llama_queue, tokenizer, config, device)
     else:
         return partial(
-            streaming_generator, req, llama_queue, tokenizer, config, device, json_mode
+            streaming_generator,
+            req,
+            llama_queue,
+            tokenizer,
+            config,
+            device,
+            json_mode,
+            decode_vq if req.decode_audio else None,
         )
@@ -13,7 +13,14 @@ from tools.server.agent.pre_generation_utils import (
 
 
 def generate_responses(
-    input_queue, tokenizer, config, request, prompt, im_end_id, device
+    input_queue,
+    tokenizer,
+    config,
+    request,
+    prompt,
+    im_end_id,
+    device,
+    cancel_token=None,
 ):
     """
     Main generation function that handles the conversation, encodes the request,
@@ -27,14 +34,14 @@ def generate_responses(
 
     # Prepare and send the generation request
     req = create_generation_request(prompt, request, im_end_id, device)
-    response_queue = send_generation_request(input_queue, req)
+    response_queue = send_generation_request(input_queue, req, cancel_token)
     decode_buffer, parts, finished = initialize_decode_buffers(request.num_samples)
 
     while True:
         response = response_queue.get()
 
         # Handle abnormal finish or error
-        if response in ["stop", "error"]:
+        if isinstance(response, str):
             finish_reason = response
             break
 
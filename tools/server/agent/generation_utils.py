@@ -37,11 +37,8 @@ def send_reset_buffer(sample_id, decode_buffer, tokenizer, parts, request):
 def handle_semantic_tokens(tokens, config, sample_id, parts, request):
     """Handle the semantic tokens returned by the model."""
     responses = []
-    _tokens = tokens[1:].clone()
-
-    if not config.share_codebook_embeddings:
-        for i in range(len(_tokens)):
-            _tokens[i] -= config.codebook_size * i
+    # The worker already returns codebook indices, no per-codebook offset
+    _tokens = tokens[1:]
 
     # If streaming, send the VQ parts directly
     if request.streaming:
@@ -2,7 +2,6 @@ import queue
 
 from fish_speech.conversation import Conversation, Message
 from fish_speech.models.text2semantic.inference import GenerateRequest
-from fish_speech.tokenizer import IM_END_TOKEN
 
 
 def prepare_messages(request, tokenizer, config):
@@ -41,7 +40,7 @@ def prepare_messages(request, tokenizer, config):
     prompt = conv.encode_for_inference(
         tokenizer=tokenizer, num_codebooks=config.num_codebooks
     )
-    im_end_id = tokenizer.get_token_id(IM_END_TOKEN)
+    im_end_id = tokenizer.im_end_id
 
     return prompt, im_end_id
 
@@ -63,10 +62,10 @@ def create_generation_request(prompt, request, im_end_id, device):
     return req
 
 
-def send_generation_request(input_queue, req):
+def send_generation_request(input_queue, req, cancel_token=None):
     """
     Send the generation request to the model and return a queue to get the response.
     """
     response_queue = queue.Queue()
-    input_queue.put(GenerateRequest(req, response_queue))
+    input_queue.put(GenerateRequest(req, response_queue, cancel_token=cancel_token))
     return response_queue
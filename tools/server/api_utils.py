@@ -1,6 +1,8 @@
+import asyncio
+import hashlib
 from argparse import ArgumentParser
 from http import HTTPStatus
-from typing import Annotated, Any
+from typing import Annotated, Any, AsyncGenerator
 
 import ormsgpack
 from baize.datastructures import ContentType
@@ -14,6 +16,7 @@ from loguru import logger
 from pydantic import BaseModel
 
 from fish_speech.inference_engine import TTSInferenceEngine
+from fish_speech.models.text2semantic.inference import CancellationToken
 from fish_speech.utils.schema import ServeTTSRequest
 from tools.server.inference import inference_wrapper as inference
 
@@ -32,6 +35,13 @@ def parse_args():
         default="checkpoints/openaudio-s1-mini/codec.pth",
     )
     parser.add_argument("--decoder-config-name", type=str, default="modded_dac_vq")
+    parser.add_argument(
+        "--decoder-backend",
+        type=str,
+        choices=["torch", "onnx", "onnx-int8"],
+        default="torch",
+        help="onnx runs the codec on CPU, --decoder-checkpoint-path is then the tools/export_onnx.py output",
+    )
     parser.add_argument("--device", type=str, default="cuda")
     parser.add_argument("--half", action="store_true", default=True)
     parser.add_argument("--compile", action="store_true", default=False)
@@ -39,6 +49,56 @@ def parse_args():
     parser.add_argument("--listen", type=str, default="127.0.0.1:8080")
     parser.add_argument("--workers", type=int, default=1)
     parser.add_argument("--api-key", type=str, default=None)
+    parser.add_argument(
+        "--warm-up-plan",
+        type=str,
+        default=None,
+        help="JSON file of requests run before the server is ready, see tools/server/warm_up.py",
+    )
+    parser.add_argument(
+        "--webui-port",
+        type=int,
+        default=0,
+        help="Also serve the Gradio WebUI on this port, on the same model queue",
+    )
+    parser.add_argument(
+        "--lora-dir",
+        type=str,
+        default=None,
+        help="Directory of <voice_id>.pth LoRA adapters applied per request",
+    )
+    parser.add_argument("--lora-cache-size", type=int, default=8)
+    parser.add_argument(
+        "--draft-checkpoint-path",
+        type=str,
+        default=None,
+        help="Small DualAR model proposing tokens for speculative decoding",
+    )
+    parser.add_argument(
+        "--num-draft-tokens",
+        type=int,
+        default=4,
+        help="Frames the draft model proposes per target forward",
+    )
+    parser.add_argument(
+        "--length-predictor-path",
+        type=str,
+        default=None,
+        help="Length calibration (tools/llama/calibrate_length.py) for decoding "
+        "ceilings and scheduling costs",
+    )
+    parser.add_argument(
+        "--tenant-max-running",
+        type=int,
+        default=0,
+        help="Requests of one tenant generated at the same time, 0 for no limit",
+    )
+    parser.add_argument(
+        "--tenant-max-pending",
+        type=int,
+        default=0,
+        help="Queued or running requests of one tenant before new ones get 429, 0 for no limit",
+    )
 
     return parser.parse_args()
 
@@ -70,10 +130,63 @@ class MsgPackRequest(HttpRequest):
 
 
 async def inference_async(req: ServeTTSRequest, engine: TTSInferenceEngine):
-    for chunk in inference(req, engine):
-        print("Got chunk")
-        if isinstance(chunk, bytes):
-            yield chunk
+    """
+    Streams the chunks of `inference`. The blocking generator is stepped in a
+    thread so the event loop notices a disconnect, and when this generator is
+    closed early the queued or running generation is cancelled.
+    """
+
+    cancel_token = CancellationToken()
+    chunks = inference(req, engine, cancel_token)
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            if isinstance(chunk, bytes):
+                yield chunk
+    finally:
+        cancel_token.cancel("client disconnected")
+        try:
+            chunks.close()
+        except ValueError:
+            # Still running in the thread, it stops on the cancelled token
+            pass
+
+
+async def start_stream(chunks: AsyncGenerator) -> AsyncGenerator:
+    """
+    Runs `chunks` up to its first item before the response starts, so a request
+    rejected when it is queued (TenantLimitExceeded) still gets a status code
+    instead of an aborted 200. Returns a generator over every item.
+    """
+
+    first = await anext(chunks, None)
+
+    async def iterate():
+        try:
+            if first is not None:
+                yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    return iterate()
+
+
+def request_tenant(http_request) -> str:
+    """
+    The tenant a request is capped under, from the caller's credentials: its
+    bearer token, or its address without one. A `tenant` sent in the body is
+    not trusted, varying it would get around the per-tenant limits.
+    """
+
+    scheme, _, token = http_request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return "key:" + hashlib.sha256(token.encode()).hexdigest()[:16]
+    client = http_request.client
+    return f"addr:{client.host}" if client else "anonymous"
 
 
 async def buffer_to_async_generator(buffer):
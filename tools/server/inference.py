@@ -6,18 +6,23 @@ import numpy as np
 from kui.asgi import HTTPException
 
 from fish_speech.inference_engine import TTSInferenceEngine
+from fish_speech.models.text2semantic.inference import CancellationToken
 from fish_speech.utils.schema import ServeTTSRequest
 
 AMPLITUDE = 32768  # Needs an explaination
 
 
-def inference_wrapper(req: ServeTTSRequest, engine: TTSInferenceEngine):
+def inference_wrapper(
+    req: ServeTTSRequest,
+    engine: TTSInferenceEngine,
+    cancel_token: CancellationToken | None = None,
+):
     """
     Wrapper for the inference function.
     Used in the API server.
     """
     count = 0
-    for result in engine.inference(req):
+    for result in engine.inference(req, cancel_token):
         match result.code:
             case "header":
                 if isinstance(result.audio, tuple):
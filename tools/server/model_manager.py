@@ -1,11 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import torch
 from loguru import logger
 
 from fish_speech.inference_engine import TTSInferenceEngine
 from fish_speech.models.dac.inference import load_model as load_decoder_model
-from fish_speech.models.text2semantic.inference import launch_thread_safe_queue
-from fish_speech.utils.schema import ServeTTSRequest
-from tools.server.inference import inference_wrapper as inference
+from fish_speech.models.dac.onnx_codec import OnnxCodec
+from fish_speech.models.text2semantic.inference import (
+    launch_thread_safe_queue,
+    mark_compile_ready,
+)
+from fish_speech.models.text2semantic.llama import BaseModelArgs
+from fish_speech.tokenizer import FishTokenizer
+from fish_speech.utils.timeline import StartupTimeline
+from tools.server.warm_up import (
+    DEFAULT_WARM_UP_PLAN,
+    load_warm_up_plan,
+    run_warm_up_plan,
+)
 
 
 class ModelManager:
@@ -18,6 +30,16 @@ class ModelManager:
         llama_checkpoint_path: str,
         decoder_checkpoint_path: str,
         decoder_config_name: str,
+        lora_dir: str | None = None,
+        lora_cache_size: int = 8,
+        max_running_per_tenant: int = 0,
+        max_pending_per_tenant: int = 0,
+        timeline: StartupTimeline | None = None,
+        decoder_backend: str = "torch",
+        warm_up_plan: str | None = None,
+        draft_checkpoint_path: str | None = None,
+        num_draft_tokens: int = 4,
+        length_predictor_path: str | None = None,
     ) -> None:
 
         self.mode = mode
@@ -26,6 +48,21 @@ class ModelManager:
         self.compile = compile
 
         self.precision = torch.half if half else torch.bfloat16
+        self.lora_dir = lora_dir
+        self.lora_cache_size = lora_cache_size
+        self.max_running_per_tenant = max_running_per_tenant
+        self.max_pending_per_tenant = max_pending_per_tenant
+        self.timeline = timeline or StartupTimeline()
+        # "torch", or "onnx" / "onnx-int8" with decoder_checkpoint_path
+        # pointing to the output of tools/export_onnx.py
+        self.decoder_backend = decoder_backend
+        # JSON file of warm-up requests, see tools/server/warm_up.py
+        self.warm_up_plan = warm_up_plan
+        # Small DualAR model for speculative decoding, see speculative.py
+        self.draft_checkpoint_path = draft_checkpoint_path
+        self.num_draft_tokens = num_draft_tokens
+        # Expected length per text: decoding ceiling and scheduling cost
+        self.length_predictor_path = length_predictor_path
 
         # Check if MPS or CUDA is available
         if torch.backends.mps.is_available():
@@ -35,59 +72,90 @@ class ModelManager:
             self.device = "cpu"
             logger.info("CUDA is not available, running on CPU.")
 
-        # Load the TTS models
-        self.load_llama_model(
-            llama_checkpoint_path, self.device, self.precision, self.compile, self.mode
-        )
-        self.load_decoder_model(
-            decoder_config_name, decoder_checkpoint_path, self.device
-        )
+        # Load the TTS models, the codec loads while the LLAMA worker starts up
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            decoder_future = executor.submit(
+                self.load_decoder_model,
+                decoder_config_name,
+                decoder_checkpoint_path,
+                self.device,
+            )
+            self.load_llama_model(
+                llama_checkpoint_path,
+                self.device,
+                self.precision,
+                self.compile,
+                self.mode,
+            )
+            decoder_future.result()
+
         self.tts_inference_engine = TTSInferenceEngine(
             llama_queue=self.llama_queue,
             decoder_model=self.decoder_model,
             precision=self.precision,
             compile=self.compile,
+            llama_device=self.device,
         )
 
         # Warm up the models
         if self.mode == "tts":
-            self.warm_up(self.tts_inference_engine)
+            with self.timeline.step("warm up"):
+                self.warm_up(self.tts_inference_engine)
+
+        # Anything compiled from here on is a recompile, see /v1/metrics
+        mark_compile_ready()
+
+        logger.info(self.timeline.summary())
 
     def load_llama_model(
         self, checkpoint_path, device, precision, compile, mode
     ) -> None:
 
         if mode == "tts":
-            self.llama_queue = launch_thread_safe_queue(
-                checkpoint_path=checkpoint_path,
-                device=device,
-                precision=precision,
-                compile=compile,
-            )
+            # Used by the chat endpoint to encode conversations next to the worker
+            self.tokenizer = FishTokenizer.from_pretrained(checkpoint_path)
+            self.config = BaseModelArgs.from_pretrained(checkpoint_path)
+            with self.timeline.step("llama model"):
+                self.llama_queue = launch_thread_safe_queue(
+                    checkpoint_path=checkpoint_path,
+                    device=device,
+                    precision=precision,
+                    compile=compile,
+                    lora_dir=self.lora_dir,
+                    lora_cache_size=self.lora_cache_size,
+                    max_running_per_tenant=self.max_running_per_tenant,
+                    max_pending_per_tenant=self.max_pending_per_tenant,
+                    draft_checkpoint_path=self.draft_checkpoint_path,
+                    num_draft_tokens=self.num_draft_tokens,
+                    length_predictor_path=self.length_predictor_path,
+                )
         else:
             raise ValueError(f"Invalid mode: {mode}")
 
         logger.info("LLAMA model loaded.")
 
     def load_decoder_model(self, config_name, checkpoint_path, device) -> None:
-        self.decoder_model = load_decoder_model(
-            config_name=config_name,
-            checkpoint_path=checkpoint_path,
-            device=device,
-        )
+        with self.timeline.step("decoder model"):
+            if self.decoder_backend == "torch":
+                self.decoder_model = load_decoder_model(
+                    config_name=config_name,
+                    checkpoint_path=checkpoint_path,
+                    device=device,
+                )
+            elif self.decoder_backend in ("onnx", "onnx-int8"):
+                self.decoder_model = OnnxCodec(
+                    checkpoint_path, int8=self.decoder_backend == "onnx-int8"
+                )
+            else:
+                raise ValueError(f"Invalid decoder backend: {self.decoder_backend}")
         logger.info("Decoder model loaded.")
 
     def warm_up(self, tts_inference_engine) -> None:
-        request = ServeTTSRequest(
-            text="Hello world.",
-            references=[],
-            reference_id=None,
-            max_new_tokens=1024,
-            chunk_length=200,
-            top_p=0.7,
-            repetition_penalty=1.2,
-            temperature=0.7,
-            format="wav",
-        )
-        list(inference(request, tts_inference_engine))
+        if self.warm_up_plan:
+            steps = load_warm_up_plan(self.warm_up_plan)
+            logger.info(f"Running warm-up plan {self.warm_up_plan}, {len(steps)} steps")
+        else:
+            steps = DEFAULT_WARM_UP_PLAN
+
+        run_warm_up_plan(steps, tts_inference_engine)
         logger.info("Models warmed up.")
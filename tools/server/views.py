@@ -1,3 +1,4 @@
+import asyncio
 import io
 import os
 import re
@@ -24,11 +25,15 @@ from kui.asgi import (
 from loguru import logger
 from typing_extensions import Annotated
 
+from fish_speech.models.text2semantic.inference import compile_stats
+from fish_speech.models.text2semantic.scheduler import TenantLimitExceeded
+from fish_speech.models.text2semantic.speculative import speculative_stats
 from fish_speech.utils.schema import (
     AddReferenceRequest,
     AddReferenceResponse,
     DeleteReferenceResponse,
     ListReferencesResponse,
+    ServeChatRequest,
     ServeTTSRequest,
     ServeVQGANDecodeRequest,
     ServeVQGANDecodeResponse,
@@ -36,11 +41,14 @@ from fish_speech.utils.schema import (
     ServeVQGANEncodeResponse,
     UpdateReferenceResponse,
 )
+from tools.server.agent import get_response_generator, pcm_decoder
 from tools.server.api_utils import (
     buffer_to_async_generator,
     format_response,
     get_content_type,
     inference_async,
+    request_tenant,
+    start_stream,
 )
 from tools.server.inference import inference_wrapper as inference
 from tools.server.model_manager import ModelManager
@@ -49,8 +57,6 @@ from tools.server.model_utils import (
     cached_vqgan_batch_encode,
 )
 
-MAX_NUM_SAMPLES = int(os.getenv("NUM_SAMPLES", 1))
-
 routes = Routes()
 
 
@@ -65,6 +71,24 @@ class Health(HttpView):
         return JSONResponse({"status": "ok"})
 
 
+@routes.http.get("/v1/metrics")
+async def metrics():
+    """
+    Scheduler metrics: queue depth per class, wait time percentiles, tenants.
+    Compile metrics: graphs compiled, recompiles since start-up.
+    Speculative decoding: draft acceptance rate and estimated speedup.
+    """
+    llama_queue = request.app.state.model_manager.llama_queue
+    stats = llama_queue.stats() if hasattr(llama_queue, "stats") else {}
+    return JSONResponse(
+        {
+            "scheduler": stats,
+            "compile": compile_stats(),
+            "speculative": speculative_stats.as_dict(),
+        }
+    )
+
+
 @routes.http.post("/v1/vqgan/encode")
 async def vqgan_encode(req: Annotated[ServeVQGANEncodeRequest, Body(exclusive=True)]):
     """
@@ -151,10 +175,12 @@ async def tts(req: Annotated[ServeTTSRequest, Body(exclusive=True)]):
                 content="Streaming only supports WAV format",
             )
 
+        req.tenant = request_tenant(request)
+
         # Perform TTS
         if req.streaming:
             return StreamResponse(
-                iterable=inference_async(req, engine),
+                iterable=await start_stream(inference_async(req, engine)),
                 headers={
                     "Content-Disposition": f"attachment; filename=audio.{req.format}",
                 },
@@ -180,6 +206,8 @@ async def tts(req: Annotated[ServeTTSRequest, Body(exclusive=True)]):
     except HTTPException:
         # Re-raise HTTP exceptions as they are already properly formatted
         raise
+    except TenantLimitExceeded as e:
+        raise HTTPException(HTTPStatus.TOO_MANY_REQUESTS, content=str(e))
     except Exception as e:
         logger.error(f"Error in TTS generation: {e}", exc_info=True)
         raise HTTPException(
@@ -187,6 +215,48 @@ async def tts(req: Annotated[ServeTTSRequest, Body(exclusive=True)]):
         )
 
 
+@routes.http.post("/v1/chat")
+async def chat(req: Annotated[ServeChatRequest, Body(exclusive=True)]):
+    """
+    Continue a conversation. When streaming, text deltas and VQ codes are sent
+    as they are generated, with the decoded PCM of every VQ run if `decode_audio`.
+    """
+    # generate_agent decodes a single sample per request
+    if req.num_samples != 1:
+        raise HTTPException(
+            HTTPStatus.BAD_REQUEST,
+            content="Chat generation supports a single sample per request",
+        )
+
+    # Get the type of content provided
+    content_type = request.headers.get("Content-Type", "application/json")
+    json_mode = "application/json" in content_type
+
+    model_manager: ModelManager = request.app.state.model_manager
+    engine = model_manager.tts_inference_engine
+
+    response_generator = get_response_generator(
+        model_manager.llama_queue,
+        model_manager.tokenizer,
+        model_manager.config,
+        req,
+        model_manager.device,
+        json_mode,
+        decode_vq=pcm_decoder(engine),
+    )
+
+    if not req.streaming:
+        result = await asyncio.to_thread(response_generator)
+        if json_mode:
+            return JSONResponse(result.model_dump())
+        return ormsgpack.packb(result, option=ormsgpack.OPT_SERIALIZE_PYDANTIC)
+
+    return StreamResponse(
+        iterable=response_generator(),
+        content_type=("text/event-stream" if json_mode else "application/octet-stream"),
+    )
+
+
 @routes.http.post("/v1/references/add")
 async def add_reference(
     id: str = Body(...), audio: UploadFile = Body(...), text: str = Body(...)
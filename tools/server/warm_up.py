@@ -0,0 +1,113 @@
+"""
+Warm-up plan executed by ModelManager before the server reports ready.
+
+The plan is a JSON list of TTS requests, each one run `repeat` times:
+
+    [
+        {"text": "Hello world."},
+        {"text_length": 600, "reference_id": "narrator", "repeat": 2},
+        {
+            "text_length": 150,
+            "reference_audio": "/app/references/alice/alice.wav",
+            "reference_text": "Transcript of the reference."
+        }
+    ]
+
+`text_length` generates that many characters of text when `text` is not
+given, so prefill, decode and the codec run at production lengths. Reference
+ids and reference audio are encoded once and stay in the reference caches of
+the engine, and prompts built from them stay in the LLAMA prompt block cache.
+Steps whose references don't exist are skipped with a warning.
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from fish_speech.utils.file import AUDIO_EXTENSIONS, list_files
+from fish_speech.utils.schema import ServeReferenceAudio, ServeTTSRequest
+
+FILLER_TEXT = (
+    "The quick brown fox jumps over the lazy dog, then rests under the old oak tree. "
+)
+
+
+class WarmUpStep(BaseModel):
+    text: Optional[str] = None
+    text_length: int = Field(default=0, ge=0)
+    reference_id: Optional[str] = None
+    reference_audio: Optional[str] = None
+    reference_text: str = ""
+    max_new_tokens: int = 1024
+    chunk_length: int = 200
+    repeat: int = Field(default=1, ge=1)
+
+    def get_text(self) -> str:
+        if self.text is not None:
+            return self.text
+        repeats = self.text_length // len(FILLER_TEXT) + 1
+        return (FILLER_TEXT * repeats)[: self.text_length] or "Hello world."
+
+    def missing_reference(self) -> Optional[str]:
+        if self.reference_id is not None:
+            folder = Path("references") / self.reference_id
+            if not folder.is_dir() or not list_files(folder, AUDIO_EXTENSIONS, True):
+                return f"reference id {self.reference_id}"
+        if self.reference_audio is not None:
+            if not Path(self.reference_audio).is_file():
+                return f"reference audio {self.reference_audio}"
+        return None
+
+    def to_request(self) -> ServeTTSRequest:
+        references = []
+        if self.reference_audio is not None:
+            references = [
+                ServeReferenceAudio(
+                    audio=Path(self.reference_audio).read_bytes(),
+                    text=self.reference_text,
+                )
+            ]
+
+        return ServeTTSRequest(
+            text=self.get_text(),
+            references=references,
+            reference_id=self.reference_id,
+            max_new_tokens=self.max_new_tokens,
+            chunk_length=self.chunk_length,
+            top_p=0.7,
+            repetition_penalty=1.2,
+            temperature=0.7,
+            format="wav",
+        )
+
+
+DEFAULT_WARM_UP_PLAN = [WarmUpStep(text="Hello world.")]
+
+
+def load_warm_up_plan(path: str | Path) -> list[WarmUpStep]:
+    with open(path, encoding="utf-8") as f:
+        return [WarmUpStep.model_validate(step) for step in json.load(f)]
+
+
+def run_warm_up_plan(steps: list[WarmUpStep], tts_inference_engine) -> None:
+    for i, step in enumerate(steps, 1):
+        missing = step.missing_reference()
+        if missing is not None:
+            logger.warning(f"Warm-up step {i}/{len(steps)} skipped, missing {missing}")
+            continue
+
+        request = step.to_request()
+        for _ in range(step.repeat):
+            start = time.perf_counter()
+            for result in tts_inference_engine.inference(request):
+                if result.code == "error":
+                    raise RuntimeError(f"Warm-up step {i} failed") from result.error
+            logger.info(
+                f"Warm-up step {i}/{len(steps)} ({len(request.text)} chars, "
+                f"{step.reference_id or step.reference_audio or 'no reference'}) "
+                f"took {time.perf_counter() - start:.2f}s"
+            )
@@ -3,47 +3,37 @@ from multiprocessing import Pool
 from pathlib import Path
 
 import click
-import librosa
-import torch.nn.functional as F
-import torchaudio
 from tqdm import tqdm
 
 from fish_speech.utils.file import AUDIO_EXTENSIONS, list_files
+from fish_speech.utils.silence import scan_voiced_range, write_range
 
-threshold = 10 ** (-50 / 20.0)
+threshold_db = -50
 
 
 def process(file):
-    waveform, sample_rate = torchaudio.load(str(file), backend="sox")
-    if waveform.size(0) > 1:
-        waveform = waveform.mean(dim=0, keepdim=True)
+    # Streamed twice (scan + rewrite), the whole file is never held in memory
+    bounds, sample_rate, num_samples = scan_voiced_range(file, threshold_db)
+    if bounds is None:
+        return
 
-    loudness = librosa.feature.rms(
-        y=waveform.numpy().squeeze(), frame_length=2048, hop_length=512, center=True
-    )[0]
-
-    for i in range(len(loudness) - 1, 0, -1):
-        if loudness[i] > threshold:
-            break
-
-    end_silent_time = (len(loudness) - i) * 512 / sample_rate
+    start, end = bounds
 
+    pad_end = 0
+    end_silent_time = (num_samples - end) / sample_rate
     if end_silent_time <= 0.3:
         random_time = random.uniform(0.3, 0.7) - end_silent_time
-        waveform = F.pad(
-            waveform, (0, int(random_time * sample_rate)), mode="constant", value=0
-        )
-
-    for i in range(len(loudness)):
-        if loudness[i] > threshold:
-            break
-
-    start_silent_time = i * 512 / sample_rate
+        pad_end = int(random_time * sample_rate)
 
+    begin = 0
+    start_silent_time = start / sample_rate
     if start_silent_time > 0.02:
-        waveform = waveform[:, int((start_silent_time - 0.02) * sample_rate) :]
+        begin = int((start_silent_time - 0.02) * sample_rate)
+
+    if begin == 0 and pad_end == 0:
+        return
 
-    torchaudio.save(uri=str(file), src=waveform, sample_rate=sample_rate)
+    write_range(file, file, begin, num_samples, pad_end=pad_end)
 
 
 @click.command()
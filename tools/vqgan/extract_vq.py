@@ -1,11 +1,12 @@
 import os
 import subprocess as sp
 import sys
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import timedelta
 from functools import lru_cache
 from pathlib import Path
-from random import Random
 
 import click
 import numpy as np
@@ -76,58 +77,136 @@ def get_model(
     return model
 
 
-@torch.inference_mode()
-def process_batch(files: list[Path], model) -> float:
-    wavs = []
-    audio_lengths = []
-    new_files = []
-    max_length = total_time = 0
+class AudioDataset(torch.utils.data.Dataset):
+    """Decodes, downmixes and resamples audio in DataLoader workers."""
 
-    for file in files:
+    def __init__(self, files: list[Path], sample_rate: int):
+        self.files = files
+        self.sample_rate = sample_rate
+
+    def __len__(self):
+        return len(self.files)
+
+    def __getitem__(self, idx):
+        file = self.files[idx]
         try:
             wav, sr = torchaudio.load(
                 str(file), backend=backend
             )  # Need to install libsox-dev
         except Exception as e:
             logger.error(f"Error reading {file}: {e}")
-            continue
+            return file, None
 
         if wav.shape[0] > 1:
             wav = wav.mean(dim=0, keepdim=True)
 
-        wav = torchaudio.functional.resample(wav.cuda(), sr, model.sample_rate)[0]
-        total_time += len(wav) / model.sample_rate
-        max_length = max(max_length, len(wav))
+        wav = torchaudio.functional.resample(wav, sr, self.sample_rate)[0]
+        return file, wav
+
+
+def collate_audio(items):
+    items = [(file, wav) for file, wav in items if wav is not None]
+    files = [file for file, _ in items]
+    lengths = [len(wav) for _, wav in items]
+    audio_lengths = torch.tensor(lengths, dtype=torch.long)
+
+    audios = torch.zeros((len(items), 1, max(lengths, default=0)))
+    for i, (_, wav) in enumerate(items):
+        audios[i, 0, : len(wav)] = wav
+
+    return files, audios, audio_lengths
+
+
+def length_bucketed_batches(files: list[Path], batch_size: int) -> list[list[int]]:
+    """
+    Groups files of similar size into batches, so one long file doesn't pad
+    a whole batch. File size is a cheap proxy for duration, no header is read.
+    """
+
+    sizes = []
+    for file in files:
+        try:
+            sizes.append(os.path.getsize(file))
+        except OSError:
+            sizes.append(0)
+
+    order = np.argsort(sizes, kind="stable")[::-1].tolist()
+    return [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+class ExtractionManifest:
+    """
+    Append-only list of extracted files, one file per rank under `root`.
+    A file is recorded only once its .npy has been written completely.
+    """
 
-        wavs.append(wav)
-        audio_lengths.append(len(wav))
-        new_files.append(file)
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.path = self.root / f"rank{RANK}.txt"
+        self.lock = threading.Lock()
+        self.fp = None
 
-    files = new_files
+    def load(self) -> set[str]:
+        done = set()
+        for path in self.root.glob("rank*.txt"):
+            with open(path, encoding="utf-8") as f:
+                done.update(line.rstrip("\n") for line in f if line.strip())
 
-    # Pad to max length
-    for i, wav in enumerate(wavs):
-        wavs[i] = torch.nn.functional.pad(wav, (0, max_length - len(wav)), "constant")
+        return done
 
-    audios = torch.stack(wavs, dim=0)[:, None]
-    audio_lengths = torch.tensor(audio_lengths, device=model.device, dtype=torch.long)
+    def add(self, file: Path):
+        with self.lock:
+            if self.fp is None:
+                self.fp = open(self.path, "a", encoding="utf-8")
+            self.fp.write(f"{file}\n")
+            self.fp.flush()
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+
+
+def save_feature(file: Path, feature: np.ndarray, manifest: ExtractionManifest):
+    # Written to a temporary file first, so an interrupted run never leaves a truncated .npy
+    npy_file = file.with_suffix(".npy")
+    tmp_file = npy_file.with_name(npy_file.name + ".tmp")
+    with open(tmp_file, "wb") as f:
+        np.save(f, feature)
+    os.replace(tmp_file, npy_file)
+
+    manifest.add(file)
+
+
+@torch.inference_mode()
+def process_batch(
+    files: list[Path],
+    audios: torch.Tensor,
+    audio_lengths: torch.Tensor,
+    model,
+    writer: ThreadPoolExecutor,
+    manifest: ExtractionManifest,
+) -> tuple[float, list[Future]]:
+    if len(files) == 0:
+        return 0, []
+
+    total_time = audio_lengths.sum().item() / model.sample_rate
+    audios = audios.to(model.device, non_blocking=True)
+    audio_lengths = audio_lengths.to(model.device, non_blocking=True)
 
     # Calculate lengths
     indices, feature_lengths = model.encode(audios, audio_lengths)
 
-    # Save to disk
+    # Save to disk in the background, the next batch is already being decoded
     outputs = indices.cpu().numpy()
+    feature_lengths = feature_lengths.cpu().tolist()
 
-    for file, length, feature, audio_length in zip(
-        files, feature_lengths, outputs, audio_lengths
-    ):
-        feature = feature[:, :length]
-
-        # (T,)
-        with open(file.with_suffix(".npy"), "wb") as f:
-            np.save(f, feature)
+    futures = [
+        writer.submit(save_feature, file, feature[:, :length], manifest)
+        for file, length, feature in zip(files, feature_lengths, outputs)
+    ]
 
-    return total_time
+    return total_time, futures
 
 
 @click.command()
@@ -140,6 +219,11 @@ def process_batch(files: list[Path], model) -> float:
 )
 @click.option("--batch-size", default=64)
 @click.option("--filelist", default=None, type=Path)
+@click.option(
+    "--loader-workers", default=4, help="Audio decoding workers per extraction process"
+)
+@click.option("--prefetch", default=4, help="Batches prefetched per loader worker")
+@click.option("--writer-threads", default=2)
 def main(
     folder: str,
     num_workers: int,
@@ -147,6 +231,9 @@ def main(
     checkpoint_path: str,
     batch_size: int,
     filelist: Path,
+    loader_workers: int,
+    prefetch: int,
+    writer_threads: int,
 ):
     if num_workers > 1 and WORLD_SIZE != num_workers:
         assert WORLD_SIZE == 1, "You should either use SLURM or this launcher, not both"
@@ -191,11 +278,19 @@ def main(
         files = list_files(folder, AUDIO_EXTENSIONS, recursive=True, sort=False)
 
     print(f"Found {len(files)} files")
-    files = [Path(f) for f in files if not Path(f).with_suffix(".npy").exists()]
+    manifest = ExtractionManifest(Path(folder) / ".extract_vq")
+    done = manifest.load()
+    files = [
+        Path(f)
+        for f in files
+        if str(f) not in done and not Path(f).with_suffix(".npy").exists()
+    ]
 
     total_files = len(files)
     files = files[RANK::WORLD_SIZE]
-    logger.info(f"Processing {len(files)}/{total_files} files")
+    logger.info(
+        f"Processing {len(files)}/{total_files} files, {len(done)} already in manifest"
+    )
 
     # Batch processing
     total_time = 0
@@ -203,9 +298,26 @@ def main(
     processed_files = 0
     model = get_model(config_name, checkpoint_path)
 
-    for n_batch, idx in enumerate(range(0, len(files), batch_size)):
-        batch = files[idx : idx + batch_size]
-        batch_time = process_batch(batch, model)
+    loader = torch.utils.data.DataLoader(
+        AudioDataset(files, model.sample_rate),
+        batch_sampler=length_bucketed_batches(files, batch_size),
+        collate_fn=collate_audio,
+        num_workers=loader_workers,
+        prefetch_factor=prefetch if loader_workers > 0 else None,
+        pin_memory=torch.cuda.is_available(),
+    )
+    writer = ThreadPoolExecutor(max_workers=writer_threads)
+    pending = []
+
+    for n_batch, (batch, audios, audio_lengths) in enumerate(loader):
+        batch_time, futures = process_batch(
+            batch, audios, audio_lengths, model, writer, manifest
+        )
+
+        # Bound the number of features waiting to be written
+        for future in pending:
+            future.result()
+        pending = futures
 
         total_time += batch_time
         processed_files += len(batch)
@@ -221,6 +333,11 @@ def main(
                 + f"ETA: {timedelta(seconds=round(eta))}s"
             )
 
+    for future in pending:
+        future.result()
+    writer.shutdown()
+    manifest.close()
+
     logger.info(
         f"Finished processing {len(files)} files, {total_time / 3600:.2f} hours of audio"
     )
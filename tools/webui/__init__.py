@@ -6,7 +6,16 @@ from fish_speech.i18n import i18n
 from tools.webui.variables import HEADER_MD, TEXTBOX_PLACEHOLDER
 
 
-def build_app(inference_fct: Callable, theme: str = "light") -> gr.Blocks:
+def build_app(
+    inference_fct: Callable,
+    theme: str = "light",
+    concurrency_limit: int | None = None,
+) -> gr.Blocks:
+    """
+    `concurrency_limit` bounds the requests Gradio runs at the same time, None
+    for no bound. Requests are scheduled by the LLAMA worker queue either way.
+    """
+
     with gr.Blocks(theme=gr.themes.Base()) as app:
         gr.Markdown(HEADER_MD)
 
@@ -117,6 +126,17 @@ def build_app(inference_fct: Callable, theme: str = "light") -> gr.Blocks:
                         label=i18n("Error Message"),
                         visible=True,
                     )
+                with gr.Row():
+                    status = gr.Markdown()
+                with gr.Row():
+                    stream_audio = gr.Audio(
+                        label=i18n("Streaming Audio"),
+                        type="numpy",
+                        streaming=True,
+                        autoplay=True,
+                        interactive=False,
+                        visible=True,
+                    )
                 with gr.Row():
                     audio = gr.Audio(
                         label=i18n("Generated Audio"),
@@ -148,8 +168,8 @@ def build_app(inference_fct: Callable, theme: str = "light") -> gr.Blocks:
                 seed,
                 use_memory_cache,
             ],
-            [audio, error],
-            concurrency_limit=1,
+            [stream_audio, audio, status, error],
+            concurrency_limit=concurrency_limit,
         )
 
     return app
@@ -1,10 +1,18 @@
 import html
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from functools import partial
 from typing import Any, Callable
 
+import gradio as gr
+
 from fish_speech.i18n import i18n
+from fish_speech.models.text2semantic.inference import CancellationToken
 from fish_speech.utils.schema import ServeReferenceAudio, ServeTTSRequest
 
+# Seconds between two updates of the queue position while a request waits
+STATUS_INTERVAL = 0.5
+
 
 def inference_wrapper(
     text,
@@ -23,6 +31,11 @@ def inference_wrapper(
     """
     Wrapper for the inference function.
     Used in the Gradio interface.
+
+    The request goes through the same LLAMA scheduler as the API, so Gradio
+    doesn't need to serialize users. Yields (streamed segment, final audio,
+    status, error): segments as they are decoded, the queue position while
+    the request waits.
     """
 
     if reference_audio:
@@ -41,18 +54,60 @@ def inference_wrapper(
         temperature=temperature,
         seed=int(seed) if seed else None,
         use_memory_cache=use_memory_cache,
+        streaming=True,
     )
 
-    for result in engine.inference(req):
-        match result.code:
-            case "final":
-                return result.audio, None
-            case "error":
-                return None, build_html_error_message(i18n(result.error))
-            case _:
-                pass
-
-    return None, i18n("No audio generated")
+    # The engine blocks until the next segment, step it in a thread to report progress
+    cancel_token = CancellationToken()
+    results = engine.inference(req, cancel_token)
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        while True:
+            future = executor.submit(next, results, None)
+            while True:
+                try:
+                    result = future.result(timeout=STATUS_INTERVAL)
+                    break
+                except FutureTimeoutError:
+                    yield gr.skip(), gr.skip(), get_status(
+                        engine, cancel_token
+                    ), gr.skip()
+
+            if result is None:
+                break
+
+            match result.code:
+                case "segment":
+                    yield result.audio, gr.skip(), i18n("Generating"), None
+                case "final":
+                    yield gr.skip(), result.audio, i18n("Done"), None
+                    return
+                case "error":
+                    yield None, None, "", build_html_error_message(i18n(result.error))
+                    return
+                case _:
+                    pass
+
+        yield None, None, "", i18n("No audio generated")
+    finally:
+        # Closed tab or stopped event, drop the queued or running generation
+        cancel_token.cancel("webui request closed")
+        executor.shutdown(wait=False)
+        try:
+            results.close()
+        except ValueError:
+            # Still running in the thread, it stops on the cancelled token
+            pass
+
+
+def get_status(engine, cancel_token: CancellationToken) -> str:
+    llama_queue = engine.llama_queue
+    position = (
+        llama_queue.position(cancel_token) if hasattr(llama_queue, "position") else None
+    )
+    if position is None:
+        return i18n("Generating")
+    return f"{i18n('Queue position')}: {position + 1}"
 
 
 def get_reference_audio(reference_audio: str, reference_text: str) -> list: